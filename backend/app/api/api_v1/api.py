@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.api_v1.endpoints import plaid, users, baserow
+from app.api.api_v1.endpoints import plaid, users, baserow, jobs
 
 api_router = APIRouter()
 
@@ -21,3 +21,9 @@ api_router.include_router(
     prefix="/baserow",
     tags=["baserow"]
 )
+
+api_router.include_router(
+    jobs.router,
+    prefix="/jobs",
+    tags=["jobs"]
+)
@@ -1,106 +1,122 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict, List
-import aiohttp
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Dict, List, Union
+import asyncio
+import json
 import os
-from supertokens_python.recipe.session.framework.fastapi import verify_session
 from supertokens_python.recipe.session import SessionContainer
-from pydantic import BaseModel
+from ....core.session import verify_session
+from ....services.aggregation import (
+    AccountColumns,
+    TransactionColumns,
+    summarize_accounts,
+    summarize_transactions
+)
+from ....services.baserow_client import baserow_client
+from ....services.baserow_query import BaserowQuery
+from ....services.cascade_delete import DELETE_USER_DATA_JOB
+from ....services.job_queue import job_queue
+from ....services.replica_store import replica_store
+from ....services.response_cache import response_cache
+from ....services.rollup_store import rollup_store
+from ....services.transaction_ingest import ndjson_records, transaction_ingestor
 
 router = APIRouter()
 
-class TransactionData(BaseModel):
-    account_id: str
-    amount: float
-    date: str
-    description: str
-    category: str
-
-async def baserow_request(method: str, endpoint: str, data: Dict = None) -> Dict:
+async def baserow_request(method: str, endpoint: Union[str, BaserowQuery], data: Dict = None) -> Dict:
     """
     Helper function to make requests to Baserow API
     """
-    base_url = os.getenv("BASEROW_API_URL")
-    headers = {
-        "Authorization": f"Token {os.getenv('BASEROW_API_TOKEN')}",
-        "Content-Type": "application/json"
-    }
-    
-    async with aiohttp.ClientSession() as session:
-        url = f"{base_url}{endpoint}"
-        async with session.request(
-            method=method,
-            url=url,
-            headers=headers,
-            json=data
-        ) as response:
-            if response.status >= 400:
-                raise HTTPException(
-                    status_code=response.status,
-                    detail="Baserow API request failed"
-                )
-            return await response.json()
+    return await baserow_client.request(method=method, endpoint=endpoint, data=data)
 
 @router.post("/store-transactions")
 async def store_transactions(
-    transactions: List[TransactionData],
+    request: Request,
     session: SessionContainer = Depends(verify_session)
 ) -> Dict:
     """
-    Store transaction data in Baserow
+    Store transaction data in Baserow.
+
+    Accepts a JSON array or, with Content-Type application/x-ndjson, one
+    transaction per line; NDJSON uploads are validated and written while
+    they are still being received. Transactions without a transaction_id
+    get a dedupe key, so retrying an upload does not duplicate rows.
     """
     try:
         user_id = session.get_user_id()
-        table_id = os.getenv("BASEROW_TRANSACTIONS_TABLE_ID")
         
-        # Transform transactions into Baserow format
-        rows = []
-        for transaction in transactions:
-            rows.append({
-                "user_id": user_id,
-                "account_id": transaction.account_id,
-                "amount": transaction.amount,
-                "date": transaction.date,
-                "description": transaction.description,
-                "category": transaction.category
-            })
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            records = ndjson_records(request.stream())
+        else:
+            try:
+                transactions = json.loads(await request.body())
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Request body must be JSON")
+            if not isinstance(transactions, list):
+                raise HTTPException(status_code=400, detail="Expected a JSON array of transactions")
+            records = _iterate(transactions)
         
-        # Store in Baserow
-        response = await baserow_request(
-            method="POST",
-            endpoint=f"/database/rows/table/{table_id}/batch/",
-            data={"items": rows}
-        )
-        
-        return {"status": "success", "message": f"Stored {len(transactions)} transactions"}
+        return await transaction_ingestor.ingest(user_id, records)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _iterate(items: List) -> AsyncIterator:
+    for item in items:
+        yield item
+
+async def _stream_ndjson(rows: AsyncIterator[Dict]) -> AsyncIterator[bytes]:
+    async for row in rows:
+        yield (json.dumps(row) + "\n").encode()
+
+async def _stream_json_array(rows: AsyncIterator[Dict]) -> AsyncIterator[bytes]:
+    separator = b"["
+    async for row in rows:
+        yield separator + json.dumps(row).encode()
+        separator = b","
+    yield b"]" if separator == b"," else b"[]"
+
 @router.get("/user-transactions")
 async def get_user_transactions(
     session: SessionContainer = Depends(verify_session),
-    account_id: str = None
+    account_id: str = None,
+    stream: str = None
 ) -> List[Dict]:
     """
-    Get all transactions for a user, optionally filtered by account_id
+    Get all transactions for a user, optionally filtered by account_id.
+
+    Pass stream=ndjson or stream=json to receive the rows as a chunked
+    response that is written page by page instead of buffered in memory.
     """
     try:
         user_id = session.get_user_id()
         table_id = os.getenv("BASEROW_TRANSACTIONS_TABLE_ID")
         
         # Build query parameters
-        query_params = f"user_id={user_id}"
+        query = BaserowQuery(table_id).equal("user_id", user_id).order_by("-date", "-id")
         if account_id:
-            query_params += f"&account_id={account_id}"
+            query.equal("account_id", account_id)
         
-        # Query Baserow for user's transactions
-        response = await baserow_request(
-            method="GET",
-            endpoint=f"/database/rows/table/{table_id}/?{query_params}"
-        )
+        if stream == "ndjson":
+            return StreamingResponse(
+                _stream_ndjson(baserow_client.iter_rows(query)),
+                media_type="application/x-ndjson"
+            )
+        if stream == "json":
+            return StreamingResponse(
+                _stream_json_array(baserow_client.iter_rows(query)),
+                media_type="application/json"
+            )
+        if stream is not None:
+            raise HTTPException(status_code=400, detail="stream must be 'ndjson' or 'json'")
         
-        return response.get("results", [])
+        # Query Baserow for user's transactions
+        return await replica_store.list_rows(query, "transactions")
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -115,30 +131,68 @@ async def get_account_summary(
         user_id = session.get_user_id()
         accounts_table_id = os.getenv("BASEROW_ACCOUNTS_TABLE_ID")
         
-        # Query Baserow for user's accounts
-        response = await baserow_request(
-            method="GET",
-            endpoint=f"/database/rows/table/{accounts_table_id}/?user_id={user_id}"
-        )
-        
-        accounts = response.get("results", [])
-        
-        # Calculate total balances
-        total_current = sum(float(account["balance_current"]) for account in accounts)
-        total_available = sum(
-            float(account["balance_available"]) 
-            for account in accounts 
-            if account["balance_available"] is not None
-        )
-        
-        return {
-            "accounts": accounts,
-            "summary": {
-                "total_current_balance": total_current,
-                "total_available_balance": total_available,
-                "total_accounts": len(accounts)
+        async def load_summary() -> Dict:
+            # Query Baserow for user's accounts and the institutions of their items
+            loads = [
+                replica_store.list_rows(
+                    BaserowQuery(accounts_table_id).equal("user_id", user_id),
+                    "account_summary"
+                ),
+                replica_store.list_rows(
+                    BaserowQuery(os.getenv("BASEROW_TOKENS_TABLE_ID"))
+                    .equal("user_id", user_id)
+                    .include("plaid_item_id", "institution_name"),
+                    "account_summary"
+                )
+            ]
+            if rollup_store.enabled:
+                # Rollups make transaction totals cheap enough to include here
+                loads.append(rollup_store.summary(user_id))
+            accounts, tokens, *transactions = await asyncio.gather(*loads)
+            institution_by_item = {
+                token["plaid_item_id"]: token.get("institution_name") for token in tokens
             }
-        }
+            
+            # Totals are summed in integer cents so they match the stored decimals
+            summary = {
+                "accounts": accounts,
+                "summary": summarize_accounts(
+                    AccountColumns.from_rows(accounts),
+                    institution_by_item
+                )
+            }
+            if transactions:
+                summary["transactions"] = transactions[0]
+            return summary
+        
+        return await response_cache.get_or_load("account_summary", user_id, load_summary)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _transaction_summary(user_id: str, account_id: str = None) -> Dict:
+    if rollup_store.enabled:
+        return await rollup_store.summary(user_id, account_id)
+
+    # Without the rollup store, fold the rows into columns page by page
+    query = BaserowQuery(os.getenv("BASEROW_TRANSACTIONS_TABLE_ID")).equal("user_id", user_id)
+    if account_id:
+        query = query.equal("account_id", account_id)
+    columns = TransactionColumns()
+    async for row in baserow_client.iter_rows(query.include("account_id", "amount", "date", "category")):
+        columns.append(row)
+    return summarize_transactions(columns)
+
+@router.get("/transaction-summary")
+async def get_transaction_summary(
+    account_id: str = None,
+    session: SessionContainer = Depends(verify_session)
+) -> Dict:
+    """
+    Get transaction totals for a user by category, month and account
+    """
+    try:
+        return await _transaction_summary(session.get_user_id(), account_id)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -149,29 +203,25 @@ async def delete_user_data(
     session: SessionContainer = Depends(verify_session)
 ) -> Dict:
     """
-    Delete all user data from Baserow (for account deletion)
+    Delete all user data from Baserow (for account deletion).
+
+    Deletion runs as a background job that is retried until it completes;
+    poll /jobs/{job_id} for its progress.
     """
     try:
         # Verify the requesting user is the same as the user being deleted
         if session.get_user_id() != user_id:
             raise HTTPException(status_code=403, detail="Unauthorized")
         
-        transactions_table_id = os.getenv("BASEROW_TRANSACTIONS_TABLE_ID")
-        accounts_table_id = os.getenv("BASEROW_ACCOUNTS_TABLE_ID")
+        job = await job_queue.enqueue(DELETE_USER_DATA_JOB, user_id, {"user_id": user_id})
         
-        # Delete from Baserow transactions table
-        await baserow_request(
-            method="DELETE",
-            endpoint=f"/database/rows/table/{transactions_table_id}/?user_id={user_id}"
-        )
-        
-        # Delete from Baserow accounts table
-        await baserow_request(
-            method="DELETE",
-            endpoint=f"/database/rows/table/{accounts_table_id}/?user_id={user_id}"
-        )
-        
-        return {"status": "success", "message": "User data deleted successfully"}
+        return {
+            "status": "accepted",
+            "message": "User data deletion started",
+            "job_id": job["id"]
+        }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
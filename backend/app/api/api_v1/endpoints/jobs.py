@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Dict, List
+from supertokens_python.recipe.session import SessionContainer
+from ....core.session import verify_session
+from ....services.job_queue import job_queue
+
+router = APIRouter()
+
+@router.get("/")
+async def list_jobs(
+    limit: int = 20,
+    session: SessionContainer = Depends(verify_session)
+) -> List[Dict]:
+    """
+    List the user's most recent background jobs
+    """
+    try:
+        return await job_queue.list_user(session.get_user_id(), limit=min(max(limit, 1), 100))
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: str,
+    session: SessionContainer = Depends(verify_session)
+) -> Dict:
+    """
+    Get the status of one of the user's background jobs
+    """
+    try:
+        return await job_queue.get(job_id, session.get_user_id())
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,31 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
-from plaid import Client as PlaidClient
-from plaid.model.link_token_create_request import LinkTokenCreateRequest
-from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
-from plaid.model.products import Products
-from plaid.model.country_code import CountryCode
-from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
-from plaid.model.accounts_get_request import AccountsGetRequest
-from plaid.model.institutions_get_by_id_request import InstitutionsGetByIdRequest
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+import json
 import os
+from functools import partial
 from typing import Dict, List
-from datetime import datetime
-from decimal import Decimal
-from supertokens_python.recipe.session.framework.fastapi import verify_session
 from supertokens_python.recipe.session import SessionContainer
-from ..endpoints.baserow import baserow_request
-from ....models.account import AccountCreate, AccountUpdate
+from ....core.session import verify_session
+from ....core.pipeline import Pipeline
 from ....services.token_service import token_service
+from ....services.plaid_gateway import plaid_gateway
+from ....services import plaid_models
+from ....services.baserow_query import BaserowQuery
+from ....services.account_refresh import account_refresh_service
+from ....services.transaction_sync import transaction_sync_service
+from ....services.replica_store import replica_store
+from ....services.response_cache import response_cache
+from ....services.institution_cache import institution_cache
+from ....services.cascade_delete import cascade_delete_service
+from ....services.job_queue import job_queue
+from ....services.plaid_link import POST_LINK_JOB
+from ....services.plaid_webhooks import webhook_dispatcher, webhook_verifier
 
 router = APIRouter()
 
-# Initialize Plaid client
-plaid_client = PlaidClient(
-    client_id=os.getenv("PLAID_CLIENT_ID"),
-    secret=os.getenv("PLAID_SECRET"),
-    environment=os.getenv("PLAID_ENV", "sandbox")
-)
-
 @router.post("/create_link_token")
 async def create_link_token(session: SessionContainer = Depends(verify_session)) -> Dict:
     """
@@ -34,17 +30,23 @@ async def create_link_token(session: SessionContainer = Depends(verify_session))
     try:
         user_id = session.get_user_id()
         
-        request = LinkTokenCreateRequest(
-            products=[Products("transactions")],
+        options = {}
+        webhook_url = os.getenv("PLAID_WEBHOOK_URL")
+        if webhook_url:
+            options["webhook"] = webhook_url
+        
+        request = plaid_models.LinkTokenCreateRequest(
+            products=[plaid_models.Products("transactions")],
             client_name="ThriveBase",
-            country_codes=[CountryCode("US")],
+            country_codes=[plaid_models.CountryCode("US")],
             language="en",
-            user=LinkTokenCreateRequestUser(
+            user=plaid_models.LinkTokenCreateRequestUser(
                 client_user_id=user_id
-            )
+            ),
+            **options
         )
         
-        response = plaid_client.link_token_create(request)
+        response = await plaid_gateway.link_token_create(request)
         return {"link_token": response["link_token"]}
     
     except Exception as e:
@@ -53,74 +55,58 @@ async def create_link_token(session: SessionContainer = Depends(verify_session))
 @router.post("/exchange_public_token")
 async def exchange_public_token(
     public_token: str,
+    response: Response,
     session: SessionContainer = Depends(verify_session)
 ) -> Dict:
     """
-    Exchange public token for access token and item ID, then store account information
+    Exchange public token for access token and item ID and store the token.
+
+    Institution details and accounts are fetched by a background job;
+    poll /jobs/{job_id} for its progress.
     """
     try:
         user_id = session.get_user_id()
         
         # Exchange public token for access token
-        exchange_request = ItemPublicTokenExchangeRequest(
-            public_token=public_token
-        )
-        exchange_response = plaid_client.item_public_token_exchange(exchange_request)
-        access_token = exchange_response["access_token"]
-        item_id = exchange_response["item_id"]
-        
-        # Get institution information
-        item_response = plaid_client.item_get(access_token)
-        institution_id = item_response['item']['institution_id']
-        
-        institution_request = InstitutionsGetByIdRequest(
-            institution_id=institution_id,
-            country_codes=[CountryCode('US')]
-        )
-        institution_response = plaid_client.institutions_get_by_id(institution_request)
-        institution_name = institution_response['institution']['name']
+        async def exchange() -> Dict:
+            exchange_request = plaid_models.ItemPublicTokenExchangeRequest(
+                public_token=public_token
+            )
+            return await plaid_gateway.item_public_token_exchange(exchange_request)
         
         # Store encrypted access token
-        await token_service.store_token(
-            access_token=access_token,
-            item_id=item_id,
-            user_id=user_id,
-            institution_id=institution_id,
-            institution_name=institution_name
-        )
-        
-        # Get account information
-        accounts_request = AccountsGetRequest(
-            access_token=access_token
-        )
-        accounts_response = plaid_client.accounts_get(accounts_request)
-        
-        # Store accounts in Baserow
-        accounts_table_id = os.getenv("BASEROW_ACCOUNTS_TABLE_ID")
-        for account in accounts_response["accounts"]:
-            account_data = AccountCreate(
-                plaid_account_id=account["account_id"],
-                plaid_item_id=item_id,
-                name=account["name"],
-                official_name=account.get("official_name"),
-                type=account["type"],
-                subtype=account.get("subtype"),
-                balance_current=Decimal(str(account["balances"]["current"])) if account["balances"]["current"] is not None else Decimal("0"),
-                balance_available=Decimal(str(account["balances"]["available"])) if account["balances"]["available"] is not None else None,
-                iso_currency_code=account["balances"]["iso_currency_code"],
+        async def store_token(exchange_response: Dict) -> Dict:
+            return await token_service.store_token(
+                access_token=exchange_response["access_token"],
+                item_id=exchange_response["item_id"],
                 user_id=user_id
             )
-            
-            await baserow_request(
-                method="POST",
-                endpoint=f"/database/rows/table/{accounts_table_id}/",
-                data=account_data.dict()
+        
+        # Hand the rest of the Link work to the job queue
+        async def enqueue(exchange_response: Dict, stored_token: Dict) -> Dict:
+            return await job_queue.enqueue(
+                POST_LINK_JOB,
+                user_id,
+                {"user_id": user_id, "item_id": exchange_response["item_id"]}
             )
         
+        pipeline = (
+            Pipeline("exchange_public_token")
+            .stage("exchange", exchange)
+            .stage("store_token", store_token, after=["exchange"])
+            .stage("enqueue", enqueue, after=["exchange", "store_token"])
+        )
+        try:
+            results = await pipeline.run()
+        finally:
+            response.headers["Server-Timing"] = pipeline.server_timing()
+        await response_cache.invalidate_user(user_id)
+        
+        job = results["enqueue"]
         return {
-            "item_id": item_id,
-            "institution_name": institution_name,
-            "accounts_added": len(accounts_response["accounts"])
+            "item_id": results["exchange"]["item_id"],
+            "job_id": job["id"],
+            "status": job["status"]
         }
     
     except Exception as e:
@@ -136,12 +122,14 @@ async def get_accounts(session: SessionContainer = Depends(verify_session)) -> L
         accounts_table_id = os.getenv("BASEROW_ACCOUNTS_TABLE_ID")
         
         # Query Baserow for user's accounts
-        response = await baserow_request(
-            method="GET",
-            endpoint=f"/database/rows/table/{accounts_table_id}/?user_id={user_id}"
+        return await response_cache.get_or_load(
+            "accounts",
+            user_id,
+            lambda: replica_store.list_rows(
+                BaserowQuery(accounts_table_id).equal("user_id", user_id),
+                "accounts"
+            )
         )
-        
-        return response.get("results", [])
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -156,50 +144,99 @@ async def update_accounts(
     """
     try:
         user_id = session.get_user_id()
-        accounts_table_id = os.getenv("BASEROW_ACCOUNTS_TABLE_ID")
         
-        # Get access token
-        access_token = await token_service.get_access_token(plaid_item_id, user_id)
-        if not access_token:
-            raise HTTPException(status_code=404, detail="Access token not found")
+        result = await account_refresh_service.refresh_item(user_id, plaid_item_id)
         
-        # Get current accounts from Baserow
-        current_accounts = await baserow_request(
-            method="GET",
-            endpoint=f"/database/rows/table/{accounts_table_id}/?user_id={user_id}&plaid_item_id={plaid_item_id}"
-        )
+        return {
+            "status": "success",
+            "message": "Accounts updated successfully",
+            "accounts_updated": result["accounts_updated"]
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/accounts/refresh-all")
+async def refresh_all_accounts(
+    background_tasks: BackgroundTasks,
+    background: bool = False,
+    session: SessionContainer = Depends(verify_session)
+) -> Dict:
+    """
+    Refresh balances for every connected item of the user concurrently
+    """
+    try:
+        user_id = session.get_user_id()
         
-        # Get fresh account data from Plaid
-        accounts_request = AccountsGetRequest(
-            access_token=access_token
-        )
-        plaid_accounts = plaid_client.accounts_get(accounts_request)
+        if background:
+            background_tasks.add_task(account_refresh_service.refresh_all, user_id)
+            return {"status": "accepted", "message": "Account refresh started"}
         
-        # Update each account
-        for account in current_accounts.get("results", []):
-            plaid_account = next(
-                (a for a in plaid_accounts["accounts"] if a["account_id"] == account["plaid_account_id"]),
-                None
-            )
-            
-            if plaid_account:
-                update_data = AccountUpdate(
-                    balance_current=Decimal(str(plaid_account["balances"]["current"])) if plaid_account["balances"]["current"] is not None else Decimal("0"),
-                    balance_available=Decimal(str(plaid_account["balances"]["available"])) if plaid_account["balances"]["available"] is not None else None,
-                    last_updated=datetime.utcnow()
-                )
-                
-                await baserow_request(
-                    method="PATCH",
-                    endpoint=f"/database/rows/table/{accounts_table_id}/{account['id']}/",
-                    data=update_data.dict()
-                )
-        
-        return {"status": "success", "message": "Accounts updated successfully"}
+        items = await account_refresh_service.refresh_all(user_id)
+        
+        return {
+            "status": "success" if all(item["status"] == "success" for item in items) else "partial",
+            "items": items
+        }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/transactions/sync")
+async def sync_transactions(
+    background_tasks: BackgroundTasks,
+    item_id: str = None,
+    background: bool = False,
+    session: SessionContainer = Depends(verify_session)
+) -> Dict:
+    """
+    Pull new, modified and removed transactions from Plaid since the last sync
+    """
+    try:
+        user_id = session.get_user_id()
+        
+        if item_id:
+            run = partial(transaction_sync_service.sync_item, user_id, item_id)
+        else:
+            run = partial(transaction_sync_service.sync_user, user_id)
+        
+        if background:
+            background_tasks.add_task(run)
+            return {"status": "accepted", "message": "Transaction sync started"}
+        
+        result = await run()
+        
+        if item_id:
+            return {"status": "success", "items": [{**result, "status": "success"}]}
+        return {
+            "status": "success" if all(item["status"] == "success" for item in result) else "partial",
+            "items": result
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/webhook")
+async def plaid_webhook(request: Request) -> Dict:
+    """
+    Receive Plaid webhooks and queue the per-item work they call for
+    """
+    body = await request.body()
+    await webhook_verifier.verify(body, request.headers.get("Plaid-Verification"))
+    
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    
+    item_id = payload.get("item_id")
+    webhook_type = payload.get("webhook_type")
+    webhook_code = payload.get("webhook_code")
+    if item_id and webhook_type and webhook_code:
+        webhook_dispatcher.enqueue(item_id, webhook_type, webhook_code)
+    
+    return {"status": "accepted"}
+
 @router.delete("/disconnect/{item_id}")
 async def disconnect_account(
     item_id: str,
@@ -210,23 +247,23 @@ async def disconnect_account(
     """
     try:
         user_id = session.get_user_id()
-        accounts_table_id = os.getenv("BASEROW_ACCOUNTS_TABLE_ID")
         
         # Get access token and revoke it
         access_token = await token_service.get_access_token(item_id, user_id)
         if access_token:
             # Remove item from Plaid
-            plaid_client.item_remove(access_token)
+            await plaid_gateway.item_remove(access_token)
             # Revoke token in our storage
             await token_service.revoke_token(item_id, user_id)
         
-        # Delete accounts from Baserow
-        await baserow_request(
-            method="DELETE",
-            endpoint=f"/database/rows/table/{accounts_table_id}/?user_id={user_id}&plaid_item_id={item_id}"
-        )
+        # Delete the item's accounts and their transactions from Baserow
+        deleted = await cascade_delete_service.delete_item(user_id, item_id)
         
-        return {"status": "success", "message": "Account disconnected successfully"}
+        return {
+            "status": "success",
+            "message": "Account disconnected successfully",
+            "deleted": deleted
+        }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -242,12 +279,21 @@ async def get_connected_institutions(
         user_id = session.get_user_id()
         tokens = await token_service.get_user_tokens(user_id)
         
-        return [{
-            "item_id": token["plaid_item_id"],
-            "institution_name": token["institution_name"],
-            "institution_id": token["institution_id"],
-            "status": token["status"]
-        } for token in tokens]
+        institutions = []
+        for token in tokens:
+            # Enrich from the institution cache only; never call Plaid here
+            metadata = institution_cache.peek(token["institution_id"]) if token["institution_id"] else None
+            institutions.append({
+                "item_id": token["plaid_item_id"],
+                "institution_name": token["institution_name"],
+                "institution_id": token["institution_id"],
+                "status": token["status"],
+                "url": metadata["url"] if metadata else None,
+                "logo": metadata["logo"] if metadata else None,
+                "primary_color": metadata["primary_color"] if metadata else None
+            })
+        
+        return institutions
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
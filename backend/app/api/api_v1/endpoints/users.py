@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import Dict, List
-from supertokens_python.recipe.session.framework.fastapi import verify_session
 from supertokens_python.recipe.session import SessionContainer
-from supertokens_python.recipe.emailpassword.asyncio import update_email_or_password
-from supertokens_python.recipe.thirdpartyemailpassword.asyncio import get_user_by_id
+from ....core.session import verify_session
 from pydantic import BaseModel, EmailStr
 from ..endpoints.baserow import baserow_request
+from ....core.pipeline import Pipeline
+from ....services.baserow_query import BaserowQuery
+from ....services.replica_store import replica_store
+from ....services.response_cache import response_cache
 import os
 from datetime import datetime
 
@@ -26,6 +28,8 @@ async def get_user_profile(session: SessionContainer = Depends(verify_session))
     """
     Get the current user's profile information
     """
+    from supertokens_python.recipe.thirdpartyemailpassword.asyncio import get_user_by_id
+
     try:
         user_id = session.get_user_id()
         user = await get_user_by_id(user_id)
@@ -50,6 +54,8 @@ async def update_profile(
     """
     Update user profile information (email and/or password)
     """
+    from supertokens_python.recipe.emailpassword.asyncio import update_email_or_password
+
     try:
         user_id = session.get_user_id()
         
@@ -68,7 +74,10 @@ async def update_profile(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/connected-accounts")
-async def get_connected_accounts(session: SessionContainer = Depends(verify_session)) -> Dict:
+async def get_connected_accounts(
+    response: Response,
+    session: SessionContainer = Depends(verify_session)
+) -> Dict:
     """
     Get all connected bank accounts for the user with their balances and institutions
     """
@@ -77,59 +86,73 @@ async def get_connected_accounts(session: SessionContainer = Depends(verify_sess
         accounts_table_id = os.getenv("BASEROW_ACCOUNTS_TABLE_ID")
         tokens_table_id = os.getenv("BASEROW_TOKENS_TABLE_ID")
         
-        # Get user's accounts
-        accounts_response = await baserow_request(
-            method="GET",
-            endpoint=f"/database/rows/table/{accounts_table_id}/?user_id={user_id}"
-        )
-        
-        # Get institution information
-        tokens_response = await baserow_request(
-            method="GET",
-            endpoint=f"/database/rows/table/{tokens_table_id}/?user_id={user_id}&status=active"
-        )
+        async def load_connected_accounts() -> Dict:
+            # Get user's accounts and institution information concurrently
+            pipeline = (
+                Pipeline("connected_accounts")
+                .stage("accounts", lambda: replica_store.list_rows(
+                    BaserowQuery(accounts_table_id)
+                    .equal("user_id", user_id)
+                    .include("plaid_item_id", "name", "type", "subtype", "balance_current", "balance_available", "iso_currency_code"),
+                    "connected_accounts"
+                ))
+                .stage("tokens", lambda: replica_store.list_rows(
+                    BaserowQuery(tokens_table_id)
+                    .equal("user_id", user_id)
+                    .equal("status", "active")
+                    .include("plaid_item_id", "institution_name", "institution_id"),
+                    "connected_accounts"
+                ))
+            )
+            try:
+                results = await pipeline.run()
+            finally:
+                response.headers["Server-Timing"] = pipeline.server_timing()
+            accounts, tokens = results["accounts"], results["tokens"]
         
-        # Create a map of item_id to institution info
-        institution_map = {
-            token["plaid_item_id"]: {
-                "institution_name": token["institution_name"],
-                "institution_id": token["institution_id"]
+            # Create a map of item_id to institution info
+            institution_map = {
+                token["plaid_item_id"]: {
+                    "institution_name": token["institution_name"],
+                    "institution_id": token["institution_id"]
+                }
+                for token in tokens
             }
-            for token in tokens_response.get("results", [])
-        }
         
-        # Group accounts by institution
-        accounts_by_institution = {}
-        for account in accounts_response.get("results", []):
-            item_id = account["plaid_item_id"]
-            institution_info = institution_map.get(item_id, {})
+            # Group accounts by institution
+            accounts_by_institution = {}
+            for account in accounts:
+                item_id = account["plaid_item_id"]
+                institution_info = institution_map.get(item_id, {})
             
-            if institution_info.get("institution_name") not in accounts_by_institution:
-                accounts_by_institution[institution_info.get("institution_name", "Unknown")] = {
-                    "institution_id": institution_info.get("institution_id"),
-                    "accounts": []
-                }
+                if institution_info.get("institution_name") not in accounts_by_institution:
+                    accounts_by_institution[institution_info.get("institution_name", "Unknown")] = {
+                        "institution_id": institution_info.get("institution_id"),
+                        "accounts": []
+                    }
             
-            accounts_by_institution[institution_info.get("institution_name", "Unknown")]["accounts"].append({
-                "id": account["id"],
-                "name": account["name"],
-                "type": account["type"],
-                "subtype": account["subtype"],
-                "balance_current": float(account["balance_current"]),
-                "balance_available": float(account["balance_available"]) if account["balance_available"] else None,
-                "currency": account["iso_currency_code"]
-            })
+                accounts_by_institution[institution_info.get("institution_name", "Unknown")]["accounts"].append({
+                    "id": account["id"],
+                    "name": account["name"],
+                    "type": account["type"],
+                    "subtype": account["subtype"],
+                    "balance_current": float(account["balance_current"]),
+                    "balance_available": float(account["balance_available"]) if account["balance_available"] else None,
+                    "currency": account["iso_currency_code"]
+                })
         
-        return {
-            "institutions": [
-                {
-                    "name": institution_name,
-                    "institution_id": info["institution_id"],
-                    "accounts": info["accounts"]
-                }
-                for institution_name, info in accounts_by_institution.items()
-            ]
-        }
+            return {
+                "institutions": [
+                    {
+                        "name": institution_name,
+                        "institution_id": info["institution_id"],
+                        "accounts": info["accounts"]
+                    }
+                    for institution_name, info in accounts_by_institution.items()
+                ]
+            }
+        
+        return await response_cache.get_or_load("connected_accounts", user_id, load_connected_accounts)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -150,7 +173,7 @@ async def newsletter_signup(email: EmailStr) -> Dict:
         # Check if email already exists
         existing = await baserow_request(
             method="GET",
-            endpoint=f"/database/rows/table/{newsletter_table_id}/?email={email}"
+            endpoint=BaserowQuery(newsletter_table_id).equal("email", email).include("email").size(1)
         )
         
         if existing.get("results"):
@@ -164,7 +187,7 @@ async def newsletter_signup(email: EmailStr) -> Dict:
         
         await baserow_request(
             method="POST",
-            endpoint=f"/database/rows/table/{newsletter_table_id}/",
+            endpoint=f"/database/rows/table/{newsletter_table_id}/?user_field_names=true",
             data=signup_data.dict()
         )
         
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import subprocess
+import sys
+from collections import defaultdict
+from dotenv import load_dotenv
+
+# Load environment variables before the services read their configuration
+load_dotenv()
+
+async def rebuild_rollups(args: argparse.Namespace) -> None:
+    from app.services.baserow_client import baserow_client
+    from app.services.rollup_store import rollup_store
+
+    await baserow_client.start()
+    try:
+        if args.user_id:
+            await rollup_store.rebuild_user(args.user_id)
+            print(f"Rebuilt rollups for user {args.user_id}")
+        else:
+            print(f"Rebuilt rollups for {await rollup_store.rebuild_all()} users")
+    finally:
+        await baserow_client.close()
+        rollup_store.close()
+
+async def reencrypt_tokens(args: argparse.Namespace) -> None:
+    from app.services.baserow_client import baserow_client
+    from app.services.key_rotation import key_rotation_service
+
+    async def progress(counts) -> None:
+        print(f"Scanned {counts['scanned']} tokens, re-encrypted {counts['reencrypted']}")
+
+    await baserow_client.start()
+    try:
+        counts = await key_rotation_service.reencrypt_tokens(on_progress=progress)
+        print(
+            f"Re-encrypted {counts['reencrypted']} of {counts['scanned']} tokens "
+            f"({counts['unreadable']} unreadable, {counts['failed']} failed)"
+        )
+    finally:
+        await baserow_client.close()
+
+def _parse_importtime(stderr: str):
+    """
+    (module, self µs, cumulative µs) rows from -X importtime output
+    """
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        yield name.strip(), int(self_us), int(cumulative_us)
+
+async def startup_report(args: argparse.Namespace) -> None:
+    # A fresh interpreter, so nothing this process imported is counted as free
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+        capture_output=True,
+        text=True
+    )
+    rows = list(_parse_importtime(result.stderr))
+    if result.returncode != 0:
+        traceback = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        print("\n".join(traceback), file=sys.stderr)
+        raise SystemExit(f"Importing {args.module} failed")
+
+    total_us = sum(self_us for _, self_us, _ in rows)
+    print(f"Importing {args.module}: {total_us / 1000:.1f} ms across {len(rows)} modules")
+
+    packages = defaultdict(int)
+    for name, self_us, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    print(f"\nTop {args.top} packages by self time:")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {self_us / 1000:9.1f} ms  {package}")
+
+    print(f"\nTop {args.top} modules by self time:")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: -row[1])[:args.top]:
+        print(f"  {self_us / 1000:9.1f} ms  {name} (cumulative {cumulative_us / 1000:.1f} ms)")
+
+def main() -> None:
+    """
+    Maintenance commands: python -m app.cli <command>
+    """
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rollups = commands.add_parser("rebuild-rollups", help="Backfill transaction rollups from Baserow")
+    rollups.add_argument("--user-id", help="Only rebuild this user's rollups")
+    rollups.set_defaults(handler=rebuild_rollups)
+
+    reencrypt = commands.add_parser(
+        "reencrypt-tokens",
+        help="Re-encrypt stored access tokens with the first key in ENCRYPTION_KEYS"
+    )
+    reencrypt.set_defaults(handler=reencrypt_tokens)
+
+    report = commands.add_parser(
+        "startup-report",
+        help="Time importing the application and list the slowest modules"
+    )
+    report.add_argument("--module", default="app.main", help="Module to import (default: app.main)")
+    report.add_argument("--top", type=int, default=15, help="Number of packages and modules to list")
+    report.set_defaults(handler=startup_report)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+if __name__ == "__main__":
+    main()
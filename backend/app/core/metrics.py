@@ -0,0 +1,255 @@
+import asyncio
+import functools
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Route template of the request being served; "background" outside requests
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="background")
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sample = Tuple[Dict[str, str], float]
+# A collector returns (name, type, help, samples) for values kept elsewhere
+Collected = Tuple[str, str, str, List[Sample]]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def _labels(self, key: Tuple[str, ...], **extra: str) -> str:
+        return _format_labels({**dict(zip(self.labels, key)), **extra})
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return self._header() + [
+            f"{self.name}{self._labels(key)} {value}" for key, value in self._values.items()
+        ]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *label_values: str) -> None:
+        state = self._values.get(label_values)
+        if state is None:
+            # Per-bucket counts (not cumulative) plus the +Inf bucket, sum and count
+            state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{self._labels(key, le=repr(bound))} {cumulative}")
+            lines.append(f'{self.name}_bucket{self._labels(key, le="+Inf")} {count}')
+            lines.append(f"{self.name}_sum{self._labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._labels(key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Process-local metrics rendered in the Prometheus text format.
+
+    Metrics are updated from the event loop thread with plain dict
+    operations, so recording costs well under a microsecond. Collectors
+    export values other components already keep (gateway, pipeline and
+    queue stats) at scrape time.
+    """
+    def __init__(self):
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+        self._collectors: List[Callable[[], Iterable[Collected]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Collected]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                lines.extend(f"{name}{_format_labels(labels)} {value}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+# Global instance
+metrics = MetricsRegistry()
+
+HTTP_DURATION = metrics.histogram(
+    "thrivebase_http_request_duration_seconds",
+    "Time spent serving HTTP requests",
+    ("endpoint", "method", "status")
+)
+HTTP_IN_FLIGHT = metrics.gauge(
+    "thrivebase_http_requests_in_flight",
+    "HTTP requests being served",
+    ("endpoint",)
+)
+UPSTREAM_DURATION = metrics.histogram(
+    "thrivebase_upstream_duration_seconds",
+    "Time spent in calls to dependencies (Baserow, Plaid, SuperTokens, Fernet, token service)",
+    ("upstream", "operation", "endpoint")
+)
+UPSTREAM_ERRORS = metrics.counter(
+    "thrivebase_upstream_errors_total",
+    "Dependency calls that raised",
+    ("upstream", "operation", "endpoint")
+)
+UPSTREAM_IN_FLIGHT = metrics.gauge(
+    "thrivebase_upstream_in_flight",
+    "Dependency calls in progress",
+    ("upstream", "operation")
+)
+
+class track:
+    """
+    Time a dependency call: with track("baserow", "GET rows"): ...
+    """
+    __slots__ = ("upstream", "operation", "started")
+
+    def __init__(self, upstream: str, operation: str):
+        self.upstream = upstream
+        self.operation = operation
+
+    def __enter__(self) -> "track":
+        UPSTREAM_IN_FLIGHT.inc(self.upstream, self.operation)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        duration = time.perf_counter() - self.started
+        endpoint = current_endpoint.get()
+        UPSTREAM_IN_FLIGHT.dec(self.upstream, self.operation)
+        UPSTREAM_DURATION.observe(duration, self.upstream, self.operation, endpoint)
+        if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+            UPSTREAM_ERRORS.inc(self.upstream, self.operation, endpoint)
+        return False
+
+def instrumented(upstream: str, operation: Optional[str] = None):
+    """
+    Decorator form of track for sync and async functions, named after the function by default
+    """
+    def decorate(fn):
+        name = operation or fn.__name__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with track(upstream, name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track(upstream, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each request under its route template.
+
+    The template (e.g. /api/v1/plaid/disconnect/{item_id}) keeps label
+    cardinality bounded and is also published in current_endpoint for
+    the dependency metrics recorded while the request is served.
+    """
+    def __init__(self, app, cache_size: int = 2048):
+        self.app = app
+        self.cache_size = cache_size
+        self._templates: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+    def _template(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        template = self._templates.get(key)
+        if template is not None:
+            return template
+
+        from starlette.routing import Match
+        template = "unmatched"
+        router = getattr(scope.get("app"), "router", None)
+        for route in getattr(router, "routes", ()):
+            match, _ = route.matches(scope)
+            if match != Match.NONE:
+                template = getattr(route, "path", template)
+                if match == Match.FULL:
+                    break
+        self._templates[key] = template
+        if len(self._templates) > self.cache_size:
+            self._templates.popitem(last=False)
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._template(scope)
+        token = current_endpoint.set(endpoint)
+        status = {"code": "500"}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(endpoint)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(endpoint)
+            HTTP_DURATION.observe(time.perf_counter() - started, endpoint, scope["method"], status["code"])
+            current_endpoint.reset(token)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple
+
+class PipelineStats:
+    """
+    Aggregated per-stage latency of every pipeline run in this process
+    """
+    def __init__(self):
+        self._stages: Dict[Tuple[str, str], Dict] = defaultdict(
+            lambda: {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+        )
+
+    def record(self, pipeline: str, stage: str, duration_ms: float, failed: bool = False) -> None:
+        stats = self._stages[(pipeline, stage)]
+        stats["count"] += 1
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        if failed:
+            stats["errors"] += 1
+
+    def snapshot(self) -> Dict:
+        snapshot: Dict[str, Dict] = defaultdict(dict)
+        for (pipeline, stage), stats in self._stages.items():
+            snapshot[pipeline][stage] = {
+                **stats,
+                "avg_ms": round(stats["total_ms"] / stats["count"], 2) if stats["count"] else 0.0
+            }
+        return dict(snapshot)
+
+class Pipeline:
+    """
+    Runs named async stages concurrently, each as soon as its dependencies are done.
+
+    A stage receives the results of the stages it runs after, in order.
+    Like asyncio.gather, the first failure is raised, but every stage still
+    running is cancelled first. Stage latencies are kept on the run (for a
+    Server-Timing header) and added to pipeline_stats.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+        self.timings: Dict[str, float] = {}
+        self.critical_path: List[str] = []
+
+    def stage(self, name: str, fn: Callable[..., Awaitable[Any]], after: Iterable[str] = ()) -> "Pipeline":
+        after = tuple(after)
+        for dependency in after:
+            if dependency not in self._stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+        self._stages[name] = (fn, after)
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        tasks: Dict[str, asyncio.Task] = {}
+        finished_at: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        async def run_stage(name: str) -> Any:
+            fn, after = self._stages[name]
+            inputs = [await tasks[dependency] for dependency in after]
+            stage_started = time.perf_counter()
+            failed = True
+            try:
+                result = await fn(*inputs)
+                failed = False
+                return result
+            finally:
+                now = time.perf_counter()
+                duration_ms = (now - stage_started) * 1000
+                finished_at[name] = now
+                self.timings[name] = round(duration_ms, 2)
+                pipeline_stats.record(self.name, name, duration_ms, failed=failed)
+
+        # Stages are declared after their dependencies, so tasks exist before they are awaited
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+
+        self.critical_path = self._critical_path(finished_at)
+        return {name: task.result() for name, task in tasks.items()}
+
+    def _critical_path(self, finished_at: Dict[str, float]) -> List[str]:
+        # Walk back from the stage that finished last through the dependency
+        # that finished last at each step
+        if not finished_at:
+            return []
+        path = [max(finished_at, key=finished_at.get)]
+        while self._stages[path[-1]][1]:
+            path.append(max(self._stages[path[-1]][1], key=finished_at.get))
+        return list(reversed(path))
+
+    def server_timing(self) -> str:
+        """
+        Stage latencies formatted for a Server-Timing response header
+        """
+        entries = [f"{name};dur={duration}" for name, duration in self.timings.items()]
+        if self.critical_path:
+            entries.append(f'critical_path;desc="{">".join(self.critical_path)}"')
+        return ", ".join(entries)
+
+# Global instance
+pipeline_stats = PipelineStats()
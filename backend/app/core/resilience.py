@@ -0,0 +1,232 @@
+import asyncio
+import math
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from fastapi import HTTPException
+from .metrics import metrics
+
+T = TypeVar("T")
+
+# Circuit breaker states
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+UPSTREAM_RETRIES = metrics.counter(
+    "thrivebase_upstream_retries_total",
+    "Dependency calls retried after a transient failure",
+    ("upstream", "reason")
+)
+UPSTREAM_SHORT_CIRCUITED = metrics.counter(
+    "thrivebase_upstream_short_circuited_total",
+    "Dependency calls failed fast because the circuit was open",
+    ("upstream",)
+)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header (delta-seconds or an HTTP date)
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class TransientError(Exception):
+    """
+    A failed upstream call that may succeed when repeated.
+
+    error is what the caller sees if the call is not retried. processed is
+    False when the upstream certainly did not act on the request (a 429,
+    a refused connection), which makes even a non-idempotent call safe to
+    repeat. throttled marks a rate-limit response: the upstream is up, so
+    it does not count towards opening the circuit.
+    """
+    def __init__(
+        self,
+        error: Exception,
+        reason: str,
+        retry_after: Optional[float] = None,
+        processed: bool = True,
+        throttled: bool = False
+    ):
+        super().__init__(str(error))
+        self.error = error
+        self.reason = reason
+        self.retry_after = retry_after
+        self.processed = processed
+        self.throttled = throttled
+
+class TokenBucket:
+    """
+    Client-side rate limiter: rate requests per second with bursts of up to capacity
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold every caller back, e.g. for the Retry-After of a 429
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class CircuitBreaker:
+    """
+    Fails calls fast once an upstream keeps failing.
+
+    After failure_threshold consecutive transient failures the circuit
+    opens and calls are rejected with a 503 for reset_timeout seconds.
+    Then a single trial call is let through (half-open): its success
+    closes the circuit, its failure opens it again.
+    """
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    def before_call(self) -> None:
+        if self.failure_threshold <= 0 or self.state == CLOSED:
+            return
+        if self.state == OPEN:
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                self._reject(remaining)
+            self.state = HALF_OPEN
+        if self._trial_running:
+            self._reject(self.reset_timeout)
+        self._trial_running = True
+
+    def _reject(self, retry_after: float):
+        UPSTREAM_SHORT_CIRCUITED.inc(self.name)
+        raise HTTPException(
+            status_code=503,
+            detail=f"{self.name} is unavailable",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self._failures = 0
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_running = False
+        if self.state == HALF_OPEN or (self.failure_threshold > 0 and self._failures >= self.failure_threshold):
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """
+        End a call whose outcome says nothing about the upstream's health
+        """
+        self._trial_running = False
+
+class ResilientTransport:
+    """
+    Retries, rate limiting and circuit breaking around one upstream.
+
+    Settings are read from <PREFIX>_RETRY_ATTEMPTS, _RETRY_BASE_DELAY,
+    _RETRY_MAX_DELAY, _RATE_LIMIT (requests per second in this process,
+    0 disables), _RATE_BURST, _BREAKER_FAILURES (0 disables) and
+    _BREAKER_RESET.
+    Calls are retried with full-jitter exponential backoff, or after the
+    upstream's Retry-After when it sends one; a Retry-After beyond the
+    maximum delay fails the call instead of holding the request open.
+    """
+    def __init__(
+        self,
+        name: str,
+        env_prefix: str,
+        retry_attempts: int = 3,
+        retry_base_delay: float = 0.2,
+        retry_max_delay: float = 5.0,
+        rate_limit: float = 0.0,
+        breaker_failures: int = 5,
+        breaker_reset: float = 30.0
+    ):
+        def setting(key: str, default) -> str:
+            return os.getenv(f"{env_prefix}_{key}", str(default))
+
+        self.name = name
+        self.retry_attempts = max(int(setting("RETRY_ATTEMPTS", retry_attempts)), 1)
+        self.retry_base_delay = float(setting("RETRY_BASE_DELAY", retry_base_delay))
+        self.retry_max_delay = float(setting("RETRY_MAX_DELAY", retry_max_delay))
+        rate = float(setting("RATE_LIMIT", rate_limit))
+        self.limiter = TokenBucket(rate, float(setting("RATE_BURST", rate))) if rate > 0 else None
+        self.breaker = CircuitBreaker(
+            name,
+            int(setting("BREAKER_FAILURES", breaker_failures)),
+            float(setting("BREAKER_RESET", breaker_reset))
+        )
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        if retry_after is not None:
+            return retry_after if retry_after <= self.retry_max_delay else None
+        ceiling = min(self.retry_base_delay * 2 ** (attempt - 1), self.retry_max_delay)
+        return random.uniform(0, ceiling)
+
+    async def call(self, send: Callable[[], Awaitable[T]], idempotent: bool) -> T:
+        """
+        Run send, which raises TransientError for failures worth retrying
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            try:
+                if self.limiter is not None:
+                    await self.limiter.acquire()
+                result = await send()
+            except TransientError as e:
+                if e.throttled:
+                    self.breaker.release()
+                else:
+                    self.breaker.record_failure()
+                if self.limiter is not None and e.retry_after:
+                    self.limiter.pause(e.retry_after)
+                delay = self._backoff(attempt, e.retry_after)
+                if attempt >= self.retry_attempts or delay is None or (e.processed and not idempotent):
+                    raise e.error
+                UPSTREAM_RETRIES.inc(self.name, e.reason)
+                await asyncio.sleep(delay)
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    def stats(self) -> Dict:
+        return {
+            "circuit": self.breaker.state,
+            "rate_limit": self.limiter.rate if self.limiter is not None else None
+        }
@@ -1,26 +1,88 @@
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+import asyncio
 import os
 import base64
-from typing import Optional
+import threading
+from typing import List, Optional, Sequence, Tuple
+from .metrics import instrumented
+
+# Batches at least this large are encrypted or decrypted on a worker thread
+OFFLOAD_BATCH_SIZE = 16
+
+def _legacy_fernet(key: str) -> Fernet:
+    """
+    The key ENCRYPTION_KEY has always been turned into: its first 32 bytes, base64-encoded
+    """
+    # Ensure the key is properly padded for base64 encoding
+    key_bytes = key.encode()
+    padding = len(key_bytes) % 4
+    if padding:
+        key_bytes += b'=' * (4 - padding)
+    return Fernet(base64.urlsafe_b64encode(key_bytes[:32]))
 
 class TokenEncryption:
+    """
+    Fernet encryption of access tokens with key rotation.
+
+    ENCRYPTION_KEYS is a comma-separated list of Fernet keys, newest first:
+    tokens are encrypted with the first and decrypted with any of them.
+    The key derived from the legacy ENCRYPTION_KEY is always accepted for
+    decryption, and is used for encryption when ENCRYPTION_KEYS is unset.
+
+    Keys are read and parsed on first use; load() does it up front so a
+    missing or malformed key fails the application at startup.
+    """
     def __init__(self):
-        key = os.getenv("ENCRYPTION_KEY")
-        if not key:
-            raise ValueError("ENCRYPTION_KEY environment variable is required")
-        
-        # Ensure the key is properly padded for base64 encoding
-        key_bytes = key.encode()
-        padding = len(key_bytes) % 4
-        if padding:
-            key_bytes += b'=' * (4 - padding)
-        
+        self._keys: Optional[Tuple[List[Fernet], MultiFernet]] = None
+        self._load_lock = threading.Lock()
+
+    def load(self) -> None:
+        """
+        Read and validate the configured keys
+        """
+        if self._keys is not None:
+            return
+        with self._load_lock:
+            if self._keys is not None:
+                return
+            keys = [key.strip() for key in os.getenv("ENCRYPTION_KEYS", "").split(",") if key.strip()]
+            legacy_key = os.getenv("ENCRYPTION_KEY")
+            if not keys and not legacy_key:
+                raise ValueError("ENCRYPTION_KEYS or ENCRYPTION_KEY environment variable is required")
+
+            try:
+                fernets = [Fernet(key) for key in keys]
+                if legacy_key:
+                    fernets.append(_legacy_fernet(legacy_key))
+            except Exception as e:
+                raise ValueError(f"Invalid encryption key: {str(e)}")
+
+            self._keys = (fernets, MultiFernet(fernets))
+
+    @property
+    def primary(self) -> Fernet:
+        self.load()
+        return self._keys[0][0]
+
+    @property
+    def fernet(self) -> MultiFernet:
+        self.load()
+        return self._keys[1]
+
+    @property
+    def key_count(self) -> int:
+        self.load()
+        return len(self._keys[0])
+
+    def _decrypt(self, encrypted_token: str) -> Optional[str]:
+        if not encrypted_token:
+            return None
         try:
-            # Convert the base64 key to bytes for Fernet
-            self.fernet = Fernet(base64.urlsafe_b64encode(key_bytes[:32]))
-        except Exception as e:
-            raise ValueError(f"Invalid encryption key: {str(e)}")
-    
+            return self.fernet.decrypt(encrypted_token.encode()).decode()
+        except Exception:
+            return None
+
+    @instrumented("fernet", "encrypt")
     def encrypt_token(self, token: str) -> str:
         """
         Encrypt a token string
@@ -28,17 +90,95 @@ class TokenEncryption:
         if not token:
             return None
         return self.fernet.encrypt(token.encode()).decode()
-    
+
+    @instrumented("fernet", "decrypt")
     def decrypt_token(self, encrypted_token: str) -> Optional[str]:
         """
         Decrypt an encrypted token string
         """
+        return self._decrypt(encrypted_token)
+
+    def needs_rotation(self, encrypted_token: str) -> bool:
+        """
+        Whether a token is encrypted with a key other than the current one
+        """
+        if not encrypted_token or self.key_count == 1:
+            return False
+        try:
+            self.primary.decrypt(encrypted_token.encode())
+            return False
+        except InvalidToken:
+            return True
+
+    def rotate_token(self, encrypted_token: str) -> Optional[str]:
+        """
+        Re-encrypt a token with the current key; None if no key can decrypt it
+        """
         if not encrypted_token:
             return None
         try:
-            return self.fernet.decrypt(encrypted_token.encode()).decode()
-        except Exception:
+            return self.fernet.rotate(encrypted_token.encode()).decode()
+        except InvalidToken:
             return None
 
+    def encrypt_many(self, tokens: Sequence[str]) -> List[Optional[str]]:
+        return [self.fernet.encrypt(token.encode()).decode() if token else None for token in tokens]
+
+    def decrypt_many(self, encrypted_tokens: Sequence[str]) -> List[Optional[str]]:
+        return [self._decrypt(encrypted_token) for encrypted_token in encrypted_tokens]
+
+    def _rotate_stale(self, encrypted_token: str) -> Optional[str]:
+        data = encrypted_token.encode()
+        primary, *older = self._keys[0]
+        try:
+            primary.decrypt(data)
+            return encrypted_token
+        except InvalidToken:
+            pass
+        for fernet in older:
+            try:
+                token = fernet.decrypt(data)
+            except InvalidToken:
+                continue
+            # Keep the original timestamp, as MultiFernet.rotate does
+            return primary.encrypt_at_time(token, fernet.extract_timestamp(data)).decode()
+        return None
+
+    def rotate_many(self, encrypted_tokens: Sequence[str]) -> List[Optional[str]]:
+        """
+        Re-encrypt tokens under an older key, decrypting each token once.
+
+        Tokens already under the current key come back unchanged; None
+        marks an empty token or one that no configured key decrypts.
+        """
+        self.load()
+        return [self._rotate_stale(token) if token else None for token in encrypted_tokens]
+
+    async def _offload(self, function, items: Sequence[str]) -> List[Optional[str]]:
+        if len(items) < OFFLOAD_BATCH_SIZE:
+            return function(items)
+        return await asyncio.to_thread(function, items)
+
+    @instrumented("fernet", "encrypt_many")
+    async def aencrypt_many(self, tokens: Sequence[str]) -> List[Optional[str]]:
+        """
+        encrypt_many, on a worker thread for large batches
+        """
+        return await self._offload(self.encrypt_many, tokens)
+
+    @instrumented("fernet", "decrypt_many")
+    async def adecrypt_many(self, encrypted_tokens: Sequence[str]) -> List[Optional[str]]:
+        """
+        decrypt_many, on a worker thread for large batches
+        """
+        return await self._offload(self.decrypt_many, encrypted_tokens)
+
+    @instrumented("fernet", "rotate_many")
+    async def arotate_many(self, encrypted_tokens: Sequence[str]) -> List[Optional[str]]:
+        """
+        rotate_many, always on a worker thread: every token is decrypted
+        """
+        return await asyncio.to_thread(self.rotate_many, encrypted_tokens)
+
 # Global instance
 token_encryption = TokenEncryption()
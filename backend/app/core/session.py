@@ -0,0 +1,49 @@
+import os
+from fastapi import Request
+from supertokens_python.recipe.session import SessionContainer
+from supertokens_python.recipe.session.framework.fastapi import verify_session as supertokens_verify_session
+from .metrics import track
+
+_verify = supertokens_verify_session()
+
+async def verify_session(request: Request) -> SessionContainer:
+    """
+    Session dependency for endpoints: Depends(verify_session), timed as an upstream call
+    """
+    with track("supertokens", "verify_session"):
+        return await _verify(request)
+
+def init_supertokens() -> None:
+    """
+    Import the auth recipes and initialise SuperTokens (called from the startup hook).
+
+    The middleware and session dependency look SuperTokens up per request,
+    so this only has to finish before the first request is served.
+    """
+    import supertokens_python as supertokens
+    from supertokens_python.recipe import session, thirdpartyemailpassword
+    from supertokens_python.recipe.thirdparty.provider import GoogleProvider
+
+    supertokens.init(
+        app_info=supertokens.InputAppInfo(
+            app_name=os.getenv("SUPERTOKENS_APP_NAME"),
+            api_domain=os.getenv("SUPERTOKENS_API_DOMAIN"),
+            website_domain=os.getenv("SUPERTOKENS_WEBSITE_DOMAIN"),
+        ),
+        supertokens_config=supertokens.ConnectionConfig(
+            connection_uri=os.getenv("SUPERTOKENS_CONNECTION_URI"),
+            api_key=os.getenv("SUPERTOKENS_API_KEY")
+        ),
+        framework='fastapi',
+        recipe_list=[
+            thirdpartyemailpassword.init(
+                providers=[
+                    GoogleProvider(
+                        client_id=os.getenv("GOOGLE_CLIENT_ID"),
+                        client_secret=os.getenv("GOOGLE_CLIENT_SECRET")
+                    )
+                ]
+            ),
+            session.init()
+        ]
+    )
@@ -1,11 +1,15 @@
+import time
+
+# Cold-start timing; phases are exported on /metrics and /health
+_import_started = time.perf_counter()
+startup_seconds = {}
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+import asyncio
 import os
 from dotenv import load_dotenv
-import supertokens_python as supertokens
-from supertokens_python.recipe import emailpassword, session, thirdpartyemailpassword
-from supertokens_python.recipe.thirdparty.provider import GoogleProvider
 from supertokens_python.framework.fastapi import get_middleware
 
 # Load environment variables
@@ -26,43 +30,128 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure SuperTokens
-supertokens.init(
-    app_info=supertokens.InputAppInfo(
-        app_name=os.getenv("SUPERTOKENS_APP_NAME"),
-        api_domain=os.getenv("SUPERTOKENS_API_DOMAIN"),
-        website_domain=os.getenv("SUPERTOKENS_WEBSITE_DOMAIN"),
-    ),
-    supertokens_config=supertokens.ConnectionConfig(
-        connection_uri=os.getenv("SUPERTOKENS_CONNECTION_URI"),
-        api_key=os.getenv("SUPERTOKENS_API_KEY")
-    ),
-    framework='fastapi',
-    recipe_list=[
-        thirdpartyemailpassword.init(
-            providers=[
-                GoogleProvider(
-                    client_id=os.getenv("GOOGLE_CLIENT_ID"),
-                    client_secret=os.getenv("GOOGLE_CLIENT_SECRET")
-                )
-            ]
-        ),
-        session.init()
+# Add SuperTokens middleware; SuperTokens itself is initialised by the startup hook
+app.add_middleware(get_middleware())
+
+# Request metrics; added last so it also times the middleware above
+from app.core.metrics import MetricsMiddleware, metrics
+app.add_middleware(MetricsMiddleware)
+
+# Shared upstream clients
+from app.services.baserow_client import baserow_client
+from app.services.plaid_gateway import plaid_gateway
+from app.services.plaid_webhooks import webhook_dispatcher
+from app.core.pipeline import pipeline_stats
+from app.services.institution_cache import institution_cache
+from app.services.rollup_store import rollup_store
+from app.services.replica_store import replica_store
+from app.services.job_queue import job_queue
+from app.services import cascade_delete, key_rotation, plaid_link
+from app.services.key_rotation import REENCRYPT_TOKENS_JOB, SYSTEM_USER_ID
+
+from app.core.security import token_encryption
+from app.core.session import init_supertokens
+
+async def _init_auth():
+    started = time.perf_counter()
+    await asyncio.to_thread(init_supertokens)
+    startup_seconds["supertokens"] = time.perf_counter() - started
+
+@app.on_event("startup")
+async def startup():
+    started = time.perf_counter()
+    # Fail on a missing or malformed key now rather than on the first token
+    token_encryption.load()
+    # Recipe set-up is CPU-bound; it runs on a thread while the clients below start
+    auth_ready = asyncio.create_task(_init_auth())
+    await baserow_client.start()
+    await replica_store.start()
+    await webhook_dispatcher.start()
+    await asyncio.to_thread(institution_cache.load)
+    # Handlers must be registered before the queue resumes unfinished jobs
+    for service in (cascade_delete, key_rotation, plaid_link):
+        service.register()
+    await job_queue.start()
+    await auth_ready
+    if os.getenv("ENCRYPTION_REENCRYPT_ON_STARTUP", "false").lower() == "true":
+        # Safe to enqueue from every worker: rows already rotated are skipped
+        await job_queue.enqueue(REENCRYPT_TOKENS_JOB, SYSTEM_USER_ID, {})
+    # Import the Plaid SDK in the background so the first Link call does not pay for it
+    app.state.plaid_preload = asyncio.create_task(plaid_gateway.preload())
+    startup_seconds["startup"] = time.perf_counter() - started
+
+@app.on_event("shutdown")
+async def shutdown():
+    await job_queue.stop()
+    await webhook_dispatcher.stop()
+    await asyncio.to_thread(institution_cache.save)
+    await replica_store.stop()
+    await baserow_client.close()
+    plaid_gateway.shutdown()
+    rollup_store.close()
+
+def _component_stats():
+    """
+    Export the counters kept by the shared clients and queues
+    """
+    gateway = plaid_gateway.stats()
+    yield ("thrivebase_plaid_gateway_queue_depth", "gauge", "Plaid calls waiting for or running on the pool",
+           [({}, gateway["queue_depth"])])
+    yield ("thrivebase_plaid_gateway_calls_total", "counter", "Plaid calls by outcome",
+           [({"outcome": outcome}, gateway[outcome]) for outcome in ("completed", "failed", "rejected")])
+    yield ("thrivebase_upstream_circuit_open", "gauge", "1 while calls to the upstream are failed fast",
+           [({"upstream": transport.name}, int(transport.breaker.state == "open"))
+            for transport in (baserow_client.transport, plaid_gateway.transport)])
+    yield ("thrivebase_baserow_coalesced_requests_total", "counter", "Baserow GETs served by an identical in-flight request",
+           [({}, baserow_client.coalesced_requests)])
+    yield ("thrivebase_replica_local_reads_total", "counter", "Reads served from the local replica",
+           [({}, replica_store.local_reads)])
+    yield ("thrivebase_job_queue_queued_jobs", "gauge", "Jobs waiting or running",
+           [({}, job_queue.stats()["queued_jobs"])])
+    webhooks = webhook_dispatcher.stats()
+    yield ("thrivebase_webhook_items", "gauge", "Items with webhook work by state",
+           [({"state": "pending"}, webhooks["pending_items"]), ({"state": "running"}, webhooks["running_items"])])
+    stages = [
+        ({"pipeline": pipeline, "stage": stage}, stats)
+        for pipeline, pipeline_stages in pipeline_stats.snapshot().items()
+        for stage, stats in pipeline_stages.items()
     ]
-)
+    yield ("thrivebase_pipeline_stage_runs_total", "counter", "Pipeline stage runs",
+           [(labels, stats["count"]) for labels, stats in stages])
+    yield ("thrivebase_pipeline_stage_errors_total", "counter", "Pipeline stage failures",
+           [(labels, stats["errors"]) for labels, stats in stages])
+    yield ("thrivebase_pipeline_stage_seconds_total", "counter", "Time spent in pipeline stages",
+           [(labels, stats["total_ms"] / 1000) for labels, stats in stages])
+    yield ("thrivebase_startup_seconds", "gauge", "Time spent importing the application, in the startup hook and initialising SuperTokens",
+           [({"phase": phase}, seconds) for phase, seconds in startup_seconds.items()])
 
-# Add SuperTokens middleware
-app.add_middleware(get_middleware())
+metrics.add_collector(_component_stats)
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return JSONResponse({"status": "healthy"})
+    return JSONResponse({
+        "status": "healthy",
+        "baserow": baserow_client.transport.stats(),
+        "plaid_gateway": plaid_gateway.stats(),
+        "webhooks": webhook_dispatcher.stats(),
+        "pipelines": pipeline_stats.snapshot(),
+        "replica": replica_store.stats(),
+        "jobs": job_queue.stats(),
+        "startup": startup_seconds
+    })
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Include routers
 from app.api.api_v1.api import api_router
 app.include_router(api_router, prefix=os.getenv("API_V1_STR", "/api/v1"))
 
+startup_seconds["import"] = time.perf_counter() - _import_started
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -9,6 +9,7 @@ class PlaidTokenBase(BaseModel):
     institution_id: Optional[str]
     institution_name: Optional[str]
     status: str = "active"  # active, revoked, error
+    transactions_cursor: Optional[str] = None
 
 class PlaidTokenCreate(PlaidTokenBase):
     """
@@ -28,4 +29,7 @@ class PlaidTokenInDB(PlaidTokenBase):
 
 class PlaidTokenUpdate(BaseModel):
     status: Optional[str]
+    institution_id: Optional[str]
+    institution_name: Optional[str]
+    transactions_cursor: Optional[str]
     last_updated: datetime
@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+from typing import Optional
+from decimal import Decimal
+
+class TransactionBase(BaseModel):
+    user_id: str
+    account_id: str
+    transaction_id: Optional[str]
+    amount: Decimal
+    date: str
+    description: str
+    category: str
+
+class TransactionCreate(TransactionBase):
+    """
+    Transaction creation model that inherits all fields from TransactionBase.
+    No additional fields are needed for transaction creation.
+    """
+    pass
+
+class TransactionInDB(TransactionBase):
+    id: int
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from ..models.account import AccountUpdate
+from .baserow_client import baserow_client
+from .baserow_query import BaserowQuery
+from .plaid_gateway import plaid_gateway
+from . import plaid_models
+from .response_cache import response_cache
+from .token_service import token_service
+
+# Account columns the balance diff needs
+REFRESH_FIELDS = ("plaid_account_id", "plaid_item_id", "balance_current", "balance_available")
+
+def _balance(value) -> Optional[Decimal]:
+    return Decimal(str(value)) if value is not None and value != "" else None
+
+def diff_account_balances(rows: List[Dict], plaid_accounts: List[Dict]) -> List[Dict]:
+    """
+    Build PATCH rows for the Baserow accounts whose balances differ from Plaid
+    """
+    balances_by_account = {
+        account["account_id"]: account["balances"] for account in plaid_accounts
+    }
+    now = datetime.utcnow()
+
+    changed = []
+    for row in rows:
+        balances = balances_by_account.get(row["plaid_account_id"])
+        if balances is None:
+            continue
+
+        balance_current = _balance(balances["current"]) or Decimal("0")
+        balance_available = _balance(balances["available"])
+        if (
+            _balance(row.get("balance_current")) == balance_current
+            and _balance(row.get("balance_available")) == balance_available
+        ):
+            continue
+
+        update_data = AccountUpdate(
+            balance_current=balance_current,
+            balance_available=balance_available,
+            last_updated=now
+        )
+        changed.append({"id": row["id"], **update_data.dict()})
+
+    return changed
+
+class AccountRefreshService:
+    """
+    Refreshes account balances from Plaid, one item or all of a user's items.
+
+    Concurrency is bounded twice: REFRESH_GLOBAL_CONCURRENCY caps item
+    refreshes across the worker and REFRESH_PER_USER_CONCURRENCY caps them
+    for a single user, so one user with many institutions cannot starve
+    everybody else.
+    """
+    def __init__(self):
+        self.accounts_table_id = os.getenv("BASEROW_ACCOUNTS_TABLE_ID")
+        self.global_concurrency = int(os.getenv("REFRESH_GLOBAL_CONCURRENCY", "32"))
+        self.per_user_concurrency = int(os.getenv("REFRESH_PER_USER_CONCURRENCY", "4"))
+        self._global_semaphore = asyncio.Semaphore(self.global_concurrency)
+        self._user_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._user_waiters: Dict[str, int] = defaultdict(int)
+
+    @asynccontextmanager
+    async def _slot(self, user_id: str):
+        semaphore = self._user_semaphores.get(user_id)
+        if semaphore is None:
+            semaphore = self._user_semaphores[user_id] = asyncio.Semaphore(self.per_user_concurrency)
+        self._user_waiters[user_id] += 1
+        try:
+            async with semaphore, self._global_semaphore:
+                yield
+        finally:
+            self._user_waiters[user_id] -= 1
+            if not self._user_waiters[user_id]:
+                del self._user_waiters[user_id]
+                del self._user_semaphores[user_id]
+
+    async def refresh_item(
+        self,
+        user_id: str,
+        item_id: str,
+        access_token: Optional[str] = None,
+        rows: Optional[List[Dict]] = None
+    ) -> Dict:
+        """
+        Pull fresh balances for one Plaid item and write back the changed rows
+        """
+        async with self._slot(user_id):
+            if access_token is None:
+                access_token = await token_service.get_access_token(item_id, user_id)
+                if not access_token:
+                    raise HTTPException(status_code=404, detail="Access token not found")
+
+            if rows is None:
+                rows = await baserow_client.list_rows(
+                    BaserowQuery(self.accounts_table_id)
+                    .equal("user_id", user_id)
+                    .equal("plaid_item_id", item_id)
+                    .include(*REFRESH_FIELDS)
+                )
+
+            plaid_accounts = await plaid_gateway.accounts_get(
+                plaid_models.AccountsGetRequest(access_token=access_token)
+            )
+
+            changed_rows = diff_account_balances(rows, plaid_accounts["accounts"])
+            result = await baserow_client.batch_update(self.accounts_table_id, changed_rows)
+            if result.succeeded:
+                await response_cache.invalidate_user(user_id)
+            if result.failed:
+                raise HTTPException(status_code=502, detail="Failed to update account balances")
+
+            return {"item_id": item_id, "accounts_updated": result.succeeded}
+
+    async def refresh_all(self, user_id: str) -> List[Dict]:
+        """
+        Refresh every active item of a user concurrently, reporting per-item status and timing
+        """
+        tokens = await token_service.get_user_tokens(user_id)
+
+        # One accounts read for the user instead of one per item
+        rows_by_item: Dict[str, List[Dict]] = defaultdict(list)
+        async for row in baserow_client.iter_rows(
+            BaserowQuery(self.accounts_table_id).equal("user_id", user_id).include(*REFRESH_FIELDS)
+        ):
+            rows_by_item[row["plaid_item_id"]].append(row)
+
+        access_tokens = await token_service.decrypt_token_rows(tokens)
+
+        async def refresh(token: Dict, access_token: Optional[str]) -> Dict:
+            item_id = token["plaid_item_id"]
+            started = time.perf_counter()
+            try:
+                if not access_token:
+                    raise HTTPException(status_code=404, detail="Access token not found")
+                outcome = await self.refresh_item(
+                    user_id,
+                    item_id,
+                    access_token=access_token,
+                    rows=rows_by_item.get(item_id, [])
+                )
+                outcome["status"] = "success"
+            except Exception as e:
+                outcome = {
+                    "item_id": item_id,
+                    "status": "error",
+                    "error": e.detail if isinstance(e, HTTPException) else str(e)
+                }
+            outcome["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            return outcome
+
+        return await asyncio.gather(*(refresh(token, access_token) for token, access_token in zip(tokens, access_tokens)))
+
+# Global instance
+account_refresh_service = AccountRefreshService()
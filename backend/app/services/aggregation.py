@@ -0,0 +1,177 @@
+import logging
+from array import array
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal("0.01")
+
+def to_cents(value) -> int:
+    """
+    Convert a Baserow decimal (string, number or Decimal) to integer cents exactly.
+
+    Baserow's number fields store two decimal places, so amounts are whole
+    cents. A value with more places is rounded to the nearest cent, halves
+    away from zero (0.125 -> 13, -0.125 -> -13), and logged.
+    """
+    if value is None or value == "":
+        return 0
+    amount = Decimal(str(value)) * 100
+    cents = amount.quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    if cents != amount:
+        logger.warning("Rounded sub-cent amount %s to %d cents", value, cents)
+    return int(cents)
+
+def from_cents(cents: int) -> float:
+    """
+    Cents as a JSON number; the division only happens once, on the exact total
+    """
+    return float(Decimal(cents) * CENT)
+
+def _group_sum(keys: Sequence[str], values: array) -> Dict[str, Dict]:
+    """
+    Sum integer cents per key and count rows per key
+    """
+    groups: Dict[str, Dict] = {}
+    for key, cents in zip(keys, values):
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"cents": 0, "count": 0}
+        group["cents"] += cents
+        group["count"] += 1
+    return groups
+
+def _amounts(groups: Dict[str, Dict], name: str) -> Dict[str, Dict]:
+    return {
+        key: {name: from_cents(group["cents"]), "count": group["count"]}
+        for key, group in sorted(groups.items())
+    }
+
+class AccountColumns:
+    """
+    Account rows split into columns: integer cents plus the grouping keys
+    """
+    def __init__(self):
+        self.current = array("q")
+        self.available = array("q")
+        self.has_available: List[bool] = []
+        self.currency: List[str] = []
+        self.type: List[str] = []
+        self.item_id: List[str] = []
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict]) -> "AccountColumns":
+        columns = cls()
+        for row in rows:
+            columns.append(row)
+        return columns
+
+    def append(self, row: Dict) -> None:
+        available = row.get("balance_available")
+        self.current.append(to_cents(row.get("balance_current")))
+        self.available.append(to_cents(available))
+        self.has_available.append(available is not None and available != "")
+        self.currency.append(row.get("iso_currency_code") or "UNKNOWN")
+        self.type.append(row.get("type") or "unknown")
+        self.item_id.append(row.get("plaid_item_id") or "")
+
+    def __len__(self) -> int:
+        return len(self.current)
+
+class TransactionColumns:
+    """
+    Transaction rows split into columns: integer cents plus the grouping keys
+    """
+    def __init__(self):
+        self.amount = array("q")
+        self.category: List[str] = []
+        self.month: List[str] = []
+        self.account_id: List[str] = []
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict]) -> "TransactionColumns":
+        columns = cls()
+        for row in rows:
+            columns.append(row)
+        return columns
+
+    def append(self, row: Dict) -> None:
+        self.amount.append(to_cents(row.get("amount")))
+        self.category.append(row.get("category") or "Uncategorized")
+        # Dates are ISO formatted, so the month is the YYYY-MM prefix
+        self.month.append((row.get("date") or "")[:7] or "unknown")
+        self.account_id.append(row.get("account_id") or "")
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+def summarize_accounts(
+    columns: AccountColumns,
+    institution_by_item: Optional[Dict[str, str]] = None
+) -> Dict:
+    """
+    Balance totals overall and per currency, account type and institution
+    """
+    # Only accounts that report an available balance count towards it
+    available = array("q", (
+        cents if present else 0
+        for cents, present in zip(columns.available, columns.has_available)
+    ))
+    institutions = [
+        (institution_by_item or {}).get(item_id) or "Unknown"
+        for item_id in columns.item_id
+    ]
+
+    by_currency = {}
+    current_by_currency = _group_sum(columns.currency, columns.current)
+    available_by_currency = _group_sum(columns.currency, available)
+    for currency, group in sorted(current_by_currency.items()):
+        by_currency[currency] = {
+            "current_balance": from_cents(group["cents"]),
+            "available_balance": from_cents(available_by_currency[currency]["cents"]),
+            "count": group["count"]
+        }
+
+    return {
+        "total_current_balance": from_cents(sum(columns.current)),
+        "total_available_balance": from_cents(sum(available)),
+        "total_accounts": len(columns),
+        "by_currency": by_currency,
+        "by_type": _amounts(_group_sum(columns.type, columns.current), "current_balance"),
+        "by_institution": _amounts(_group_sum(institutions, columns.current), "current_balance")
+    }
+
+def summarize_transactions(columns: TransactionColumns) -> Dict:
+    """
+    Transaction totals overall and per category, month and account
+    """
+    return {
+        "total_amount": from_cents(sum(columns.amount)),
+        "total_transactions": len(columns),
+        "by_category": _amounts(_group_sum(columns.category, columns.amount), "amount"),
+        "by_month": _amounts(_group_sum(columns.month, columns.amount), "amount"),
+        "by_account": _amounts(_group_sum(columns.account_id, columns.amount), "amount")
+    }
+
+def summarize_rollups(rollups: Iterable[Dict]) -> Dict:
+    """
+    The summarize_transactions view computed from pre-aggregated rollup rows
+    """
+    total = {"cents": 0, "count": 0}
+    dimensions = {"category": {}, "month": {}, "account_id": {}}
+    for rollup in rollups:
+        total["cents"] += rollup["total_cents"]
+        total["count"] += rollup["count"]
+        for dimension, groups in dimensions.items():
+            group = groups.setdefault(rollup[dimension], {"cents": 0, "count": 0})
+            group["cents"] += rollup["total_cents"]
+            group["count"] += rollup["count"]
+
+    return {
+        "total_amount": from_cents(total["cents"]),
+        "total_transactions": total["count"],
+        "by_category": _amounts(dimensions["category"], "amount"),
+        "by_month": _amounts(dimensions["month"], "amount"),
+        "by_account": _amounts(dimensions["account_id"], "amount")
+    }
@@ -0,0 +1,378 @@
+import aiohttp
+import asyncio
+import json
+import logging
+import os
+from contextlib import aclosing
+from datetime import date, datetime
+from decimal import Decimal
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from fastapi import HTTPException
+from ..core.metrics import track
+from ..core.resilience import ResilientTransport, TransientError, parse_retry_after
+from .baserow_query import BaserowQuery
+
+logger = logging.getLogger(__name__)
+
+# Called with (method, endpoint, data, response) after every successful write
+WriteListener = Callable[[str, str, Optional[Dict], Dict], Awaitable[None]]
+
+# Baserow rejects batch requests with more than 200 items
+BASEROW_MAX_BATCH_SIZE = 200
+
+# Statuses worth retrying: rate limited, or the server briefly unavailable
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "PATCH", "DELETE"}
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _operation(method: str, url: str) -> str:
+    """
+    Metrics label for a request: the method and the kind of rows endpoint
+    """
+    segments = [segment for segment in urlsplit(url).path.split("/") if segment]
+    if segments and segments[-1] in ("batch", "batch-delete"):
+        return f"{method} {segments[-1]}"
+    if segments and segments[-1].isdigit() and len(segments) >= 2 and segments[-2] != "table":
+        return f"{method} row"
+    return f"{method} rows"
+
+class BatchResult:
+    """
+    Outcome of a chunked batch write, with failures reported per input row
+    """
+    def __init__(self):
+        self.rows: List[Dict] = []
+        self.errors: List[Dict] = []
+
+    @property
+    def succeeded(self) -> int:
+        return len(self.rows)
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+    def to_dict(self) -> Dict:
+        return {
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "errors": self.errors
+        }
+
+class BaserowClient:
+    """
+    Long-lived Baserow API client backed by a pooled keep-alive connector.
+
+    Requests pass through a ResilientTransport: transient failures (429,
+    502-504, dropped connections) are retried, requests are rate limited
+    to BASEROW_RATE_LIMIT per second, and an outage opens a circuit that
+    fails requests fast instead of letting them pile up.
+    """
+    def __init__(self):
+        self.base_url = os.getenv("BASEROW_API_URL")
+        self.pool_size = int(os.getenv("BASEROW_POOL_SIZE", "100"))
+        self.pool_size_per_host = int(os.getenv("BASEROW_POOL_SIZE_PER_HOST", "50"))
+        self.keepalive_timeout = float(os.getenv("BASEROW_KEEPALIVE_TIMEOUT", "30"))
+        self.timeout = aiohttp.ClientTimeout(
+            total=float(os.getenv("BASEROW_TIMEOUT", "30")),
+            connect=float(os.getenv("BASEROW_CONNECT_TIMEOUT", "5"))
+        )
+        self.batch_size = min(
+            int(os.getenv("BASEROW_BATCH_SIZE", str(BASEROW_MAX_BATCH_SIZE))),
+            BASEROW_MAX_BATCH_SIZE
+        )
+        self.batch_concurrency = int(os.getenv("BASEROW_BATCH_CONCURRENCY", "4"))
+        self.page_size = int(os.getenv("BASEROW_PAGE_SIZE", "200"))
+        self.delete_scan_rows = int(os.getenv("BASEROW_DELETE_SCAN_ROWS", "1000"))
+        self.single_flight = os.getenv("BASEROW_SINGLE_FLIGHT", "true").lower() != "false"
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced_requests = 0
+        self._write_listeners: List[WriteListener] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+        # BASEROW_RETRY_*, BASEROW_RATE_LIMIT/_BURST (opt-in) and BASEROW_BREAKER_* settings
+        self.transport = ResilientTransport("baserow", "BASEROW")
+
+    @property
+    def headers(self) -> Dict:
+        return {
+            "Authorization": f"Token {os.getenv('BASEROW_API_TOKEN')}",
+            "Content-Type": "application/json"
+        }
+
+    async def start(self) -> None:
+        """
+        Open the pooled session (called from the application startup hook)
+        """
+        if self._session is not None and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            headers=self.headers,
+            json_serialize=partial(json.dumps, default=_json_default)
+        )
+
+    async def close(self) -> None:
+        """
+        Close the pooled session (called from the application shutdown hook)
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # Scripts and background jobs may use the client without the
+        # FastAPI startup hook having run, so open the pool lazily
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    async def request(self, method: str, endpoint: Union[str, BaserowQuery], data: Dict = None) -> Dict:
+        """
+        Make a request to the Baserow API over the shared connection pool.
+
+        Concurrent identical GETs share one upstream request and receive the
+        same parsed JSON object, which callers must treat as read-only.
+        """
+        endpoint = str(endpoint)
+        if method.upper() != "GET":
+            response = await self._send(method, endpoint, data)
+            await self._notify_write(method.upper(), endpoint, data, response)
+            return response
+        if not self.single_flight:
+            return await self._send(method, endpoint, data)
+
+        future = self._inflight.get(endpoint)
+        if future is None:
+            future = asyncio.ensure_future(self._send(method, endpoint, data))
+            self._inflight[endpoint] = future
+            future.add_done_callback(partial(self._finish_flight, endpoint))
+        else:
+            self.coalesced_requests += 1
+        # A caller that is cancelled must not cancel the request for the others
+        return await asyncio.shield(future)
+
+    def add_write_listener(self, listener: WriteListener) -> None:
+        """
+        Register a coroutine to be told about every successful write
+        """
+        self._write_listeners.append(listener)
+
+    async def _notify_write(self, method: str, endpoint: str, data: Optional[Dict], response: Dict) -> None:
+        for listener in self._write_listeners:
+            try:
+                await listener(method, endpoint, data, response)
+            except Exception:
+                # The write itself succeeded; a listener must not turn it into an error
+                logger.exception("Baserow write listener failed for %s %s", method, endpoint)
+
+    def _finish_flight(self, endpoint: str, future: asyncio.Future) -> None:
+        if self._inflight.get(endpoint) is future:
+            del self._inflight[endpoint]
+        if not future.cancelled():
+            # Mark the error as retrieved in case every waiter went away
+            future.exception()
+
+    async def _send(self, method: str, endpoint: str, data: Dict = None) -> Dict:
+        # Writes are repeated only when Baserow cannot have applied them;
+        # deleting the same row ids twice is harmless
+        idempotent = method.upper() in IDEMPOTENT_METHODS or urlsplit(endpoint).path.endswith("/batch-delete/")
+        return await self.transport.call(partial(self._send_once, method, endpoint, data), idempotent)
+
+    async def _send_once(self, method: str, endpoint: str, data: Dict = None) -> Dict:
+        session = await self._get_session()
+        url = endpoint if endpoint.startswith(("http://", "https://")) else f"{self.base_url}{endpoint}"
+        with track("baserow", _operation(method, url)):
+            try:
+                async with session.request(
+                    method=method,
+                    url=url,
+                    json=data
+                ) as response:
+                    if response.status >= 400:
+                        error = HTTPException(
+                            status_code=response.status,
+                            detail="Baserow API request failed"
+                        )
+                        if response.status in RETRY_STATUSES:
+                            raise TransientError(
+                                error,
+                                reason=str(response.status),
+                                retry_after=parse_retry_after(response.headers.get("Retry-After")),
+                                processed=response.status != 429,
+                                throttled=response.status == 429
+                            )
+                        raise error
+                    if response.status == 204:
+                        return {}
+                    return await response.json()
+            except aiohttp.ClientConnectorError as e:
+                raise TransientError(e, reason="connect", processed=False)
+            except (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError, asyncio.TimeoutError) as e:
+                raise TransientError(e, reason="connection")
+
+    def _with_page_size(self, endpoint: str) -> str:
+        parts = urlsplit(endpoint)
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        if not any(key == "size" for key, _ in params):
+            params.append(("size", str(self.page_size)))
+        return urlunsplit(parts._replace(query=urlencode(params)))
+
+    def _next_endpoint(self, next_url: str) -> str:
+        # Baserow builds "next" from its public URL, which is not always the
+        # address we reach it on, so keep only the path below the API root
+        parts = urlsplit(next_url)
+        marker = parts.path.find("/database/")
+        if marker == -1:
+            return next_url
+        return urlunsplit(("", "", parts.path[marker:], parts.query, ""))
+
+    async def iter_pages(self, endpoint: Union[str, BaserowQuery], prefetch: bool = True) -> AsyncIterator[List[Dict]]:
+        """
+        Yield each page of a Baserow list endpoint, following "next" links.
+
+        With prefetch the request for the following page is issued while the
+        caller is still consuming the current one.
+        """
+        pending = asyncio.ensure_future(self.request("GET", self._with_page_size(str(endpoint))))
+        try:
+            while pending is not None:
+                response = await pending
+                pending = None
+                next_url = response.get("next")
+                if next_url and prefetch:
+                    pending = asyncio.ensure_future(self.request("GET", self._next_endpoint(next_url)))
+                yield response.get("results", [])
+                if next_url and pending is None:
+                    pending = asyncio.ensure_future(self.request("GET", self._next_endpoint(next_url)))
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+
+    async def iter_rows(self, endpoint: Union[str, BaserowQuery], prefetch: bool = True) -> AsyncIterator[Dict]:
+        """
+        Yield every row of a Baserow list endpoint across all pages
+        """
+        async with aclosing(self.iter_pages(endpoint, prefetch=prefetch)) as pages:
+            async for page in pages:
+                for row in page:
+                    yield row
+
+    async def list_rows(self, endpoint: Union[str, BaserowQuery]) -> List[Dict]:
+        """
+        Read all rows of a Baserow list endpoint into a list
+        """
+        rows = []
+        async for page in self.iter_pages(endpoint):
+            rows.extend(page)
+        return rows
+
+    async def batch_create(self, table_id: str, rows: List[Dict]) -> BatchResult:
+        """
+        Create rows in Baserow-sized chunks written concurrently
+        """
+        return await self._batch_write("POST", table_id, rows)
+
+    async def batch_update(self, table_id: str, rows: List[Dict]) -> BatchResult:
+        """
+        Update rows (each including its "id") in Baserow-sized chunks
+        """
+        return await self._batch_write("PATCH", table_id, rows)
+
+    async def batch_delete(self, table_id: str, row_ids: List[int]) -> BatchResult:
+        """
+        Delete rows by id in Baserow-sized chunks; result rows are the deleted ids
+        """
+        return await self._batch_write("POST", table_id, row_ids, action="batch-delete")
+
+    async def delete_rows(
+        self,
+        query: BaserowQuery,
+        on_progress: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> int:
+        """
+        Delete every row matching a query and return how many were deleted.
+
+        Baserow has no delete-by-filter, so matching ids are read in rounds
+        of up to BASEROW_DELETE_SCAN_ROWS and removed with batch-delete. Each
+        round re-reads from the first page, as deleting shifts the pages, so
+        a call that failed part way can simply be repeated.
+        """
+        deleted = 0
+        while True:
+            row_ids = []
+            async with aclosing(self.iter_rows(query, prefetch=False)) as rows:
+                async for row in rows:
+                    row_ids.append(row["id"])
+                    if len(row_ids) >= self.delete_scan_rows:
+                        break
+            if not row_ids:
+                return deleted
+
+            result = await self.batch_delete(query.table_id, row_ids)
+            deleted += result.succeeded
+            if on_progress is not None:
+                await on_progress(deleted)
+            if result.failed:
+                raise HTTPException(status_code=502, detail=f"Failed to delete {result.failed} rows")
+
+    async def _batch_write(
+        self,
+        method: str,
+        table_id: str,
+        rows: List,
+        action: str = "batch"
+    ) -> BatchResult:
+        result = BatchResult()
+        if not rows:
+            return result
+
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        endpoint = f"/database/rows/table/{table_id}/{action}/?user_field_names=true"
+
+        async def write_chunk(start: int, chunk: List):
+            async with semaphore:
+                try:
+                    response = await self.request(method, endpoint, data={"items": chunk})
+                    # batch-delete answers 204 without a body
+                    return start, chunk, response.get("items", chunk), None
+                except HTTPException as e:
+                    return start, chunk, [], e.detail
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    return start, chunk, [], str(e) or type(e).__name__
+
+        chunks = [
+            (start, rows[start:start + self.batch_size])
+            for start in range(0, len(rows), self.batch_size)
+        ]
+        outcomes = await asyncio.gather(*(write_chunk(start, chunk) for start, chunk in chunks))
+
+        # Baserow applies each batch atomically, so a failed chunk fails all of its rows
+        for start, chunk, written, error in outcomes:
+            if error is None:
+                result.rows.extend(written)
+            else:
+                result.errors.extend(
+                    {"index": start + offset, "error": error}
+                    for offset in range(len(chunk))
+                )
+
+        return result
+
+# Global instance
+baserow_client = BaserowClient()
@@ -0,0 +1,93 @@
+import os
+from typing import Dict
+from .baserow_client import baserow_client
+from .baserow_query import BaserowQuery
+from .job_queue import job_queue
+from .response_cache import response_cache
+from .rollup_store import rollup_store
+from .token_service import token_service
+
+DELETE_USER_DATA_JOB = "user_data.delete"
+
+class CascadeDeleteService:
+    """
+    Deletes a user's or an item's rows across the Baserow tables and local stores.
+
+    Rows are resolved to ids and removed with batch-delete. Every step only
+    deletes what is still there, so an interrupted run is resumed by
+    running it again; user deletion runs as a retried job for that reason.
+    """
+    def __init__(self):
+        self.transactions_table_id = os.getenv("BASEROW_TRANSACTIONS_TABLE_ID")
+        self.accounts_table_id = os.getenv("BASEROW_ACCOUNTS_TABLE_ID")
+        self.tokens_table_id = os.getenv("BASEROW_TOKENS_TABLE_ID")
+
+    async def delete_user(self, user_id: str) -> Dict:
+        """
+        Delete all transactions, accounts and tokens of a user, children first
+        """
+        deleted = {"transactions": 0, "accounts": 0, "tokens": 0}
+
+        for table, table_id in (
+            ("transactions", self.transactions_table_id),
+            ("accounts", self.accounts_table_id),
+            ("tokens", self.tokens_table_id),
+        ):
+            async def progress(count: int, table: str = table) -> None:
+                deleted[table] = count
+                await job_queue.report_progress({"stage": table, "deleted": dict(deleted)})
+
+            deleted[table] = await baserow_client.delete_rows(
+                BaserowQuery(table_id).equal("user_id", user_id).include("user_id"),
+                on_progress=progress
+            )
+
+        await self._forget(user_id)
+        token_service.cache.invalidate_user(user_id)
+        return deleted
+
+    async def delete_item(self, user_id: str, item_id: str) -> Dict:
+        """
+        Delete the accounts of one item and the transactions of those accounts
+        """
+        accounts = await baserow_client.list_rows(
+            BaserowQuery(self.accounts_table_id)
+            .equal("user_id", user_id)
+            .equal("plaid_item_id", item_id)
+            .include("plaid_account_id")
+        )
+
+        deleted_transactions = 0
+        for account_id in {account["plaid_account_id"] for account in accounts}:
+            deleted_transactions += await baserow_client.delete_rows(
+                BaserowQuery(self.transactions_table_id)
+                .equal("user_id", user_id)
+                .equal("account_id", account_id)
+                .include("user_id")
+            )
+        deleted_accounts = await baserow_client.delete_rows(
+            BaserowQuery(self.accounts_table_id)
+            .equal("user_id", user_id)
+            .equal("plaid_item_id", item_id)
+            .include("user_id")
+        )
+
+        await self._forget(user_id)
+        return {"transactions": deleted_transactions, "accounts": deleted_accounts}
+
+    async def _forget(self, user_id: str) -> None:
+        # Rollups are rebuilt from Baserow on the next read
+        await rollup_store.forget_user(user_id)
+        await response_cache.invalidate_user(user_id)
+
+    async def _delete_user_job(self, payload: Dict) -> Dict:
+        return await self.delete_user(payload["user_id"])
+
+# Global instance
+cascade_delete_service = CascadeDeleteService()
+
+def register() -> None:
+    """
+    Register the job handler with the job queue (called from the startup hook)
+    """
+    job_queue.register(DELETE_USER_DATA_JOB, cascade_delete_service._delete_user_job)
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Optional, Tuple
+from .plaid_gateway import plaid_gateway
+from . import plaid_models
+
+logger = logging.getLogger(__name__)
+
+# Institution fields we keep; the logo is a base64 PNG, so it is kept too
+INSTITUTION_FIELDS = ("institution_id", "name", "url", "primary_color", "logo")
+
+# Plaid error codes meaning the institution does not exist
+NOT_FOUND_ERROR_CODES = {"INVALID_INSTITUTION", "INSTITUTION_NOT_FOUND"}
+
+def _is_not_found(error: Exception) -> bool:
+    """
+    Whether Plaid answered that the institution does not exist, as opposed to not answering
+    """
+    if getattr(error, "status", None) not in (400, 404):
+        return False
+    try:
+        body = json.loads(getattr(error, "body", None) or "{}")
+    except (TypeError, ValueError):
+        return False
+    return isinstance(body, dict) and body.get("error_code") in NOT_FOUND_ERROR_CODES
+
+class InstitutionCache:
+    """
+    Cache of Plaid institution metadata keyed by (institution_id, country_code).
+
+    Metadata rarely changes, so hits live for INSTITUTION_CACHE_TTL seconds
+    (a week by default). Institutions Plaid does not know are cached as
+    misses for INSTITUTION_CACHE_NEGATIVE_TTL seconds so they do not cost
+    a Plaid call on every Link; other failures (timeouts, 5xx, an open
+    circuit) are not cached. Entries are saved to INSTITUTION_CACHE_PATH
+    on shutdown and loaded at startup.
+    """
+    def __init__(self):
+        self.ttl = float(os.getenv("INSTITUTION_CACHE_TTL", str(7 * 24 * 3600)))
+        self.negative_ttl = float(os.getenv("INSTITUTION_CACHE_NEGATIVE_TTL", "300"))
+        self.path = os.getenv("INSTITUTION_CACHE_PATH", ".cache/institutions.json")
+        self._entries: Dict[Tuple[str, str], Dict] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def peek(self, institution_id: str, country_code: str = "US") -> Optional[Dict]:
+        """
+        Return cached metadata without ever calling Plaid
+        """
+        entry = self._entries.get((institution_id, country_code))
+        if entry is None or entry["expires_at"] <= time.time():
+            return None
+        return entry["institution"]
+
+    async def get(self, institution_id: str, country_code: str = "US") -> Optional[Dict]:
+        """
+        Return institution metadata, looking it up in Plaid on a miss.
+
+        Returns None when the lookup failed, or Plaid recently said the
+        institution does not exist.
+        """
+        key = (institution_id, country_code)
+        entry = self._entries.get(key)
+        if entry is not None and entry["expires_at"] > time.time():
+            return entry["institution"]
+
+        # Concurrent Links with the same bank share a single lookup
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._lookup(institution_id, country_code))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _lookup(self, institution_id: str, country_code: str) -> Optional[Dict]:
+        try:
+            response = await plaid_gateway.institutions_get_by_id(
+                plaid_models.InstitutionsGetByIdRequest(
+                    institution_id=institution_id,
+                    country_codes=[plaid_models.CountryCode(country_code)],
+                    options=plaid_models.InstitutionsGetByIdRequestOptions(include_optional_metadata=True)
+                )
+            )
+            institution = response["institution"]
+            metadata = {field: institution.get(field) for field in INSTITUTION_FIELDS}
+            ttl = self.ttl
+        except Exception as e:
+            if not _is_not_found(e):
+                # Transient; the next Link asks Plaid again
+                logger.warning("Institution lookup failed for %s (%s)", institution_id, country_code, exc_info=True)
+                return None
+            metadata = None
+            ttl = self.negative_ttl
+
+        self._entries[(institution_id, country_code)] = {
+            "institution": metadata,
+            "expires_at": time.time() + ttl
+        }
+        return metadata
+
+    def load(self) -> int:
+        """
+        Warm the cache from disk, skipping expired entries
+        """
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable institution cache at %s", self.path, exc_info=True)
+            return 0
+
+        now = time.time()
+        for entry in stored:
+            if entry["expires_at"] > now and entry["institution"] is not None:
+                self._entries[(entry["institution_id"], entry["country_code"])] = {
+                    "institution": entry["institution"],
+                    "expires_at": entry["expires_at"]
+                }
+        return len(self._entries)
+
+    def save(self) -> int:
+        """
+        Persist the live positive entries to disk
+        """
+        now = time.time()
+        stored = [
+            {
+                "institution_id": institution_id,
+                "country_code": country_code,
+                "institution": entry["institution"],
+                "expires_at": entry["expires_at"]
+            }
+            for (institution_id, country_code), entry in self._entries.items()
+            if entry["institution"] is not None and entry["expires_at"] > now
+        ]
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # A temporary file of our own, so workers saving at once never write into the same file
+        temporary = tempfile.NamedTemporaryFile(
+            "w", dir=directory or ".", prefix=f"{os.path.basename(self.path)}.", suffix=".tmp", delete=False
+        )
+        try:
+            with temporary:
+                json.dump(stored, temporary)
+            os.replace(temporary.name, self.path)
+        except BaseException:
+            os.unlink(temporary.name)
+            raise
+        return len(stored)
+
+# Global instance
+institution_cache = InstitutionCache()
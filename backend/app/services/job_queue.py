@@ -0,0 +1,441 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Job states; queued jobs may be waiting for a retry
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+JobHandler = Callable[[Dict], Awaitable[Any]]
+
+# The job a handler is running, for report_progress
+_current_job: ContextVar[Optional[Dict]] = ContextVar("current_job", default=None)
+
+def _claimable(job: Dict, owner: Optional[str], now: float) -> bool:
+    """
+    Whether owner may take a queued job: it is unowned, already owner's, or its owner's lease lapsed
+    """
+    return job.get("owner") is None or job.get("owner") == owner or job.get("lease_until", 0) < now
+
+class InMemoryJobBackend:
+    """
+    Process-local job store; jobs do not survive a restart
+    """
+    def __init__(self, max_finished: int = 4096):
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+
+    async def save(self, job: Dict) -> None:
+        self._jobs[job["id"]] = dict(job)
+        self._jobs.move_to_end(job["id"])
+        # Forget the oldest finished jobs once there are too many
+        finished = [job_id for job_id, stored in self._jobs.items() if stored["status"] in FINISHED]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def claim(self, job_id: str, owner: str, lease_until: float, now: float) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job["status"] != QUEUED or not _claimable(job, owner, now):
+            return False
+        job.update(status=RUNNING, owner=owner, lease_until=lease_until)
+        return True
+
+    async def renew(self, owner: str, lease_until: float) -> None:
+        for job in self._jobs.values():
+            if job.get("owner") == owner and job["status"] not in FINISHED:
+                job["lease_until"] = lease_until
+
+    async def release(self, owner: str) -> None:
+        for job in self._jobs.values():
+            if job.get("owner") == owner and job["status"] not in FINISHED:
+                job.update(status=QUEUED, owner=None)
+
+    async def reclaimable(self, now: float) -> List[Dict]:
+        for job in self._jobs.values():
+            if job["status"] == RUNNING and job.get("lease_until", 0) < now:
+                job.update(status=QUEUED, owner=None)
+        return [
+            dict(job) for job in self._jobs.values()
+            if job["status"] == QUEUED and _claimable(job, None, now)
+        ]
+
+    async def list_user(self, user_id: str, limit: int) -> List[Dict]:
+        jobs = [dict(job) for job in self._jobs.values() if job["user_id"] == user_id]
+        return sorted(jobs, key=lambda job: job["created_at"], reverse=True)[:limit]
+
+class SQLiteJobBackend:
+    """
+    Durable job store in a SQLite file shared by the application's workers.
+
+    The status, owner and lease_until columns are authoritative over the
+    copies in the JSON data: every worker process claims a job with a
+    conditional UPDATE before running it, so a job runs in one process
+    at a time, and a job whose owner stopped renewing its lease is
+    re-queued for another worker to adopt.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, status TEXT NOT NULL, "
+                "created_at REAL NOT NULL, data TEXT NOT NULL)"
+            )
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                # Files written before jobs were leased
+                connection.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+                connection.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL NOT NULL DEFAULT 0")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_user_id ON jobs (user_id, created_at)")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+            self._connection = connection
+        return self._connection
+
+    def _execute(self, sql: str, params=()) -> List:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _update(self, sql: str, params=()) -> int:
+        with self._lock:
+            return self._connect().execute(sql, params).rowcount
+
+    @staticmethod
+    def _load(status: str, owner: Optional[str], lease_until: float, data: str) -> Dict:
+        job = json.loads(data)
+        job.update(status=status, owner=owner, lease_until=lease_until)
+        return job
+
+    async def save(self, job: Dict) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO jobs (id, user_id, status, created_at, data, owner, lease_until) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                job["id"], job["user_id"], job["status"], job["created_at"], json.dumps(job),
+                job.get("owner"), job.get("lease_until", 0)
+            )
+        )
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT status, owner, lease_until, data FROM jobs WHERE id = ?",
+            (job_id,)
+        )
+        return self._load(*rows[0]) if rows else None
+
+    async def claim(self, job_id: str, owner: str, lease_until: float, now: float) -> bool:
+        """
+        Atomically take a queued job; False if another worker holds it or it is no longer queued
+        """
+        claimed = await asyncio.to_thread(
+            self._update,
+            "UPDATE jobs SET status = ?, owner = ?, lease_until = ? "
+            "WHERE id = ? AND status = ? AND (owner IS NULL OR owner = ? OR lease_until < ?)",
+            (RUNNING, owner, lease_until, job_id, QUEUED, owner, now)
+        )
+        return claimed == 1
+
+    async def renew(self, owner: str, lease_until: float) -> None:
+        await asyncio.to_thread(
+            self._update,
+            "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN (?, ?)",
+            (lease_until, owner, QUEUED, RUNNING)
+        )
+
+    async def release(self, owner: str) -> None:
+        """
+        Hand a stopping worker's jobs back, so others adopt them without waiting out the lease
+        """
+        await asyncio.to_thread(
+            self._update,
+            "UPDATE jobs SET status = ?, owner = NULL WHERE owner = ? AND status IN (?, ?)",
+            (QUEUED, owner, QUEUED, RUNNING)
+        )
+
+    async def reclaimable(self, now: float) -> List[Dict]:
+        """
+        Re-queue running jobs whose lease expired, then return the queued jobs nobody holds
+        """
+        def reclaim() -> List:
+            with self._lock:
+                connection = self._connect()
+                connection.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL WHERE status = ? AND lease_until < ?",
+                    (QUEUED, RUNNING, now)
+                )
+                return connection.execute(
+                    "SELECT status, owner, lease_until, data FROM jobs "
+                    "WHERE status = ? AND (owner IS NULL OR lease_until < ?) ORDER BY created_at",
+                    (QUEUED, now)
+                ).fetchall()
+
+        return [self._load(*row) for row in await asyncio.to_thread(reclaim)]
+
+    async def list_user(self, user_id: str, limit: int) -> List[Dict]:
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT status, owner, lease_until, data FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, limit)
+        )
+        return [self._load(*row) for row in rows]
+
+class JobQueue:
+    """
+    In-process queue for work that should not hold up a request.
+
+    Jobs are stored through a backend (SQLite at JOB_QUEUE_PATH, or in
+    memory when it is empty) and run by JOB_QUEUE_WORKERS workers. Each
+    user's jobs run one at a time in the order they were enqueued. A
+    failing job is retried up to JOB_MAX_ATTEMPTS times with jittered
+    exponential backoff from JOB_RETRY_BASE_DELAY seconds, and holds back
+    the user's later jobs while it waits.
+
+    Several processes can share the SQLite file. A job belongs to the
+    process that enqueued it for as long as that process renews its
+    lease (JOB_LEASE_SECONDS); each run starts with an atomic claim, and
+    jobs left behind by a process that stopped renewing are adopted by
+    the others.
+    """
+    def __init__(self, backend=None):
+        if backend is None:
+            path = os.getenv("JOB_QUEUE_PATH", ".cache/jobs.sqlite3")
+            backend = SQLiteJobBackend(path) if path else InMemoryJobBackend()
+        self.backend = backend
+        self.worker_count = int(os.getenv("JOB_QUEUE_WORKERS", "4"))
+        self.max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+        self.retry_base_delay = float(os.getenv("JOB_RETRY_BASE_DELAY", "2"))
+        self.retry_max_delay = float(os.getenv("JOB_RETRY_MAX_DELAY", "300"))
+        self.lease_seconds = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+        # Identifies this process's claims in the shared store
+        self.owner = uuid.uuid4().hex
+        self._handlers: Dict[str, JobHandler] = {}
+        self._user_jobs: Dict[str, Deque[str]] = {}
+        # Users whose next job is waiting in _ready or running
+        self._scheduled: set = set()
+        self._ready: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._lease_task: Optional[asyncio.Task] = None
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """
+        Register the coroutine that runs jobs of a kind; it receives the job payload
+        """
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        """
+        Adopt unowned jobs and start the workers (called from the startup hook)
+        """
+        if self._workers:
+            return
+        self._ready = asyncio.Queue()
+        await self._adopt()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._lease_task = asyncio.create_task(self._keep_leases())
+
+    async def stop(self) -> None:
+        """
+        Stop the workers (called from the shutdown hook); unfinished jobs stay stored
+        """
+        tasks = self._workers + ([self._lease_task] if self._lease_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._lease_task = None
+        self._user_jobs.clear()
+        self._scheduled.clear()
+        await self.backend.release(self.owner)
+
+    async def enqueue(self, kind: str, user_id: str, payload: Dict, max_attempts: Optional[int] = None) -> Dict:
+        """
+        Store a job and queue it behind the user's earlier jobs
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind {kind}")
+        if self._ready is None:
+            raise RuntimeError("JobQueue has not been started")
+
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "user_id": user_id,
+            "payload": payload,
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": max_attempts or self.max_attempts,
+            "next_run_at": now,
+            "created_at": now,
+            "updated_at": now,
+            "error": None,
+            "result": None,
+            "progress": None,
+            "owner": self.owner,
+            "lease_until": now + self.lease_seconds
+        }
+        await self.backend.save(job)
+        self._user_jobs.setdefault(user_id, deque()).append(job["id"])
+        self._schedule(user_id)
+        return job
+
+    async def get(self, job_id: str, user_id: str) -> Dict:
+        """
+        Return a job of the user, or raise a 404
+        """
+        job = await self.backend.get(job_id)
+        if job is None or job["user_id"] != user_id:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    async def list_user(self, user_id: str, limit: int = 20) -> List[Dict]:
+        return await self.backend.list_user(user_id, limit)
+
+    async def report_progress(self, progress: Dict) -> None:
+        """
+        Store progress of the running job; a no-op outside a job handler
+        """
+        job = _current_job.get()
+        if job is None:
+            return
+        job.update(progress=progress, updated_at=time.time())
+        await self.backend.save(job)
+
+    def stats(self) -> Dict:
+        return {
+            "users_with_jobs": len(self._user_jobs),
+            "queued_jobs": sum(len(jobs) for jobs in self._user_jobs.values()),
+            "ready": self._ready.qsize() if self._ready is not None else 0,
+            "workers": len(self._workers)
+        }
+
+    def _schedule(self, user_id: str, delay: float = 0) -> None:
+        if user_id in self._scheduled:
+            return
+        self._scheduled.add(user_id)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, user_id)
+        else:
+            self._ready.put_nowait(user_id)
+
+    async def _adopt(self) -> None:
+        """
+        Queue jobs that no live process holds, including those of a process that died mid-run
+        """
+        for job in await self.backend.reclaimable(time.time()):
+            jobs = self._user_jobs.setdefault(job["user_id"], deque())
+            if job["id"] not in jobs:
+                jobs.append(job["id"])
+                self._schedule(job["user_id"])
+
+    async def _keep_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.backend.renew(self.owner, time.time() + self.lease_seconds)
+                await self._adopt()
+            except Exception:
+                logger.exception("Renewing job leases failed")
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.retry_base_delay * 2 ** (attempts - 1), self.retry_max_delay)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _worker(self) -> None:
+        while True:
+            user_id = await self._ready.get()
+            try:
+                await self._run_next(user_id)
+            except Exception:
+                logger.exception("Job worker failed for user %s", user_id)
+                self._scheduled.discard(user_id)
+                if self._user_jobs.get(user_id):
+                    self._schedule(user_id, self.retry_base_delay)
+            finally:
+                self._ready.task_done()
+
+    async def _run_next(self, user_id: str) -> None:
+        jobs = self._user_jobs.get(user_id)
+        job = await self.backend.get(jobs[0]) if jobs else None
+        if job is None:
+            if jobs:
+                jobs.popleft()
+            self._finish_user(user_id)
+            return
+
+        delay = job["next_run_at"] - time.time()
+        if delay > 0:
+            self._scheduled.discard(user_id)
+            self._schedule(user_id, delay)
+            return
+
+        now = time.time()
+        if not await self.backend.claim(job["id"], self.owner, now + self.lease_seconds, now):
+            # Another process holds it (or finished it); it keeps the job's retries too
+            jobs.popleft()
+            self._finish_user(user_id)
+            return
+
+        job.update(
+            status=RUNNING,
+            owner=self.owner,
+            lease_until=now + self.lease_seconds,
+            attempts=job["attempts"] + 1,
+            updated_at=now
+        )
+        await self.backend.save(job)
+        current = _current_job.set(job)
+        try:
+            result = await self._handlers[job["kind"]](job["payload"])
+            job.update(status=SUCCEEDED, result=result, error=None)
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            if job["attempts"] >= job["max_attempts"]:
+                logger.warning("Job %s (%s) failed permanently: %s", job["id"], job["kind"], error)
+                job.update(status=FAILED, error=error)
+            else:
+                job.update(status=QUEUED, error=error, next_run_at=time.time() + self._backoff(job["attempts"]))
+        finally:
+            _current_job.reset(current)
+        job["updated_at"] = time.time()
+        await self.backend.save(job)
+
+        if job["status"] in FINISHED:
+            jobs.popleft()
+        self._finish_user(user_id)
+
+    def _finish_user(self, user_id: str) -> None:
+        self._scheduled.discard(user_id)
+        if self._user_jobs.get(user_id):
+            self._schedule(user_id)
+        else:
+            self._user_jobs.pop(user_id, None)
+
+# Global instance
+job_queue = JobQueue()
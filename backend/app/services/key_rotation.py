@@ -0,0 +1,74 @@
+import os
+from contextlib import aclosing
+from typing import Awaitable, Callable, Dict, Optional
+from ..core.security import token_encryption
+from .baserow_client import baserow_client
+from .baserow_query import BaserowQuery
+from .job_queue import job_queue
+
+REENCRYPT_TOKENS_JOB = "tokens.reencrypt"
+# Owner of jobs that are not run on behalf of a user
+SYSTEM_USER_ID = "system"
+
+ProgressCallback = Callable[[Dict], Awaitable[None]]
+
+class KeyRotationService:
+    """
+    Re-encrypts stored access tokens with the current encryption key.
+
+    Runs alongside normal traffic: every configured key still decrypts,
+    so rows are readable before and after they are rewritten. Only the
+    encrypted_access_token field is patched, one batch per page, and rows
+    already under the current key are skipped, so the job can be stopped
+    and run again at any point.
+    """
+    def __init__(self):
+        self.tokens_table_id = os.getenv("BASEROW_TOKENS_TABLE_ID")
+
+    async def reencrypt_tokens(self, on_progress: Optional[ProgressCallback] = None) -> Dict:
+        """
+        Page through the tokens table and rewrite rows encrypted with an older key
+        """
+        counts = {"scanned": 0, "reencrypted": 0, "unreadable": 0, "failed": 0}
+        if token_encryption.key_count == 1:
+            return counts
+
+        query = BaserowQuery(self.tokens_table_id).include("encrypted_access_token")
+        async with aclosing(baserow_client.iter_pages(query, prefetch=False)) as pages:
+            async for page in pages:
+                counts["scanned"] += len(page)
+                # Checking and re-encrypting happen in one pass off the event loop
+                rotated = await token_encryption.arotate_many([row.get("encrypted_access_token") for row in page])
+
+                updates = []
+                for row, encrypted_token in zip(page, rotated):
+                    if not row.get("encrypted_access_token") or encrypted_token == row["encrypted_access_token"]:
+                        continue
+                    if encrypted_token is None:
+                        # No configured key decrypts it; leave the row as it is
+                        counts["unreadable"] += 1
+                    else:
+                        updates.append({"id": row["id"], "encrypted_access_token": encrypted_token})
+                if updates:
+                    result = await baserow_client.batch_update(self.tokens_table_id, updates)
+                    counts["reencrypted"] += result.succeeded
+                    counts["failed"] += result.failed
+                if on_progress is not None:
+                    await on_progress(dict(counts))
+
+        return counts
+
+    async def _reencrypt_job(self, payload: Dict) -> Dict:
+        async def progress(counts: Dict) -> None:
+            await job_queue.report_progress(counts)
+
+        return await self.reencrypt_tokens(on_progress=progress)
+
+# Global instance
+key_rotation_service = KeyRotationService()
+
+def register() -> None:
+    """
+    Register the job handler with the job queue (called from the startup hook)
+    """
+    job_queue.register(REENCRYPT_TOKENS_JOB, key_rotation_service._reencrypt_job)
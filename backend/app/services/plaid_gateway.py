@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Optional
+from fastapi import HTTPException
+from ..core.metrics import track
+from ..core.resilience import ResilientTransport, TransientError, parse_retry_after
+
+# Calls that read or create nothing the user would see twice, so a retry is harmless
+IDEMPOTENT_METHODS = {
+    "link_token_create",
+    "item_get",
+    "institutions_get_by_id",
+    "accounts_get",
+    "transactions_sync",
+    "webhook_verification_key_get",
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+def _transient(error: Exception) -> Optional[TransientError]:
+    from urllib3.exceptions import HTTPError as TransportError
+
+    # ApiException from the SDK carries the HTTP status and response headers
+    status = getattr(error, "status", None)
+    if status in RETRY_STATUSES:
+        headers = getattr(error, "headers", None) or {}
+        return TransientError(
+            error,
+            reason=str(status),
+            retry_after=parse_retry_after(headers.get("Retry-After")),
+            processed=status != 429,
+            throttled=status == 429
+        )
+    if isinstance(error, (OSError, TransportError)):
+        return TransientError(error, reason="connection")
+    return None
+
+class PlaidGateway:
+    """
+    Async facade over the synchronous Plaid client.
+
+    Calls run on a bounded thread pool so a slow institution never blocks
+    the event loop. Work beyond PLAID_MAX_QUEUE waiting calls is rejected
+    with a 503 instead of queueing without limit. Rate-limited and
+    transiently failing calls are retried through a ResilientTransport
+    when repeating them is safe.
+
+    The Plaid SDK is imported and its client built on first use (or by
+    preload from the startup hook), not when this module is imported.
+    """
+    def __init__(self, client: Optional[Any] = None):
+        self.max_workers = int(os.getenv("PLAID_EXECUTOR_WORKERS", "16"))
+        self.max_queue = int(os.getenv("PLAID_MAX_QUEUE", "256"))
+        self._client = client
+        self._client_lock = threading.Lock()
+        # PLAID_RETRY_*, PLAID_RATE_LIMIT/_BURST and PLAID_BREAKER_* settings
+        self.transport = ResilientTransport("plaid", "PLAID", retry_base_delay=0.5, retry_max_delay=10)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from plaid import Client as PlaidClient
+
+                    self._client = PlaidClient(
+                        client_id=os.getenv("PLAID_CLIENT_ID"),
+                        secret=os.getenv("PLAID_SECRET"),
+                        environment=os.getenv("PLAID_ENV", "sandbox")
+                    )
+        return self._client
+
+    @client.setter
+    def client(self, client: Any) -> None:
+        self._client = client
+
+    async def preload(self) -> None:
+        """
+        Import the SDK and build the client on the worker pool, off the event loop
+        """
+        try:
+            await asyncio.wrap_future(self._get_executor().submit(lambda: self.client))
+        except Exception:
+            # Not fatal: the first call builds the client again and surfaces the error
+            logger.exception("Preloading the Plaid client failed")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="plaid"
+            )
+        return self._executor
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker pool (called from the application shutdown hook)
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _run(self, method_name: str, *args, **kwargs) -> Any:
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+        try:
+            result = getattr(self.client, method_name)(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        else:
+            with self._lock:
+                self._completed += 1
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    async def call(self, method_name: str, *args, **kwargs) -> Any:
+        """
+        Run a Plaid client method on the worker pool and await its result
+        """
+        return await self.transport.call(
+            partial(self._call_once, method_name, *args, **kwargs),
+            method_name in IDEMPOTENT_METHODS
+        )
+
+    async def _call_once(self, method_name: str, *args, **kwargs) -> Any:
+        with track("plaid", method_name):
+            with self._lock:
+                if self._queued >= self.max_queue:
+                    self._rejected += 1
+                    raise HTTPException(status_code=503, detail="Plaid gateway is overloaded")
+                self._queued += 1
+
+            try:
+                future = self._get_executor().submit(
+                    partial(self._run, method_name, *args, **kwargs)
+                )
+            except Exception:
+                with self._lock:
+                    self._queued -= 1
+                raise
+            future.add_done_callback(self._release_if_cancelled)
+            try:
+                return await asyncio.wrap_future(future)
+            except Exception as e:
+                transient = _transient(e)
+                if transient is not None:
+                    raise transient from e
+                raise
+
+    def _release_if_cancelled(self, future) -> None:
+        # A call cancelled before a worker picked it up never reaches _run
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def stats(self) -> Dict:
+        """
+        Snapshot of queue depth and in-flight calls
+        """
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self._queued,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                **self.transport.stats()
+            }
+
+    async def link_token_create(self, request) -> Dict:
+        return await self.call("link_token_create", request)
+
+    async def item_public_token_exchange(self, request) -> Dict:
+        return await self.call("item_public_token_exchange", request)
+
+    async def item_get(self, access_token: str) -> Dict:
+        return await self.call("item_get", access_token)
+
+    async def institutions_get_by_id(self, request) -> Dict:
+        return await self.call("institutions_get_by_id", request)
+
+    async def accounts_get(self, request) -> Dict:
+        return await self.call("accounts_get", request)
+
+    async def item_remove(self, access_token: str) -> Dict:
+        return await self.call("item_remove", access_token)
+
+    async def transactions_sync(self, request) -> Dict:
+        return await self.call("transactions_sync", request)
+
+    async def webhook_verification_key_get(self, request) -> Dict:
+        return await self.call("webhook_verification_key_get", request)
+
+# Global instance
+plaid_gateway = PlaidGateway()
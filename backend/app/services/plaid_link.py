@@ -0,0 +1,111 @@
+import os
+from decimal import Decimal
+from typing import Dict, List
+from fastapi import HTTPException
+from ..core.pipeline import Pipeline
+from ..models.account import AccountCreate
+from .baserow_client import baserow_client
+from .baserow_query import BaserowQuery
+from .institution_cache import institution_cache
+from .job_queue import job_queue
+from .plaid_gateway import plaid_gateway
+from . import plaid_models
+from .response_cache import response_cache
+from .token_service import token_service
+
+POST_LINK_JOB = "plaid.post_link"
+
+def to_account_row(account: Dict, item_id: str, user_id: str) -> Dict:
+    """
+    Map a Plaid account to a Baserow Accounts row
+    """
+    balances = account["balances"]
+    return AccountCreate(
+        plaid_account_id=account["account_id"],
+        plaid_item_id=item_id,
+        name=account["name"],
+        official_name=account.get("official_name"),
+        type=account["type"],
+        subtype=account.get("subtype"),
+        balance_current=Decimal(str(balances["current"])) if balances["current"] is not None else Decimal("0"),
+        balance_available=Decimal(str(balances["available"])) if balances["available"] is not None else None,
+        iso_currency_code=balances["iso_currency_code"],
+        user_id=user_id
+    ).dict()
+
+async def complete_link(payload: Dict) -> Dict:
+    """
+    Post-Link work for a stored token: institution metadata and the item's accounts.
+
+    Runs as a job, so it is written to be retried: accounts that are
+    already stored for the item are skipped.
+    """
+    user_id, item_id = payload["user_id"], payload["item_id"]
+    accounts_table_id = os.getenv("BASEROW_ACCOUNTS_TABLE_ID")
+
+    token = await token_service.get_token_row(item_id, user_id)
+    access_token = token_service.decrypt_token_row(token) if token is not None else None
+    if not access_token:
+        raise HTTPException(status_code=404, detail="Access token not found")
+
+    async def get_institution() -> Dict:
+        item_response = await plaid_gateway.item_get(access_token)
+        institution_id = item_response["item"]["institution_id"]
+        institution = await institution_cache.get(institution_id, "US") if institution_id else None
+        return {
+            "institution_id": institution_id,
+            "institution_name": institution["name"] if institution else None
+        }
+
+    async def store_institution(institution: Dict) -> None:
+        if institution["institution_id"]:
+            await token_service.set_institution(token["id"], **institution)
+
+    async def get_accounts() -> List[Dict]:
+        accounts_response = await plaid_gateway.accounts_get(plaid_models.AccountsGetRequest(access_token=access_token))
+        return accounts_response["accounts"]
+
+    async def get_stored_accounts() -> List[Dict]:
+        return await baserow_client.list_rows(
+            BaserowQuery(accounts_table_id)
+            .equal("user_id", user_id)
+            .equal("plaid_item_id", item_id)
+            .include("plaid_account_id")
+        )
+
+    async def store_accounts(plaid_accounts: List[Dict], stored: List[Dict]):
+        stored_ids = {row["plaid_account_id"] for row in stored}
+        rows = [
+            to_account_row(account, item_id, user_id)
+            for account in plaid_accounts
+            if account["account_id"] not in stored_ids
+        ]
+        result = await baserow_client.batch_create(accounts_table_id, rows)
+        if result.failed:
+            # Fail the job so it is retried; stored rows are skipped next time
+            raise HTTPException(status_code=502, detail=f"Failed to store {result.failed} accounts")
+        return result
+
+    pipeline = (
+        Pipeline("post_link")
+        .stage("institution", get_institution)
+        .stage("store_institution", store_institution, after=["institution"])
+        .stage("accounts", get_accounts)
+        .stage("stored_accounts", get_stored_accounts)
+        .stage("store_accounts", store_accounts, after=["accounts", "stored_accounts"])
+    )
+    results = await pipeline.run()
+    await response_cache.invalidate_user(user_id)
+
+    return {
+        "item_id": item_id,
+        "institution_name": results["institution"]["institution_name"],
+        "accounts_added": results["store_accounts"].succeeded,
+        "accounts_total": len(results["accounts"])
+    }
+
+def register() -> None:
+    """
+    Register the job handler with the job queue (called from the startup hook)
+    """
+    job_queue.register(POST_LINK_JOB, complete_link)
@@ -0,0 +1,29 @@
+"""
+Plaid request models, imported on first use.
+
+The SDK's model tree is large and slow to import, so modules refer to
+models as plaid_models.<Name>; the defining module is imported the first
+time a name is looked up.
+"""
+import importlib
+from typing import Any
+
+_MODULES = {
+    "AccountsGetRequest": "plaid.model.accounts_get_request",
+    "CountryCode": "plaid.model.country_code",
+    "InstitutionsGetByIdRequest": "plaid.model.institutions_get_by_id_request",
+    "InstitutionsGetByIdRequestOptions": "plaid.model.institutions_get_by_id_request_options",
+    "ItemPublicTokenExchangeRequest": "plaid.model.item_public_token_exchange_request",
+    "LinkTokenCreateRequest": "plaid.model.link_token_create_request",
+    "LinkTokenCreateRequestUser": "plaid.model.link_token_create_request_user",
+    "Products": "plaid.model.products",
+    "TransactionsSyncRequest": "plaid.model.transactions_sync_request",
+    "WebhookVerificationKeyGetRequest": "plaid.model.webhook_verification_key_get_request",
+}
+
+def __getattr__(name: str) -> Any:
+    if name not in _MODULES:
+        raise AttributeError(f"module {__name__} has no attribute {name}")
+    model = getattr(importlib.import_module(_MODULES[name]), name)
+    globals()[name] = model
+    return model
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import time
+from typing import Dict, Optional, Set, Tuple
+from fastapi import HTTPException
+from jose import jwt
+from .account_refresh import account_refresh_service
+from .plaid_gateway import plaid_gateway
+from . import plaid_models
+from .token_service import token_service
+from .transaction_sync import transaction_sync_service
+
+logger = logging.getLogger(__name__)
+
+# Plaid rejects webhooks older than five minutes in its reference verifier
+MAX_WEBHOOK_AGE_SECONDS = 5 * 60
+
+TRANSACTION_SYNC_CODES = {
+    "SYNC_UPDATES_AVAILABLE",
+    "DEFAULT_UPDATE",
+    "INITIAL_UPDATE",
+    "HISTORICAL_UPDATE",
+    "TRANSACTIONS_REMOVED",
+}
+ITEM_ERROR_CODES = {"ERROR", "PENDING_EXPIRATION"}
+ITEM_REVOKED_CODES = {"USER_PERMISSION_REVOKED"}
+
+class PlaidWebhookVerifier:
+    """
+    Verifies the Plaid-Verification JWT that signs every Plaid webhook
+    """
+    def __init__(self):
+        self.enabled = os.getenv("PLAID_WEBHOOK_VERIFY", "true").lower() != "false"
+        self._keys: Dict[str, Dict] = {}
+
+    async def _get_key(self, key_id: str) -> Dict:
+        key = self._keys.get(key_id)
+        if key is None:
+            response = await plaid_gateway.webhook_verification_key_get(
+                plaid_models.WebhookVerificationKeyGetRequest(key_id=key_id)
+            )
+            key = response["key"]
+            # The SDK returns a JWKPublicKey model; jose needs the JWK as a dict
+            if not isinstance(key, dict):
+                key = key.to_dict()
+            # Rotated-out keys carry an expiry and must not be cached
+            if not key.get("expired_at"):
+                self._keys[key_id] = key
+        return key
+
+    async def verify(self, body: bytes, signed_jwt: Optional[str]) -> None:
+        """
+        Raise a 401 unless the JWT is valid, fresh and signs this exact body
+        """
+        if not self.enabled:
+            return
+        if not signed_jwt:
+            raise HTTPException(status_code=401, detail="Missing webhook signature")
+
+        try:
+            header = jwt.get_unverified_header(signed_jwt)
+            if header.get("alg") != "ES256":
+                raise ValueError("unexpected algorithm")
+            key = await self._get_key(header["kid"])
+            claims = jwt.decode(signed_jwt, key, algorithms=["ES256"])
+        except HTTPException:
+            raise
+        except Exception:
+            raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+        if time.time() - claims.get("iat", 0) > MAX_WEBHOOK_AGE_SECONDS:
+            raise HTTPException(status_code=401, detail="Webhook signature expired")
+
+        body_hash = hashlib.sha256(body).hexdigest()
+        if not hmac.compare_digest(body_hash, claims.get("request_body_sha256", "")):
+            raise HTTPException(status_code=401, detail="Webhook body does not match signature")
+
+class WebhookDispatcher:
+    """
+    Per-item work queue fed by Plaid webhooks.
+
+    Events for an item that arrive within PLAID_WEBHOOK_DEBOUNCE seconds of
+    each other are coalesced into one unit of work, so a burst of webhooks
+    costs a single round of Plaid calls. A fixed pool of workers drains
+    the queue, and an item is never processed by two workers at once.
+    """
+    def __init__(self):
+        self.debounce = float(os.getenv("PLAID_WEBHOOK_DEBOUNCE", "5"))
+        self.worker_count = int(os.getenv("PLAID_WEBHOOK_WORKERS", "4"))
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[str, Set[Tuple[str, str]]] = {}
+        self._running: Set[str] = set()
+        self._workers = []
+
+    async def start(self) -> None:
+        """
+        Start the worker pool (called from the application startup hook)
+        """
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.worker_count)
+        ]
+
+    async def stop(self) -> None:
+        """
+        Stop the worker pool (called from the application shutdown hook)
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(self, item_id: str, webhook_type: str, webhook_code: str) -> None:
+        """
+        Record an event for an item, scheduling work unless some is already pending
+        """
+        if self._queue is None:
+            raise RuntimeError("WebhookDispatcher has not been started")
+
+        events = self._pending.get(item_id)
+        if events is not None:
+            events.add((webhook_type, webhook_code))
+            return
+
+        self._pending[item_id] = {(webhook_type, webhook_code)}
+        asyncio.get_running_loop().call_later(self.debounce, self._queue.put_nowait, item_id)
+
+    def stats(self) -> Dict:
+        return {
+            "pending_items": len(self._pending),
+            "running_items": len(self._running),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "workers": len(self._workers)
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            item_id = await self._queue.get()
+            try:
+                if item_id in self._running:
+                    # Let the current run finish; new events stay pending
+                    asyncio.get_running_loop().call_later(self.debounce, self._queue.put_nowait, item_id)
+                    continue
+
+                events = self._pending.pop(item_id, set())
+                self._running.add(item_id)
+                try:
+                    await self.process(item_id, events)
+                except Exception:
+                    logger.exception("Webhook processing failed for item %s", item_id)
+                finally:
+                    self._running.discard(item_id)
+            finally:
+                self._queue.task_done()
+
+    async def process(self, item_id: str, events: Set[Tuple[str, str]]) -> None:
+        """
+        Do the Plaid work the coalesced events of one item call for
+        """
+        token = await token_service.find_item_token(item_id)
+        if token is None:
+            return
+        user_id = token["user_id"]
+        codes = {code for _, code in events}
+        types = {webhook_type for webhook_type, _ in events}
+
+        if "ITEM" in types and codes & ITEM_REVOKED_CODES:
+            await token_service.set_status(item_id, user_id, "revoked")
+            return
+        if "ITEM" in types and codes & ITEM_ERROR_CODES:
+            await token_service.set_status(item_id, user_id, "error")
+            return
+
+        # Balances can only have moved when transactions did, so codes such as
+        # RECURRING_TRANSACTIONS_UPDATE cost no Plaid calls at all
+        synced = bool({code for webhook_type, code in events if webhook_type == "TRANSACTIONS"} & TRANSACTION_SYNC_CODES)
+        if synced:
+            await transaction_sync_service.sync_item(user_id, item_id, token=token)
+        if synced or "DEFAULT_UPDATE" in codes:
+            await account_refresh_service.refresh_item(
+                user_id,
+                item_id,
+                access_token=token_service.decrypt_token_row(token)
+            )
+
+# Global instances
+webhook_verifier = PlaidWebhookVerifier()
+webhook_dispatcher = WebhookDispatcher()
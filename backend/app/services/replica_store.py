@@ -0,0 +1,394 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import aclosing
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from .baserow_client import _json_default, baserow_client
+from .baserow_query import BaserowQuery, _format_value
+
+logger = logging.getLogger(__name__)
+
+# Replicated tables: table id variable and the indexed columns data/baserow_tables.md recommends
+REPLICATED_TABLES = {
+    "accounts": ("BASEROW_ACCOUNTS_TABLE_ID", ("user_id", "plaid_item_id")),
+    "transactions": ("BASEROW_TRANSACTIONS_TABLE_ID", ("user_id", "account_id", "transaction_id")),
+    "tokens": ("BASEROW_TOKENS_TABLE_ID", ("user_id", "plaid_item_id")),
+}
+
+# Filter types the replica can evaluate; queries using others go to Baserow
+LOCAL_FILTER_TYPES = {"equal", "not_equal", "contains", "empty", "not_empty"}
+
+READ_MODES = ("baserow", "replica")
+
+ROW_ENDPOINT = re.compile(r"^/database/rows/table/(\w+)/(?:(\d+)/|(batch|batch-delete)/)?$")
+
+def _matches(row: Dict, field: str, filter_type: str, value) -> bool:
+    actual = _format_value(row.get(field))
+    if filter_type == "equal":
+        return actual == _format_value(value)
+    if filter_type == "not_equal":
+        return actual != _format_value(value)
+    if filter_type == "contains":
+        return _format_value(value).lower() in actual.lower()
+    if filter_type == "empty":
+        return actual == ""
+    return actual != ""
+
+class ReplicaStore:
+    """
+    Optional SQLite replica of the Accounts, Transactions and Tokens tables.
+
+    Our own writes are applied as they succeed (write-through via a
+    BaserowClient write listener), and every REPLICA_RECONCILE_INTERVAL
+    seconds each table is re-read from Baserow to pick up changes made
+    elsewhere. Reads opt in per view through REPLICA_READ_MODES, e.g.
+    "accounts=replica,tokens=replica"; views not listed read Baserow. A
+    table is only served locally once it has been reconciled at least once.
+
+    The file is shared by the application's workers. A lease row per table
+    lets one worker at a time reconcile it, at most once per interval; the
+    pages stream into a staging table that replaces the live one in a
+    single transaction, and writes made meanwhile are applied to both.
+    """
+    def __init__(self):
+        self.path = os.getenv("REPLICA_PATH", "")
+        self.reconcile_interval = float(os.getenv("REPLICA_RECONCILE_INTERVAL", "300"))
+        self.reconcile_lease = float(os.getenv("REPLICA_RECONCILE_LEASE", "60"))
+        self.owner = uuid.uuid4().hex
+        self.read_modes = self._parse_read_modes(os.getenv("REPLICA_READ_MODES", ""))
+        self.tables: Dict[str, str] = {}
+        for name, (variable, _) in REPLICATED_TABLES.items():
+            table_id = os.getenv(variable)
+            if table_id:
+                self.tables[str(table_id)] = name
+        self.synced_at: Dict[str, float] = {}
+        self.local_reads = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Tables whose next reconcile should not wait for the interval
+        self._forced: set = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        if self.enabled:
+            baserow_client.add_write_listener(self._on_write)
+
+    @staticmethod
+    def _parse_read_modes(value: str) -> Dict[str, str]:
+        modes = {}
+        for entry in filter(None, (part.strip() for part in value.split(","))):
+            view, _, mode = entry.partition("=")
+            if mode not in READ_MODES:
+                raise ValueError(f"Invalid REPLICA_READ_MODES entry: {entry}")
+            modes[view.strip()] = mode
+        return modes
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS reconcile_leases ("
+                "name TEXT PRIMARY KEY, owner TEXT, lease_until REAL NOT NULL, synced_at REAL)"
+            )
+            for name, (_, indexed) in REPLICATED_TABLES.items():
+                columns = "".join(f", {column} TEXT" for column in indexed)
+                for table in (name, f"{name}_staging"):
+                    connection.execute(
+                        f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY{columns}, data TEXT NOT NULL)"
+                    )
+                for column in indexed:
+                    connection.execute(
+                        f"CREATE INDEX IF NOT EXISTS {name}_{column} ON {name} ({column})"
+                    )
+            self._connection = connection
+        return self._connection
+
+    async def start(self) -> None:
+        """
+        Start periodic reconciliation (called from the application startup hook)
+        """
+        if not self.enabled or self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self) -> None:
+        """
+        Stop reconciliation and close the database (called from the shutdown hook)
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "read_modes": self.read_modes,
+            "synced_at": {name: self.synced_at.get(name) for name in self.tables.values()},
+            "local_reads": self.local_reads
+        }
+
+    async def _reconcile_loop(self) -> None:
+        # Check more often than the interval, so a table another worker synced is served promptly
+        poll_interval = min(self.reconcile_interval, 30.0)
+        while True:
+            for name in self.tables.values():
+                try:
+                    await self.reconcile(name, force=name in self._forced)
+                except Exception:
+                    logger.exception("Replica reconciliation of %s failed", name)
+            try:
+                self.synced_at.update(await asyncio.to_thread(self._shared_synced_at))
+            except Exception:
+                logger.exception("Reading replica sync times failed")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _shared_synced_at(self) -> Dict[str, float]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT name, synced_at FROM reconcile_leases WHERE synced_at IS NOT NULL"
+            ).fetchall()
+        return dict(rows)
+
+    def _acquire(self, name: str, force: bool) -> bool:
+        """
+        Take the table's reconcile lease unless another worker holds it or it was synced recently
+        """
+        now = time.time()
+        due_before = now if force else now - self.reconcile_interval
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR IGNORE INTO reconcile_leases (name, owner, lease_until, synced_at) VALUES (?, NULL, 0, NULL)",
+                    (name,)
+                )
+                acquired = connection.execute(
+                    "UPDATE reconcile_leases SET owner = ?, lease_until = ? "
+                    "WHERE name = ? AND (lease_until < ? OR owner = ?) "
+                    "AND (synced_at IS NULL OR synced_at < ?)",
+                    (self.owner, now + self.reconcile_lease, name, now, self.owner, due_before)
+                ).rowcount == 1
+                if acquired:
+                    # From here on writes also go to staging, so it starts empty in the same transaction
+                    connection.execute(f"DELETE FROM {name}_staging")
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return acquired
+
+    def _release(self, name: str, synced_at: Optional[float]) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                owned = connection.execute(
+                    "SELECT 1 FROM reconcile_leases WHERE name = ? AND owner = ?", (name, self.owner)
+                ).fetchone()
+                if not owned:
+                    # The lease lapsed and another worker took over; its staging table is not ours
+                    connection.execute("ROLLBACK")
+                    return
+                if synced_at is not None:
+                    # Swap the staged copy in; readers see the old or the new table, never a mix
+                    connection.execute(f"DELETE FROM {name}")
+                    connection.execute(f"INSERT INTO {name} SELECT * FROM {name}_staging")
+                connection.execute(f"DELETE FROM {name}_staging")
+                connection.execute(
+                    "UPDATE reconcile_leases SET owner = NULL, lease_until = 0, "
+                    "synced_at = COALESCE(?, synced_at) WHERE name = ? AND owner = ?",
+                    (synced_at, name, self.owner)
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    async def reconcile(self, name: str, force: bool = True) -> Optional[int]:
+        """
+        Replace a replicated table with a fresh copy read from Baserow.
+
+        Returns the number of rows read, or None when another worker holds
+        the table's lease or, unless forced, it was reconciled within the
+        interval.
+        """
+        if not await asyncio.to_thread(self._acquire, name, force):
+            return None
+        self._forced.discard(name)
+        table_id = next(table_id for table_id, table in self.tables.items() if table == name)
+        count, synced_at = 0, None
+        try:
+            # Pages are held in memory one at a time
+            async with aclosing(baserow_client.iter_pages(BaserowQuery(table_id), prefetch=False)) as pages:
+                async for page in pages:
+                    await asyncio.to_thread(self._stage, name, page)
+                    count += len(page)
+            synced_at = time.time()
+        finally:
+            await asyncio.to_thread(self._release, name, synced_at)
+        self.synced_at[name] = synced_at
+        return count
+
+    def _record(self, name: str, row: Dict) -> Tuple:
+        indexed = REPLICATED_TABLES[name][1]
+        return (row["id"], *(row.get(column) for column in indexed), json.dumps(row, default=_json_default))
+
+    def _stage(self, name: str, rows: List[Dict]) -> None:
+        """
+        Add a page to the staging table and extend the lease
+        """
+        placeholders = ", ".join("?" * (len(REPLICATED_TABLES[name][1]) + 2))
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                if connection.execute(
+                    "UPDATE reconcile_leases SET lease_until = ? WHERE name = ? AND owner = ?",
+                    (time.time() + self.reconcile_lease, name, self.owner)
+                ).rowcount != 1:
+                    raise RuntimeError(f"Lost the reconcile lease of {name}")
+                # A write applied to staging since the page was read is newer; keep it
+                connection.executemany(
+                    f"INSERT OR IGNORE INTO {name}_staging VALUES ({placeholders})",
+                    [self._record(name, row) for row in rows]
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _apply(self, name: str, upserts: List[Dict], deleted_ids: List[int]) -> None:
+        placeholders = ", ".join("?" * (len(REPLICATED_TABLES[name][1]) + 2))
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                tables = [name]
+                # Whichever worker is reconciling, the staged copy must not miss this write
+                if connection.execute(
+                    "SELECT 1 FROM reconcile_leases WHERE name = ? AND lease_until >= ?", (name, time.time())
+                ).fetchone():
+                    tables.append(f"{name}_staging")
+                for table in tables:
+                    connection.executemany(
+                        f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})",
+                        [self._record(name, row) for row in upserts]
+                    )
+                    connection.executemany(
+                        f"DELETE FROM {table} WHERE id = ?", [(row_id,) for row_id in deleted_ids]
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    async def _on_write(self, method: str, endpoint: str, data: Optional[Dict], response: Dict) -> None:
+        match = ROW_ENDPOINT.match(urlsplit(endpoint).path)
+        name = self.tables.get(match.group(1)) if match else None
+        if name is None:
+            return
+        row_id, action = match.group(2), match.group(3)
+
+        upserts, deleted_ids = [], []
+        if action == "batch":
+            upserts = response.get("items", [])
+        elif action == "batch-delete":
+            deleted_ids = list(data["items"])
+        elif row_id is not None and method == "DELETE":
+            deleted_ids = [int(row_id)]
+        elif method in ("POST", "PATCH") and response.get("id") is not None:
+            upserts = [response]
+        else:
+            # e.g. a filtered DELETE: the affected rows are unknown, so re-read the table
+            self._forced.add(name)
+            if self._wake is not None:
+                self._wake.set()
+            return
+
+        await asyncio.to_thread(self._apply, name, upserts, deleted_ids)
+
+    def _select(self, query: BaserowQuery) -> Optional[List[Dict]]:
+        name = self.tables.get(str(query.table_id))
+        if name is None or name not in self.synced_at:
+            return None
+        filters = query.filters
+        if any(filter_type not in LOCAL_FILTER_TYPES for _, filter_type, _ in filters):
+            return None
+
+        # Narrow the candidates through an index, then apply every filter in Python
+        indexed = REPLICATED_TABLES[name][1]
+        sql, params = f"SELECT data FROM {name}", []
+        equal_fields = {field for field, filter_type, _ in filters if filter_type == "equal"}
+        if query.filter_type == "AND":
+            field = next((field for field in indexed if field in equal_fields), None)
+            if field is not None:
+                value = next(value for f, t, value in filters if f == field and t == "equal")
+                sql, params = f"{sql} WHERE {field} = ?", [_format_value(value)]
+        elif (
+            all(filter_type == "equal" for _, filter_type, _ in filters)
+            and len(equal_fields) == 1
+            and equal_fields <= set(indexed)
+        ):
+            field = equal_fields.pop()
+            values = [_format_value(value) for _, _, value in filters]
+            sql = f"{sql} WHERE {field} IN ({', '.join('?' * len(values))})"
+            params = values
+
+        with self._lock:
+            rows = [json.loads(data) for (data,) in self._connect().execute(sql, params)]
+
+        combine = all if query.filter_type == "AND" else any
+        if filters:
+            rows = [
+                row for row in rows
+                if combine(_matches(row, *condition) for condition in filters)
+            ]
+        # Baserow orders by id unless asked otherwise
+        rows.sort(key=lambda row: row["id"])
+        for field in reversed(query.ordering):
+            descending = field.startswith("-")
+            field = field.lstrip("-")
+            rows.sort(key=lambda row: (row.get(field) is not None, row.get(field) or ""), reverse=descending)
+        if query.included_fields:
+            fields = set(query.included_fields) | {"id"}
+            rows = [{key: value for key, value in row.items() if key in fields} for row in rows]
+        return rows
+
+    async def list_rows(self, query: BaserowQuery, view: str) -> List[Dict]:
+        """
+        List rows for a view, from the replica when the view's read mode allows it
+        """
+        if self.enabled and self.read_modes.get(view) == "replica":
+            rows = await asyncio.to_thread(self._select, query)
+            if rows is not None:
+                self.local_reads += 1
+                return rows
+        return await baserow_client.list_rows(query)
+
+# Global instance
+replica_store = ReplicaStore()
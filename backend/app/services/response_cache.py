@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Aggregate views cached per user; invalidation drops all of them
+CACHED_VIEWS = ("accounts", "account_summary", "connected_accounts")
+
+class InMemoryCacheBackend:
+    """
+    Process-local LRU store; also the stand-in for a shared store in tests
+    """
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.time():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: Dict) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+class RedisCacheBackend:
+    """
+    Shared store so every worker sees the same entries and invalidations.
+
+    Needs the optional redis package (redis>=4.2 for redis.asyncio).
+    """
+    def __init__(self, url: str, prefix: str = "thrivebase:views:"):
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError:
+            raise ValueError("RESPONSE_CACHE_REDIS_URL is set but the redis package is not installed")
+        self.prefix = prefix
+        self._redis = redis_asyncio.from_url(url)
+
+    async def get(self, key: str) -> Optional[Dict]:
+        raw = await self._redis.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, entry: Dict) -> None:
+        ttl = max(int(entry["expires_at"] - time.time()), 1)
+        await self._redis.set(self.prefix + key, json.dumps(entry, default=_json_default), ex=ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(self.prefix + key)
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class ResponseCache:
+    """
+    Read-through cache for per-user aggregate views.
+
+    Entries are fresh for RESPONSE_CACHE_TTL seconds. After that they are
+    still served for RESPONSE_CACHE_STALE_TTL more seconds while a
+    background reload replaces them (stale-while-revalidate). Writes that
+    change a user's accounts call invalidate_user.
+    """
+    def __init__(self, backend=None):
+        self.ttl = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+        self.stale_ttl = float(os.getenv("RESPONSE_CACHE_STALE_TTL", "120"))
+        if backend is None:
+            redis_url = os.getenv("RESPONSE_CACHE_REDIS_URL")
+            if redis_url:
+                backend = RedisCacheBackend(redis_url)
+            else:
+                backend = InMemoryCacheBackend(int(os.getenv("RESPONSE_CACHE_SIZE", "4096")))
+        self.backend = backend
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        # Per-user invalidation counters; a load that started before an
+        # invalidation must not write its result back
+        self._generations: Dict[str, int] = {}
+
+    @staticmethod
+    def _key(view: str, user_id: str) -> str:
+        return f"{view}:{user_id}"
+
+    async def get_or_load(self, view: str, user_id: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached view for a user, loading it on a miss
+        """
+        if self.ttl <= 0:
+            return await loader()
+
+        key = self._key(view, user_id)
+        entry = await self.backend.get(key)
+        if entry is not None:
+            if entry["fresh_until"] <= time.time() and key not in self._refreshing:
+                task = asyncio.create_task(self._load(key, user_id, loader, background=True))
+                self._refreshing[key] = task
+                task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+            return entry["value"]
+
+        return await self._load(key, user_id, loader)
+
+    async def _load(
+        self,
+        key: str,
+        user_id: str,
+        loader: Callable[[], Awaitable[Any]],
+        background: bool = False
+    ) -> Any:
+        generation = self._generations.get(user_id, 0)
+        try:
+            value = await loader()
+        except Exception:
+            if background:
+                logger.exception("Background refresh of %s failed", key)
+                return None
+            raise
+        if self._generations.get(user_id, 0) == generation:
+            now = time.time()
+            await self.backend.set(key, {
+                "value": value,
+                "fresh_until": now + self.ttl,
+                "expires_at": now + self.ttl + self.stale_ttl
+            })
+        return value
+
+    async def invalidate_user(self, user_id: str) -> None:
+        """
+        Drop every cached view of a user after a write
+        """
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        await asyncio.gather(*(
+            self.backend.delete(self._key(view, user_id)) for view in CACHED_VIEWS
+        ))
+
+# Global instance
+response_cache = ResponseCache()
@@ -0,0 +1,234 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from .aggregation import TransactionColumns, summarize_rollups
+from .baserow_client import baserow_client
+from .baserow_query import BaserowQuery
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transaction_rollups (
+    user_id TEXT NOT NULL,
+    account_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total_cents INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, account_id, month, category)
+);
+CREATE TABLE IF NOT EXISTS rollup_users (
+    user_id TEXT PRIMARY KEY,
+    built_at REAL NOT NULL
+);
+"""
+
+# Fields a rollup needs from a Transactions row
+ROLLUP_FIELDS = ("user_id", "account_id", "amount", "date", "category")
+
+RollupKey = Tuple[str, str, str]
+
+def _deltas(rows: Iterable[Dict], sign: int, into: Dict[RollupKey, List[int]]) -> None:
+    # Normalise through TransactionColumns so keys match the on-the-fly summaries
+    columns = TransactionColumns.from_rows(rows)
+    for account_id, month, category, cents in zip(
+        columns.account_id, columns.month, columns.category, columns.amount
+    ):
+        delta = into[(account_id, month, category)]
+        delta[0] += sign * cents
+        delta[1] += sign
+
+class RollupStore:
+    """
+    Per-user transaction totals by account, month and category, kept in SQLite.
+
+    Writers apply the rows they added and removed, so summaries read
+    O(months x categories) rollup rows instead of every transaction. A
+    user's rollups are built from Baserow on their first read; until then
+    writes for that user are skipped. Set ROLLUP_STORE_PATH to an empty
+    value to disable the store.
+    """
+    def __init__(self):
+        self.path = os.getenv("ROLLUP_STORE_PATH", ".cache/rollups.sqlite3")
+        self.transactions_table_id = os.getenv("BASEROW_TRANSACTIONS_TABLE_ID")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._rebuilding: Dict[str, asyncio.Future] = {}
+        # Users written to while their rebuild was reading Baserow
+        self._stale: set = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _is_built(self, user_id: str) -> bool:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT 1 FROM rollup_users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return row is not None
+
+    def _apply(self, user_id: str, deltas: Dict[RollupKey, List[int]]) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN")
+            try:
+                connection.executemany(
+                    """
+                    INSERT INTO transaction_rollups
+                        (user_id, account_id, month, category, total_cents, count)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (user_id, account_id, month, category) DO UPDATE SET
+                        total_cents = total_cents + excluded.total_cents,
+                        count = count + excluded.count
+                    """,
+                    [(user_id, *key, cents, count) for key, (cents, count) in deltas.items()]
+                )
+                connection.execute(
+                    "DELETE FROM transaction_rollups WHERE user_id = ? AND count <= 0", (user_id,)
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _replace(self, user_ids: Iterable[str], deltas: Dict[str, Dict[RollupKey, List[int]]]) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN")
+            try:
+                for user_id in user_ids:
+                    connection.execute("DELETE FROM transaction_rollups WHERE user_id = ?", (user_id,))
+                    connection.executemany(
+                        """
+                        INSERT INTO transaction_rollups
+                            (user_id, account_id, month, category, total_cents, count)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        """,
+                        [
+                            (user_id, *key, cents, count)
+                            for key, (cents, count) in deltas.get(user_id, {}).items()
+                        ]
+                    )
+                    connection.execute(
+                        "INSERT OR REPLACE INTO rollup_users (user_id, built_at) VALUES (?, ?)",
+                        (user_id, time.time())
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _rollups(self, user_id: str, account_id: Optional[str]) -> List[Dict]:
+        sql = (
+            "SELECT account_id, month, category, total_cents, count "
+            "FROM transaction_rollups WHERE user_id = ?"
+        )
+        params = [user_id]
+        if account_id:
+            sql += " AND account_id = ?"
+            params.append(account_id)
+        with self._lock:
+            cursor = self._connect().execute(sql, params)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def _forget(self, user_id: str) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM transaction_rollups WHERE user_id = ?", (user_id,))
+            connection.execute("DELETE FROM rollup_users WHERE user_id = ?", (user_id,))
+
+    def _forget_marker(self, user_id: str) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM rollup_users WHERE user_id = ?", (user_id,))
+
+    async def apply(self, user_id: str, added: Iterable[Dict] = (), removed: Iterable[Dict] = ()) -> None:
+        """
+        Fold written transaction rows into a user's rollups
+        """
+        if not self.enabled:
+            return
+        if user_id in self._rebuilding:
+            self._stale.add(user_id)
+            return
+        if not await asyncio.to_thread(self._is_built, user_id):
+            return
+
+        deltas: Dict[RollupKey, List[int]] = defaultdict(lambda: [0, 0])
+        _deltas(added, 1, deltas)
+        _deltas(removed, -1, deltas)
+        if deltas:
+            await asyncio.to_thread(self._apply, user_id, deltas)
+
+    async def summary(self, user_id: str, account_id: Optional[str] = None) -> Dict:
+        """
+        Transaction totals of a user by category, month and account
+        """
+        if not await asyncio.to_thread(self._is_built, user_id):
+            await self.rebuild_user(user_id)
+        return summarize_rollups(await asyncio.to_thread(self._rollups, user_id, account_id))
+
+    async def rebuild_user(self, user_id: str) -> None:
+        """
+        Recompute one user's rollups from Baserow
+        """
+        future = self._rebuilding.get(user_id)
+        if future is None:
+            future = asyncio.ensure_future(self._rebuild_user(user_id))
+            self._rebuilding[user_id] = future
+            future.add_done_callback(lambda _: self._rebuilding.pop(user_id, None))
+        await asyncio.shield(future)
+
+    async def _rebuild_user(self, user_id: str) -> None:
+        self._stale.discard(user_id)
+        deltas: Dict[RollupKey, List[int]] = defaultdict(lambda: [0, 0])
+        query = BaserowQuery(self.transactions_table_id).equal("user_id", user_id).include(*ROLLUP_FIELDS)
+        async for row in baserow_client.iter_rows(query):
+            _deltas([row], 1, deltas)
+        await asyncio.to_thread(self._replace, [user_id], {user_id: deltas})
+
+        if user_id in self._stale:
+            # A write raced the read above; drop the marker so the next read rebuilds
+            self._stale.discard(user_id)
+            await asyncio.to_thread(self._forget_marker, user_id)
+
+    async def rebuild_all(self) -> int:
+        """
+        Recompute every user's rollups with one scan of the Transactions table
+        """
+        deltas: Dict[str, Dict[RollupKey, List[int]]] = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+        query = BaserowQuery(self.transactions_table_id).include(*ROLLUP_FIELDS)
+        async for row in baserow_client.iter_rows(query):
+            _deltas([row], 1, deltas[row.get("user_id") or ""])
+        await asyncio.to_thread(self._replace, list(deltas), deltas)
+        return len(deltas)
+
+    async def forget_user(self, user_id: str) -> None:
+        """
+        Drop a user's rollups, e.g. when their data is deleted
+        """
+        if self.enabled:
+            await asyncio.to_thread(self._forget, user_id)
+
+# Global instance
+rollup_store = RollupStore()
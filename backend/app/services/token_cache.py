@@ -0,0 +1,92 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+class CachedToken:
+    """
+    A decrypted access token and the id of the tokens-table row it came from.
+
+    The secret is held in a bytearray so it can be overwritten when the
+    entry is evicted or invalidated. Strings handed out by reveal() are
+    immutable and cannot be wiped, so callers should not hold on to them.
+    """
+    __slots__ = ("row_id", "expires_at", "_secret")
+
+    def __init__(self, row_id: int, secret: str, expires_at: float):
+        self.row_id = row_id
+        self.expires_at = expires_at
+        self._secret = bytearray(secret.encode())
+
+    def reveal(self) -> str:
+        return self._secret.decode()
+
+    def wipe(self) -> None:
+        for i in range(len(self._secret)):
+            self._secret[i] = 0
+        self._secret = bytearray()
+
+class TokenCache:
+    """
+    In-process LRU cache of decrypted access tokens keyed by (user_id, item_id)
+    """
+    def __init__(self):
+        self.ttl = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+        self.max_size = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+        self._entries: "OrderedDict[Tuple[str, str], CachedToken]" = OrderedDict()
+        # Bumped on every invalidation so a lookup that raced with a
+        # revocation cannot put the stale token back
+        self.generation = 0
+
+    def get(self, user_id: str, item_id: str) -> Optional[CachedToken]:
+        key = (user_id, item_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(
+        self,
+        user_id: str,
+        item_id: str,
+        row_id: int,
+        secret: str,
+        generation: Optional[int] = None
+    ) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            return
+
+        key = (user_id, item_id)
+        self._discard(key)
+        self._entries[key] = CachedToken(row_id, secret, time.monotonic() + self.ttl)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+
+    def invalidate(self, user_id: str, item_id: str) -> None:
+        self.generation += 1
+        self._discard((user_id, item_id))
+
+    def invalidate_user(self, user_id: str) -> None:
+        self.generation += 1
+        for key in [key for key in self._entries if key[0] == user_id]:
+            self._discard(key)
+
+    def clear(self) -> None:
+        self.generation += 1
+        for key in list(self._entries):
+            self._discard(key)
+
+    def _discard(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.wipe()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,8 +1,13 @@
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Dict, List, Optional
+from ..core.metrics import instrumented
 from ..core.security import token_encryption
 from ..models.token import PlaidTokenCreate, PlaidTokenUpdate
-from ..api.api_v1.endpoints.baserow import baserow_request
+from .baserow_client import baserow_client
+from .baserow_query import BaserowQuery
+from .replica_store import replica_store
+from .response_cache import response_cache
+from .token_cache import CachedToken, TokenCache
 import os
 
 class TokenService:
@@ -10,7 +15,9 @@ class TokenService:
         self.table_id = os.getenv("BASEROW_TOKENS_TABLE_ID")
         if not self.table_id:
             raise ValueError("BASEROW_TOKENS_TABLE_ID environment variable is required")
+        self.cache = TokenCache()
 
+    @instrumented("token_service")
     async def store_token(
         self,
         access_token: str,
@@ -33,76 +40,188 @@ class TokenService:
             status="active"
         )
         
-        response = await baserow_request(
+        response = await baserow_client.request(
             method="POST",
-            endpoint=f"/database/rows/table/{self.table_id}/",
+            endpoint=f"/database/rows/table/{self.table_id}/?user_field_names=true",
             data=token_data.dict()
         )
         
+        self.cache.invalidate(user_id, item_id)
+        if response.get("id") is not None:
+            self.cache.put(user_id, item_id, response["id"], access_token)
+        
         return response
 
-    async def get_access_token(self, item_id: str, user_id: str) -> Optional[str]:
+    async def _get_active_token(self, item_id: str, user_id: str) -> Optional[CachedToken]:
         """
-        Retrieve and decrypt an access token from Baserow
+        Look up the active token row for an item, served from cache when possible
         """
-        response = await baserow_request(
-            method="GET",
-            endpoint=f"/database/rows/table/{self.table_id}/?user_id={user_id}&plaid_item_id={item_id}&status=active"
+        cached = self.cache.get(user_id, item_id)
+        if cached is not None:
+            return cached
+        
+        generation = self.cache.generation
+        results = await replica_store.list_rows(
+            BaserowQuery(self.table_id)
+            .equal("user_id", user_id)
+            .equal("plaid_item_id", item_id)
+            .equal("status", "active")
+            .include("encrypted_access_token")
+            .size(1),
+            "tokens"
         )
         
-        results = response.get("results", [])
         if not results:
             return None
-            
-        encrypted_token = results[0].get("encrypted_access_token")
-        return token_encryption.decrypt_token(encrypted_token)
+        
+        access_token = self.decrypt_token_row(results[0])
+        if not access_token:
+            # Keep the row id usable (e.g. for revocation) without caching it
+            return CachedToken(results[0]["id"], "", 0)
+        
+        self.cache.put(user_id, item_id, results[0]["id"], access_token, generation=generation)
+        return self.cache.get(user_id, item_id) or CachedToken(results[0]["id"], access_token, 0)
+
+    @instrumented("token_service")
+    async def get_access_token(self, item_id: str, user_id: str) -> Optional[str]:
+        """
+        Retrieve and decrypt an access token from Baserow
+        """
+        token = await self._get_active_token(item_id, user_id)
+        if token is None:
+            return None
+        return token.reveal() or None
 
+    def decrypt_token_row(self, token: Dict) -> Optional[str]:
+        """
+        Decrypt the access token of a row already read from the tokens table
+        """
+        return token_encryption.decrypt_token(token.get("encrypted_access_token"))
+
+    async def decrypt_token_rows(self, tokens: List[Dict]) -> List[Optional[str]]:
+        """
+        Decrypt the access tokens of several rows in one batch
+        """
+        return await token_encryption.adecrypt_many([token.get("encrypted_access_token") for token in tokens])
+
+    @instrumented("token_service")
     async def revoke_token(self, item_id: str, user_id: str) -> bool:
         """
         Mark a token as revoked in Baserow
         """
-        response = await baserow_request(
-            method="GET",
-            endpoint=f"/database/rows/table/{self.table_id}/?user_id={user_id}&plaid_item_id={item_id}&status=active"
-        )
-        
-        results = response.get("results", [])
-        if not results:
+        return await self.set_status(item_id, user_id, "revoked")
+
+    @instrumented("token_service")
+    async def set_status(self, item_id: str, user_id: str, status: str) -> bool:
+        """
+        Move the active token of an item to another status (revoked, error)
+        """
+        token = await self._get_active_token(item_id, user_id)
+        if token is None:
             return False
             
-        token_id = results[0].get("id")
+        token_id = token.row_id
+        self.cache.invalidate(user_id, item_id)
         update_data = PlaidTokenUpdate(
-            status="revoked",
+            status=status,
             last_updated=datetime.utcnow()
         )
         
-        await baserow_request(
+        await baserow_client.request(
             method="PATCH",
-            endpoint=f"/database/rows/table/{self.table_id}/{token_id}/",
-            data=update_data.dict()
+            endpoint=f"/database/rows/table/{self.table_id}/{token_id}/?user_field_names=true",
+            data=update_data.dict(exclude_none=True)
         )
+        # Drop anything cached while the PATCH was in flight
+        self.cache.invalidate(user_id, item_id)
+        await response_cache.invalidate_user(user_id)
         
         return True
 
+    @instrumented("token_service")
     async def get_user_tokens(self, user_id: str) -> list:
         """
         Get all active tokens for a user
         """
-        response = await baserow_request(
+        return await baserow_client.list_rows(
+            BaserowQuery(self.table_id).equal("user_id", user_id).equal("status", "active")
+        )
+
+    @instrumented("token_service")
+    async def get_token_row(self, item_id: str, user_id: str) -> Optional[Dict]:
+        """
+        Get the active token row for an item, including its sync cursor
+        """
+        response = await baserow_client.request(
             method="GET",
-            endpoint=f"/database/rows/table/{self.table_id}/?user_id={user_id}&status=active"
+            endpoint=BaserowQuery(self.table_id)
+            .equal("user_id", user_id)
+            .equal("plaid_item_id", item_id)
+            .equal("status", "active")
+            .size(1)
+        )
+        
+        results = response.get("results", [])
+        return results[0] if results else None
+
+    @instrumented("token_service")
+    async def find_item_token(self, item_id: str) -> Optional[Dict]:
+        """
+        Get the active token row for an item without knowing its user (webhooks)
+        """
+        response = await baserow_client.request(
+            method="GET",
+            endpoint=BaserowQuery(self.table_id)
+            .equal("plaid_item_id", item_id)
+            .equal("status", "active")
+            .size(1)
+        )
+        
+        results = response.get("results", [])
+        return results[0] if results else None
+
+    @instrumented("token_service")
+    async def update_cursor(self, token_id: int, cursor: str) -> None:
+        """
+        Persist the transactions sync cursor of a token row
+        """
+        update_data = PlaidTokenUpdate(
+            transactions_cursor=cursor,
+            last_updated=datetime.utcnow()
         )
         
-        return response.get("results", [])
+        await baserow_client.request(
+            method="PATCH",
+            endpoint=f"/database/rows/table/{self.table_id}/{token_id}/?user_field_names=true",
+            data=update_data.dict(exclude_none=True)
+        )
+
+    @instrumented("token_service")
+    async def set_institution(self, token_id: int, institution_id: str, institution_name: Optional[str]) -> None:
+        """
+        Record the institution of a token row once it is known
+        """
+        update_data = PlaidTokenUpdate(
+            institution_id=institution_id,
+            institution_name=institution_name,
+            last_updated=datetime.utcnow()
+        )
+        
+        await baserow_client.request(
+            method="PATCH",
+            endpoint=f"/database/rows/table/{self.table_id}/{token_id}/?user_field_names=true",
+            data=update_data.dict(exclude_none=True)
+        )
 
+    @instrumented("token_service")
     async def delete_user_tokens(self, user_id: str) -> bool:
         """
         Delete all tokens for a user (used during account deletion)
         """
-        await baserow_request(
-            method="DELETE",
-            endpoint=f"/database/rows/table/{self.table_id}/?user_id={user_id}"
+        await baserow_client.delete_rows(
+            BaserowQuery(self.table_id).equal("user_id", user_id).include("user_id")
         )
+        self.cache.invalidate_user(user_id)
         
         return True
 
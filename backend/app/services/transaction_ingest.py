@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from fastapi import HTTPException
+from pydantic import ValidationError
+from ..models.transaction import TransactionCreate
+from .baserow_client import baserow_client
+from .response_cache import response_cache
+from .rollup_store import rollup_store
+from .transaction_sync import transaction_sync_service
+
+# Fields a client may send for each uploaded transaction
+UPLOAD_FIELDS = ("account_id", "transaction_id", "amount", "date", "description", "category")
+
+def dedupe_key(row: Dict, occurrence: int) -> str:
+    """
+    Stable transaction_id for an uploaded row that does not carry one.
+
+    The occurrence number keeps genuinely repeated transactions (two
+    identical coffees on one day) apart within an upload, while a retried
+    upload of the same data produces the same keys again.
+    """
+    content = "|".join(str(row[field]) for field in ("account_id", "amount", "date", "description", "category"))
+    digest = hashlib.sha256(f"{row['user_id']}|{content}|{occurrence}".encode()).hexdigest()
+    return f"upload:{digest[:32]}"
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator:
+    """
+    Parse an NDJSON body as it arrives; undecodable lines are yielded as the error
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _decode(line)
+    if buffer.strip():
+        yield _decode(buffer)
+
+def _decode(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return e
+
+class TransactionIngestor:
+    """
+    Streaming, idempotent import of uploaded transactions.
+
+    Records are validated one at a time and grouped into Baserow-sized
+    chunks. Chunks wait in a queue of INGEST_QUEUE_CHUNKS that
+    INGEST_WRITERS writers drain, so a slow Baserow stops the upload from
+    being read any further instead of buffering it. Every row is stored
+    with a transaction_id (the client's, or a dedupe key), and rows whose
+    id already exists for the user are skipped, which makes retried
+    uploads safe. Ids a writer is still storing are held in a shared
+    in-flight set, so the same id in two chunks written at once (or in two
+    concurrent uploads) is stored only once.
+    """
+    def __init__(self):
+        self.transactions_table_id = os.getenv("BASEROW_TRANSACTIONS_TABLE_ID")
+        self.chunk_size = baserow_client.batch_size
+        self.queue_size = int(os.getenv("INGEST_QUEUE_CHUNKS", "4"))
+        self.writers = int(os.getenv("INGEST_WRITERS", "4"))
+        self._inflight: Set[Tuple[str, str]] = set()
+
+    async def ingest(self, user_id: str, records: AsyncIterator) -> Dict:
+        """
+        Validate, dedupe and store a stream of transaction records
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        chunk_results: List[Dict] = []
+        errors: List[Dict] = []
+
+        async def write_chunks() -> None:
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    try:
+                        chunk_results.append(await self._write_chunk(user_id, *item))
+                    except Exception as e:
+                        # Keep draining so the upload is never left blocked on a full queue
+                        number, rows, indexes = item
+                        error = e.detail if isinstance(e, HTTPException) else str(e)
+                        chunk_results.append({
+                            "chunk": number,
+                            "received": len(rows),
+                            "created": 0,
+                            "duplicates": 0,
+                            "failed": len(rows),
+                            "errors": [{"index": index, "error": error} for index in indexes]
+                        })
+                finally:
+                    queue.task_done()
+
+        writers = [asyncio.create_task(write_chunks()) for _ in range(self.writers)]
+        try:
+            received = 0
+            chunk_count = 0
+            occurrences: Dict[str, int] = defaultdict(int)
+            chunk: List[Dict] = []
+            indexes: List[int] = []
+            async for record in records:
+                index = received
+                received += 1
+                row = self._validate(user_id, record, index, errors)
+                if row is None:
+                    continue
+                if not row.get("transaction_id"):
+                    content = dedupe_key(row, 0)
+                    row["transaction_id"] = dedupe_key(row, occurrences[content])
+                    occurrences[content] += 1
+                chunk.append(row)
+                indexes.append(index)
+                if len(chunk) >= self.chunk_size:
+                    # Blocks while the queue is full: back-pressure on the upload
+                    await queue.put((chunk_count, chunk, indexes))
+                    chunk_count += 1
+                    chunk, indexes = [], []
+            if chunk:
+                await queue.put((chunk_count, chunk, indexes))
+            for _ in writers:
+                await queue.put(None)
+            await asyncio.gather(*writers)
+        except BaseException:
+            for writer in writers:
+                writer.cancel()
+            await asyncio.gather(*writers, return_exceptions=True)
+            raise
+
+        chunk_results.sort(key=lambda result: result["chunk"])
+        created = sum(result["created"] for result in chunk_results)
+        duplicates = sum(result["duplicates"] for result in chunk_results)
+        for result in chunk_results:
+            errors.extend(result.pop("errors"))
+        errors.sort(key=lambda error: error["index"])
+        if created:
+            await response_cache.invalidate_user(user_id)
+
+        return {
+            "status": "success" if not errors else "partial",
+            "message": f"Stored {created} transactions",
+            "received": received,
+            "succeeded": created,
+            "duplicates": duplicates,
+            "failed": len(errors),
+            "errors": errors,
+            "chunks": chunk_results
+        }
+
+    @staticmethod
+    def _validate(user_id: str, record, index: int, errors: List[Dict]) -> Optional[Dict]:
+        if isinstance(record, Exception):
+            errors.append({"index": index, "error": f"Invalid JSON: {record}"})
+            return None
+        if not isinstance(record, dict):
+            errors.append({"index": index, "error": "Expected a JSON object"})
+            return None
+        try:
+            fields = {field: record[field] for field in UPLOAD_FIELDS if field in record}
+            return TransactionCreate(user_id=user_id, **fields).dict()
+        except ValidationError as e:
+            errors.append({"index": index, "error": e.errors()})
+            return None
+
+    async def _write_chunk(self, user_id: str, number: int, rows: List[Dict], indexes: List[int]) -> Dict:
+        # A dedupe key can repeat within a chunk only if the client sent its own ids twice
+        unique: Dict[str, int] = {}
+        for position, row in enumerate(rows):
+            unique.setdefault(row["transaction_id"], position)
+
+        # Claim the ids before awaiting anything; ids another writer holds are its to store
+        claimed = [key for key in unique if (user_id, key) not in self._inflight]
+        self._inflight.update((user_id, key) for key in claimed)
+        try:
+            existing = await transaction_sync_service.existing_rows(user_id, claimed)
+            positions = [unique[key] for key in claimed if key not in existing]
+
+            result = await baserow_client.batch_create(
+                self.transactions_table_id, [rows[position] for position in positions]
+            )
+        finally:
+            self._inflight.difference_update((user_id, key) for key in claimed)
+        if result.succeeded:
+            await rollup_store.apply(user_id, added=result.rows)
+
+        return {
+            "chunk": number,
+            "received": len(rows),
+            "created": result.succeeded,
+            "duplicates": len(rows) - len(positions),
+            "failed": result.failed,
+            "errors": [
+                {"index": indexes[positions[error["index"]]], "error": error["error"]}
+                for error in result.errors
+            ]
+        }
+
+# Global instance
+transaction_ingestor = TransactionIngestor()
@@ -0,0 +1,196 @@
+import asyncio
+import os
+from decimal import Decimal
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from ..models.transaction import TransactionCreate
+from .baserow_client import baserow_client
+from .baserow_query import BaserowQuery
+from .plaid_gateway import plaid_gateway
+from . import plaid_models
+from .response_cache import response_cache
+from .rollup_store import ROLLUP_FIELDS, rollup_store
+from .token_service import token_service
+
+# Plaid asks clients to restart from the original cursor on this error
+MUTATION_DURING_PAGINATION = "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION"
+
+def _category(transaction: Dict) -> str:
+    personal_finance_category = transaction.get("personal_finance_category")
+    if personal_finance_category and personal_finance_category.get("primary"):
+        return personal_finance_category["primary"]
+    categories = transaction.get("category") or []
+    return categories[-1] if categories else "Uncategorized"
+
+def to_transaction_row(transaction: Dict, user_id: str) -> Dict:
+    """
+    Map a Plaid transaction to a Baserow Transactions row
+    """
+    return TransactionCreate(
+        user_id=user_id,
+        account_id=transaction["account_id"],
+        transaction_id=transaction["transaction_id"],
+        amount=Decimal(str(transaction["amount"])),
+        date=str(transaction["date"]),
+        description=transaction.get("merchant_name") or transaction["name"],
+        category=_category(transaction)
+    ).dict()
+
+class TransactionSyncService:
+    """
+    Incremental transaction sync through Plaid's /transactions/sync.
+
+    Each token row keeps the cursor of its last successful run, so a run
+    only moves what changed since then. Deltas are applied to Baserow in
+    batches, and the new cursor is saved only after they were written.
+    Re-running after a failure is therefore safe.
+    """
+    def __init__(self):
+        self.transactions_table_id = os.getenv("BASEROW_TRANSACTIONS_TABLE_ID")
+        self.page_size = int(os.getenv("PLAID_SYNC_PAGE_SIZE", "500"))
+        self.lookup_chunk_size = int(os.getenv("TRANSACTION_SYNC_LOOKUP_CHUNK", "50"))
+        self.max_restarts = 3
+
+    async def _fetch_changes(self, access_token: str, cursor: Optional[str]) -> Dict:
+        """
+        Page through /transactions/sync from a cursor and collect the deltas
+        """
+        for _ in range(self.max_restarts):
+            added, modified, removed = [], [], []
+            next_cursor = cursor
+            try:
+                has_more = True
+                while has_more:
+                    options = {"access_token": access_token, "count": self.page_size}
+                    if next_cursor:
+                        options["cursor"] = next_cursor
+                    response = await plaid_gateway.transactions_sync(plaid_models.TransactionsSyncRequest(**options))
+                    added.extend(response["added"])
+                    modified.extend(response["modified"])
+                    removed.extend(response["removed"])
+                    has_more = response["has_more"]
+                    next_cursor = response["next_cursor"]
+            except Exception as e:
+                if MUTATION_DURING_PAGINATION in str(getattr(e, "body", "")):
+                    continue
+                raise
+            return {
+                "added": added,
+                "modified": modified,
+                "removed": removed,
+                "next_cursor": next_cursor
+            }
+
+        raise HTTPException(status_code=503, detail="Transactions changed during sync, try again later")
+
+    async def existing_rows(self, user_id: str, transaction_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Map Plaid transaction ids to the rows already stored for the user
+        """
+        chunks = [
+            transaction_ids[start:start + self.lookup_chunk_size]
+            for start in range(0, len(transaction_ids), self.lookup_chunk_size)
+        ]
+
+        async def lookup(chunk: List[str]) -> List[Dict]:
+            query = (
+                BaserowQuery(self.transactions_table_id)
+                .include("transaction_id", *ROLLUP_FIELDS)
+                .match_any()
+            )
+            for transaction_id in chunk:
+                query.equal("transaction_id", transaction_id)
+            return await baserow_client.list_rows(query)
+
+        existing = {}
+        for rows in await asyncio.gather(*(lookup(chunk) for chunk in chunks)):
+            for row in rows:
+                # The OR filter cannot also constrain user_id, so check it here
+                if row.get("user_id") == user_id:
+                    existing[row["transaction_id"]] = row
+        return existing
+
+    async def sync_item(self, user_id: str, item_id: str, token: Optional[Dict] = None) -> Dict:
+        """
+        Apply the transaction changes of one item since its stored cursor
+        """
+        if token is None:
+            token = await token_service.get_token_row(item_id, user_id)
+        if token is None:
+            raise HTTPException(status_code=404, detail="Access token not found")
+
+        access_token = token_service.decrypt_token_row(token)
+        if not access_token:
+            raise HTTPException(status_code=404, detail="Access token not found")
+
+        changes = await self._fetch_changes(access_token, token.get("transactions_cursor"))
+
+        # Upsert: rows from an interrupted earlier run may already exist
+        upserts = {t["transaction_id"]: t for t in changes["added"] + changes["modified"]}
+        removed_ids = [t["transaction_id"] for t in changes["removed"]]
+        for transaction_id in removed_ids:
+            upserts.pop(transaction_id, None)
+        existing = await self.existing_rows(user_id, list(upserts) + removed_ids)
+
+        new_rows, updated_rows = [], []
+        for transaction_id, transaction in upserts.items():
+            row = to_transaction_row(transaction, user_id)
+            if transaction_id in existing:
+                updated_rows.append({"id": existing[transaction_id]["id"], **row})
+            else:
+                new_rows.append(row)
+        deleted_row_ids = [existing[t]["id"] for t in removed_ids if t in existing]
+
+        created, updated, deleted = await asyncio.gather(
+            baserow_client.batch_create(self.transactions_table_id, new_rows),
+            baserow_client.batch_update(self.transactions_table_id, updated_rows),
+            baserow_client.batch_delete(self.transactions_table_id, deleted_row_ids)
+        )
+
+        # Roll up only what was written; a retry picks up the rest as upserts
+        old_rows = {row["id"]: row for row in existing.values()}
+        new_values = {row["id"]: row for row in updated_rows}
+        await rollup_store.apply(
+            user_id,
+            added=created.rows + [new_values[row["id"]] for row in updated.rows],
+            removed=[old_rows[row["id"]] for row in updated.rows] + [old_rows[row_id] for row_id in deleted.rows]
+        )
+        if created.succeeded or updated.succeeded or deleted.succeeded:
+            await response_cache.invalidate_user(user_id)
+
+        if created.failed or updated.failed or deleted.failed:
+            # Keep the old cursor so the next run retries the same deltas
+            raise HTTPException(status_code=502, detail="Failed to store synced transactions")
+
+        if changes["next_cursor"] != token.get("transactions_cursor"):
+            await token_service.update_cursor(token["id"], changes["next_cursor"])
+
+        return {
+            "item_id": item_id,
+            "added": created.succeeded,
+            "modified": updated.succeeded,
+            "removed": deleted.succeeded
+        }
+
+    async def sync_user(self, user_id: str) -> List[Dict]:
+        """
+        Sync every active item of a user concurrently, reporting per-item status
+        """
+        tokens = await token_service.get_user_tokens(user_id)
+
+        async def sync(token: Dict) -> Dict:
+            try:
+                outcome = await self.sync_item(user_id, token["plaid_item_id"], token=token)
+                outcome["status"] = "success"
+                return outcome
+            except Exception as e:
+                return {
+                    "item_id": token["plaid_item_id"],
+                    "status": "error",
+                    "error": e.detail if isinstance(e, HTTPException) else str(e)
+                }
+
+        return await asyncio.gather(*(sync(token) for token in tokens))
+
+# Global instance
+transaction_sync_service = TransactionSyncService()
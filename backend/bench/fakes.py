@@ -0,0 +1,310 @@
+"""
+Local stand-ins for Baserow and Plaid with injected latency.
+
+Run as python -m bench.fakes; bench.run starts it in its own process so
+the fakes never compete with the application for its event loop.
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List
+from aiohttp import web
+
+# Baserow rejects batch requests with more than 200 items
+MAX_BATCH_SIZE = 200
+
+class Latency:
+    """
+    Delay of every fake response: mean_ms, varied uniformly by +/- jitter (a fraction)
+    """
+    def __init__(self, mean_ms: float, jitter: float, rng: random.Random):
+        self.mean_ms = mean_ms
+        self.jitter = jitter
+        self.rng = rng
+
+    async def wait(self) -> None:
+        if self.mean_ms <= 0:
+            return
+        spread = self.mean_ms * self.jitter
+        await asyncio.sleep(max(self.mean_ms + self.rng.uniform(-spread, spread), 0) / 1000)
+
+def _matches(row: Dict, field: str, filter_type: str, value: str) -> bool:
+    current = row.get(field)
+    text = "" if current is None else str(current)
+    if filter_type == "equal":
+        return text == value
+    if filter_type == "not_equal":
+        return text != value
+    if filter_type == "contains":
+        return value.lower() in text.lower()
+    if filter_type in ("higher_than", "lower_than"):
+        try:
+            difference = Decimal(text) - Decimal(value)
+        except ArithmeticError:
+            return False
+        return difference > 0 if filter_type == "higher_than" else difference < 0
+    if filter_type == "date_equal":
+        return text[:10] == value
+    if filter_type == "date_before":
+        return bool(text) and text[:10] < value
+    if filter_type == "date_after":
+        return bool(text) and text[:10] > value
+    if filter_type == "empty":
+        return not text
+    if filter_type == "not_empty":
+        return bool(text)
+    raise web.HTTPBadRequest(text=f"Unsupported filter type {filter_type}")
+
+class FakeBaserow:
+    """
+    In-memory tables behind the subset of the rows API the application uses
+    """
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.tables: Dict[str, Dict[int, Dict]] = {}
+        self.next_id = 1
+        self.calls: Counter = Counter()
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/_bench/stats", self.stats)
+        app.router.add_route("*", "/database/rows/table/{table_id}/", self.rows)
+        app.router.add_route("*", "/database/rows/table/{table_id}/batch/", self.batch)
+        app.router.add_post("/database/rows/table/{table_id}/batch-delete/", self.batch_delete)
+        app.router.add_route("*", "/database/rows/table/{table_id}/{row_id:\\d+}/", self.row)
+        return app
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "calls": dict(self.calls),
+            "rows": {table_id: len(rows) for table_id, rows in self.tables.items()}
+        })
+
+    def _table(self, request: web.Request) -> Dict[int, Dict]:
+        return self.tables.setdefault(request.match_info["table_id"], {})
+
+    def _create(self, table: Dict[int, Dict], data: Dict) -> Dict:
+        row = {**data, "id": self.next_id}
+        self.next_id += 1
+        table[row["id"]] = row
+        return row
+
+    async def _begin(self, request: web.Request, operation: str) -> None:
+        self.calls[f"{request.method} {operation}"] += 1
+        await self.latency.wait()
+
+    async def rows(self, request: web.Request) -> web.Response:
+        await self._begin(request, "rows")
+        table = self._table(request)
+        if request.method == "POST":
+            return web.json_response(self._create(table, await request.json()))
+        if request.method != "GET":
+            raise web.HTTPMethodNotAllowed(request.method, ["GET", "POST"])
+
+        query = request.query
+        conditions = [
+            (key.split("__")[1], key.split("__")[2], value)
+            for key, value in query.items()
+            if key.startswith("filter__")
+        ]
+        combine = any if query.get("filter_type") == "OR" else all
+        rows = [
+            row for row in table.values()
+            if not conditions or combine(_matches(row, *condition) for condition in conditions)
+        ]
+        for field in reversed([field for field in query.get("order_by", "").split(",") if field]):
+            descending = field.startswith("-")
+            rows.sort(key=lambda row: str(row.get(field.lstrip("-+"), "")), reverse=descending)
+
+        size = int(query.get("size", 100))
+        page = int(query.get("page", 1))
+        results = rows[(page - 1) * size:page * size]
+        if "include" in query:
+            fields = set(query["include"].split(",")) | {"id"}
+            results = [{key: value for key, value in row.items() if key in fields} for row in results]
+        next_url = None
+        if page * size < len(rows):
+            next_url = str(request.url.update_query({"page": str(page + 1)}))
+        return web.json_response({"count": len(rows), "next": next_url, "previous": None, "results": results})
+
+    async def row(self, request: web.Request) -> web.Response:
+        await self._begin(request, "row")
+        table = self._table(request)
+        row_id = int(request.match_info["row_id"])
+        if row_id not in table:
+            raise web.HTTPNotFound()
+        if request.method == "PATCH":
+            table[row_id].update(await request.json())
+        elif request.method == "DELETE":
+            del table[row_id]
+            return web.Response(status=204)
+        return web.json_response(table[row_id])
+
+    async def batch(self, request: web.Request) -> web.Response:
+        await self._begin(request, "batch")
+        table = self._table(request)
+        items = (await request.json())["items"]
+        if len(items) > MAX_BATCH_SIZE:
+            raise web.HTTPBadRequest(text="Too many items in batch")
+        if request.method == "POST":
+            return web.json_response({"items": [self._create(table, item) for item in items]})
+        if any(item.get("id") not in table for item in items):
+            raise web.HTTPNotFound()
+        for item in items:
+            table[item["id"]].update(item)
+        return web.json_response({"items": [table[item["id"]] for item in items]})
+
+    async def batch_delete(self, request: web.Request) -> web.Response:
+        await self._begin(request, "batch-delete")
+        table = self._table(request)
+        row_ids = (await request.json())["items"]
+        if len(row_ids) > MAX_BATCH_SIZE:
+            raise web.HTTPBadRequest(text="Too many items in batch")
+        for row_id in row_ids:
+            table.pop(row_id, None)
+        return web.Response(status=204)
+
+def _digest(*parts) -> str:
+    return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()[:16]
+
+class FakePlaid:
+    """
+    Plaid API stand-in: one POST /<client method> per call, answering with
+    deterministic items, institutions, accounts and transactions
+    """
+    def __init__(self, latency: Latency, rng: random.Random, institutions: int, accounts_per_item: int, transactions_per_sync: int):
+        self.latency = latency
+        self.rng = rng
+        self.institutions = institutions
+        self.accounts_per_item = accounts_per_item
+        self.transactions_per_sync = transactions_per_sync
+        self.calls: Counter = Counter()
+        self.balances: Dict[str, Decimal] = {}
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/_bench/stats", self.stats)
+        app.router.add_post("/{method}", self.call)
+        return app
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"calls": dict(self.calls)})
+
+    async def call(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        handler = getattr(self, f"_{method}", None)
+        if handler is None:
+            raise web.HTTPNotFound(text=f"Unknown Plaid method {method}")
+        self.calls[method] += 1
+        args = (await request.json())["args"]
+        await self.latency.wait()
+        return web.json_response(handler(*args))
+
+    @staticmethod
+    def _item_id(access_token: str) -> str:
+        return access_token.rsplit("-", 1)[-1]
+
+    def _link_token_create(self, request: Dict) -> Dict:
+        return {"link_token": f"link-bench-{_digest(request, self.rng.random())}"}
+
+    def _item_public_token_exchange(self, request: Dict) -> Dict:
+        item_id = _digest(request["public_token"])
+        return {"access_token": f"access-bench-{item_id}", "item_id": item_id}
+
+    def _item_get(self, access_token: str) -> Dict:
+        item_id = self._item_id(access_token)
+        return {"item": {"item_id": item_id, "institution_id": f"ins_{int(item_id, 16) % self.institutions}"}}
+
+    def _institutions_get_by_id(self, request: Dict) -> Dict:
+        institution_id = request["institution_id"]
+        return {"institution": {
+            "institution_id": institution_id,
+            "name": f"Bench Bank {institution_id}",
+            "url": f"https://{institution_id}.example.com",
+            "primary_color": "#1f6feb",
+            "logo": None
+        }}
+
+    def _accounts_get(self, request: Dict) -> Dict:
+        item_id = self._item_id(request["access_token"])
+        accounts = []
+        for number in range(self.accounts_per_item):
+            account_id = f"{item_id}-{number}"
+            # Balances drift between calls so refreshes have something to write
+            balance = self.balances.get(account_id, Decimal(self.rng.randint(100, 100000)))
+            if self.rng.random() < 0.5:
+                balance += Decimal(self.rng.randint(-5000, 5000)) / 100
+            self.balances[account_id] = balance
+            accounts.append({
+                "account_id": account_id,
+                "name": f"Account {number}",
+                "official_name": None,
+                "type": "depository" if number else "credit",
+                "subtype": "checking" if number else "credit card",
+                "balances": {"current": float(balance), "available": float(balance), "iso_currency_code": "USD"}
+            })
+        return {"accounts": accounts, "item": {"item_id": item_id}}
+
+    def _transactions_sync(self, request: Dict) -> Dict:
+        item_id = self._item_id(request["access_token"])
+        cursor = int(request.get("cursor") or 0)
+        added = []
+        for number in range(self.transactions_per_sync):
+            added.append({
+                "transaction_id": f"{item_id}-{cursor}-{number}",
+                "account_id": f"{item_id}-{number % self.accounts_per_item}",
+                "amount": round(self.rng.uniform(1, 250), 2),
+                "date": (date(2024, 1, 1) + timedelta(days=(cursor * 7 + number) % 365)).isoformat(),
+                "name": f"Merchant {self.rng.randint(1, 50)}",
+                "merchant_name": None,
+                "personal_finance_category": {"primary": self.rng.choice(["FOOD_AND_DRINK", "TRANSPORTATION", "GENERAL_MERCHANDISE"])}
+            })
+        return {"added": added, "modified": [], "removed": [], "has_more": False, "next_cursor": str(cursor + 1)}
+
+    def _item_remove(self, access_token: str) -> Dict:
+        return {"request_id": _digest(access_token)}
+
+async def serve(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    baserow = FakeBaserow(Latency(args.baserow_latency_ms, args.jitter, rng))
+    plaid = FakePlaid(
+        Latency(args.plaid_latency_ms, args.jitter, rng),
+        rng,
+        institutions=args.institutions,
+        accounts_per_item=args.accounts_per_item,
+        transactions_per_sync=args.transactions_per_sync
+    )
+    runners: List[web.AppRunner] = []
+    for app, port in ((baserow.app(), args.baserow_port), (plaid.app(), args.plaid_port)):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        runners.append(runner)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Baserow and Plaid servers for benchmarks")
+    parser.add_argument("--baserow-port", type=int, default=8765)
+    parser.add_argument("--plaid-port", type=int, default=8766)
+    parser.add_argument("--baserow-latency-ms", type=float, default=30)
+    parser.add_argument("--plaid-latency-ms", type=float, default=200)
+    parser.add_argument("--jitter", type=float, default=0.25, help="Latency variation as a fraction of the mean")
+    parser.add_argument("--institutions", type=int, default=20)
+    parser.add_argument("--accounts-per-item", type=int, default=3)
+    parser.add_argument("--transactions-per-sync", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
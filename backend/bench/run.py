@@ -0,0 +1,374 @@
+"""
+Load benchmark of the API against local Baserow and Plaid stand-ins.
+
+    cd backend
+    python -m bench.run --duration 10 --concurrency 16 --baserow-latency-ms 30
+
+Starts bench.fakes and the application (bench.server under uvicorn) in
+their own processes, seeds users through the API, then runs each
+scenario for --duration seconds with --concurrency closed-loop clients.
+For every endpoint it reports requests per second and p50/p95/p99
+latency, and for every scenario the upstream calls the fakes received
+and the per-endpoint dependency calls from the application's /metrics.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional
+import aiohttp
+
+API = "/api/v1"
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRIC_SAMPLE = re.compile(r'^thrivebase_upstream_duration_seconds_count\{(.*)\} (\S+)$')
+METRIC_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Nearest-rank percentile of unsorted values
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+class Recorder:
+    """
+    Latencies and failures of the requests made during one scenario, per endpoint
+    """
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+
+    def report(self, elapsed: float) -> Dict[str, Dict]:
+        return {
+            endpoint: {
+                "requests": len(latencies),
+                "errors": self.errors[endpoint],
+                "rps": round(len(latencies) / elapsed, 1),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1)
+            }
+            for endpoint, latencies in sorted(self.latencies.items())
+        }
+
+class BenchClient:
+    """
+    HTTP client for the application under test, acting as any bench user
+    """
+    def __init__(self, session: aiohttp.ClientSession, base_url: str, rng: random.Random, args: argparse.Namespace):
+        self.session = session
+        self.base_url = base_url
+        self.rng = rng
+        self.args = args
+        self.recorder: Optional[Recorder] = None
+
+    async def request(self, method: str, path: str, user_id: str, name: Optional[str] = None, **kwargs):
+        name = name or f"{method} {API}{path}"
+        headers = {"X-Bench-User": user_id, **kwargs.pop("headers", {})}
+        started = time.perf_counter()
+        failed = True
+        body = None
+        try:
+            async with self.session.request(method, f"{self.base_url}{API}{path}", headers=headers, **kwargs) as response:
+                body = await response.read()
+                failed = response.status >= 400
+        except aiohttp.ClientError:
+            pass
+        if self.recorder is not None:
+            self.recorder.latencies[name].append(time.perf_counter() - started)
+            if failed:
+                self.recorder.errors[name] += 1
+        return json.loads(body) if body and not failed else None
+
+    async def dashboard(self, user_id: str) -> None:
+        # What the dashboard view requests when it opens
+        await asyncio.gather(
+            self.request("GET", "/plaid/accounts", user_id),
+            self.request("GET", "/plaid/connected-institutions", user_id),
+            self.request("GET", "/users/connected-accounts", user_id),
+            self.request("GET", "/baserow/account-summary", user_id),
+            self.request("GET", "/baserow/transaction-summary", user_id),
+            self.request("GET", "/baserow/user-transactions", user_id)
+        )
+
+    async def link(self, user_id: str) -> None:
+        public_token = f"public-bench-{user_id}-{self.rng.getrandbits(64):016x}"
+        await self.request(
+            "POST", "/plaid/exchange_public_token", user_id, params={"public_token": public_token}
+        )
+
+    async def refresh(self, user_id: str) -> None:
+        await self.request("POST", "/plaid/accounts/refresh-all", user_id)
+
+    async def upload(self, user_id: str, rows: Optional[int] = None) -> None:
+        lines = []
+        for number in range(rows or self.args.upload_rows):
+            lines.append(json.dumps({
+                "account_id": f"upload-{user_id}-{number % 3}",
+                "amount": f"{self.rng.uniform(1, 500):.2f}",
+                "date": f"2024-{self.rng.randint(1, 12):02d}-{self.rng.randint(1, 28):02d}",
+                "description": f"Bulk import {self.rng.getrandbits(32):08x}",
+                "category": self.rng.choice(["Groceries", "Rent", "Travel", "Dining"])
+            }))
+        await self.request(
+            "POST", "/baserow/store-transactions", user_id,
+            data="\n".join(lines).encode(),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+
+    async def wait_for_jobs(self, user_ids: List[str], timeout: float = 300) -> None:
+        """
+        Wait until no user has queued or running jobs (post-Link work)
+        """
+        deadline = time.monotonic() + timeout
+        pending = list(user_ids)
+        while pending and time.monotonic() < deadline:
+            remaining = []
+            for user_id in pending:
+                jobs = await self.request("GET", "/jobs/", user_id, params={"limit": "100"}) or []
+                if any(job["status"] in ("queued", "running") for job in jobs):
+                    remaining.append(user_id)
+            pending = remaining
+            if pending:
+                await asyncio.sleep(0.2)
+        if pending:
+            raise RuntimeError(f"Jobs of {len(pending)} users did not finish in {timeout}s")
+
+SCENARIOS: Dict[str, Callable[[BenchClient, str], Awaitable[None]]] = {
+    "dashboard": BenchClient.dashboard,
+    "refresh": BenchClient.refresh,
+    "link": BenchClient.link,
+    "upload": BenchClient.upload,
+}
+
+async def _get_json(session: aiohttp.ClientSession, url: str) -> Dict:
+    async with session.get(url) as response:
+        response.raise_for_status()
+        return await response.json()
+
+async def _upstream_by_endpoint(session: aiohttp.ClientSession, base_url: str) -> Counter:
+    async with session.get(f"{base_url}/metrics") as response:
+        text = await response.text()
+    counts: Counter = Counter()
+    for line in text.splitlines():
+        match = METRIC_SAMPLE.match(line)
+        if match:
+            labels = dict(METRIC_LABEL.findall(match.group(1)))
+            if labels["upstream"] in ("baserow", "plaid"):
+                counts[(labels["endpoint"], f"{labels['upstream']} {labels['operation']}")] += float(match.group(2))
+    return counts
+
+async def _snapshot(session: aiohttp.ClientSession, urls: Dict[str, str]) -> Dict:
+    baserow, plaid, by_endpoint = await asyncio.gather(
+        _get_json(session, f"{urls['baserow']}/_bench/stats"),
+        _get_json(session, f"{urls['plaid']}/_bench/stats"),
+        _upstream_by_endpoint(session, urls["app"])
+    )
+    calls = Counter({f"baserow {operation}": count for operation, count in baserow["calls"].items()})
+    calls.update({f"plaid {method}": count for method, count in plaid["calls"].items()})
+    return {"calls": calls, "by_endpoint": by_endpoint}
+
+def _delta(before: Counter, after: Counter) -> Counter:
+    return Counter({key: after[key] - before.get(key, 0) for key in after if after[key] != before.get(key, 0)})
+
+async def run_scenario(client: BenchClient, name: str, users: List[str], urls: Dict[str, str]) -> Dict:
+    args = client.args
+    before = await _snapshot(client.session, urls)
+    client.recorder = Recorder()
+    action = SCENARIOS[name]
+    deadline = time.monotonic() + args.duration
+
+    async def virtual_user() -> None:
+        while time.monotonic() < deadline:
+            await action(client, client.rng.choice(users))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    recorder, client.recorder = client.recorder, None
+    # Count the background work a scenario leaves behind (post-Link jobs) as its own
+    await client.wait_for_jobs(users)
+
+    after = await _snapshot(client.session, urls)
+    by_endpoint: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for (endpoint, operation), count in sorted(_delta(before["by_endpoint"], after["by_endpoint"]).items()):
+        by_endpoint[endpoint][operation] = int(count)
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": recorder.report(elapsed),
+        "upstream_calls": dict(sorted(_delta(before["calls"], after["calls"]).items())),
+        "upstream_calls_by_endpoint": dict(by_endpoint)
+    }
+
+async def seed(client: BenchClient, users: List[str]) -> None:
+    """
+    Give every user linked items (with their accounts) and some transactions
+    """
+    semaphore = asyncio.Semaphore(client.args.concurrency)
+
+    async def seed_user(user_id: str) -> None:
+        async with semaphore:
+            for _ in range(client.args.items_per_user):
+                await client.link(user_id)
+            await client.upload(user_id, client.args.seed_transactions)
+
+    await asyncio.gather(*(seed_user(user_id) for user_id in users))
+    await client.wait_for_jobs(users)
+
+async def _wait_ready(session: aiohttp.ClientSession, url: str, processes: List[subprocess.Popen], timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for process in processes:
+            if process.poll() is not None:
+                raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            async with session.get(url) as response:
+                if response.status < 500:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready in {timeout}s")
+
+def _app_environment(args: argparse.Namespace, ports: Dict[str, int], workdir: str) -> Dict[str, str]:
+    env = {
+        **os.environ,
+        "BASEROW_API_URL": f"http://127.0.0.1:{ports['baserow']}",
+        "BASEROW_API_TOKEN": "bench",
+        "BASEROW_TRANSACTIONS_TABLE_ID": "1",
+        "BASEROW_ACCOUNTS_TABLE_ID": "2",
+        "BASEROW_TOKENS_TABLE_ID": "3",
+        "BENCH_PLAID_URL": f"http://127.0.0.1:{ports['plaid']}",
+        "ENCRYPTION_KEY": "bench-encryption-key-bench-encryption-key",
+        "SUPERTOKENS_CONNECTION_URI": "http://127.0.0.1:3567",
+        "SUPERTOKENS_APP_NAME": "ThriveBase",
+        "SUPERTOKENS_API_DOMAIN": f"http://127.0.0.1:{ports['app']}",
+        "SUPERTOKENS_WEBSITE_DOMAIN": "http://127.0.0.1:5173",
+        "PLAID_WEBHOOK_URL": "",
+        # Local stores start empty in a scratch directory on every run
+        "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "ROLLUP_STORE_PATH": os.path.join(workdir, "rollups.sqlite3"),
+        "INSTITUTION_CACHE_PATH": os.path.join(workdir, "institutions.json"),
+        "REPLICA_PATH": "",
+        "JOB_RETRY_BASE_DELAY": "0.2",
+    }
+    for assignment in args.env:
+        key, _, value = assignment.partition("=")
+        env[key] = value
+    return env
+
+def print_report(results: Dict) -> None:
+    config = results["config"]
+    print(
+        f"users={config['users']} concurrency={config['concurrency']} duration={config['duration']}s "
+        f"baserow_latency={config['baserow_latency_ms']}ms plaid_latency={config['plaid_latency_ms']}ms "
+        f"jitter={config['jitter']} seed={config['seed']}"
+    )
+    for name, scenario in results["scenarios"].items():
+        print(f"\n== {name} ({scenario['elapsed_s']}s)")
+        print(f"{'endpoint':<48} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for endpoint, stats in scenario["endpoints"].items():
+            print(
+                f"{endpoint:<48} {stats['requests']:>8} {stats['errors']:>6} {stats['rps']:>8} "
+                f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}"
+            )
+        print("upstream calls: " + (", ".join(
+            f"{operation}={count}" for operation, count in scenario["upstream_calls"].items()
+        ) or "none"))
+        for endpoint, operations in scenario["upstream_calls_by_endpoint"].items():
+            print(f"  {endpoint}: " + ", ".join(f"{operation}={count}" for operation, count in operations.items()))
+
+async def benchmark(args: argparse.Namespace) -> Dict:
+    ports = {"app": _free_port(), "baserow": _free_port(), "plaid": _free_port()}
+    urls = {name: f"http://127.0.0.1:{port}" for name, port in ports.items()}
+    workdir = tempfile.mkdtemp(prefix="thrivebase-bench-")
+    processes = [
+        subprocess.Popen([
+            sys.executable, "-m", "bench.fakes",
+            "--baserow-port", str(ports["baserow"]),
+            "--plaid-port", str(ports["plaid"]),
+            "--baserow-latency-ms", str(args.baserow_latency_ms),
+            "--plaid-latency-ms", str(args.plaid_latency_ms),
+            "--jitter", str(args.jitter),
+            "--accounts-per-item", str(args.accounts_per_item),
+            "--seed", str(args.seed)
+        ], cwd=BACKEND_DIR),
+        subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "bench.server:app",
+            "--host", "127.0.0.1", "--port", str(ports["app"]),
+            "--log-level", "warning", "--no-access-log"
+        ], cwd=BACKEND_DIR, env=_app_environment(args, ports, workdir)),
+    ]
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+            await _wait_ready(session, f"{urls['baserow']}/_bench/stats", processes)
+            await _wait_ready(session, f"{urls['app']}/health", processes)
+
+            client = BenchClient(session, urls["app"], random.Random(args.seed), args)
+            users = [f"bench-user-{number}" for number in range(args.users)]
+            await seed(client, users)
+
+            results = {"config": vars(args), "scenarios": {}}
+            for name in args.scenarios:
+                results["scenarios"][name] = await run_scenario(client, name, users, urls)
+            return results
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the API against fake Baserow and Plaid servers")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16, help="Closed-loop clients per scenario")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds each scenario runs")
+    parser.add_argument("--scenarios", type=lambda value: value.split(","), default=list(SCENARIOS),
+                        help=f"Comma-separated, run in order: {','.join(SCENARIOS)}")
+    parser.add_argument("--baserow-latency-ms", type=float, default=30)
+    parser.add_argument("--plaid-latency-ms", type=float, default=200)
+    parser.add_argument("--jitter", type=float, default=0.25, help="Latency variation as a fraction of the mean")
+    parser.add_argument("--items-per-user", type=int, default=2)
+    parser.add_argument("--accounts-per-item", type=int, default=3)
+    parser.add_argument("--seed-transactions", type=int, default=200, help="Transactions uploaded per user before the scenarios")
+    parser.add_argument("--upload-rows", type=int, default=1000, help="Rows per upload in the upload scenario")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the application, e.g. --env RESPONSE_CACHE_TTL=0")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    results = asyncio.run(benchmark(args))
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+if __name__ == "__main__":
+    main()
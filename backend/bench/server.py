@@ -0,0 +1,70 @@
+"""
+The application wired to the benchmark stand-ins.
+
+bench.run serves this module with uvicorn after pointing BASEROW_API_URL
+at the fake Baserow; the Plaid client is replaced by one that calls the
+fake Plaid over HTTP, and sessions come from the X-Bench-User header.
+"""
+import json
+import os
+import threading
+import requests
+from fastapi import Request
+from app.core.session import verify_session
+from app.main import app
+from app.services.plaid_gateway import plaid_gateway
+
+class BenchSession:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+
+    def get_user_id(self) -> str:
+        return self.user_id
+
+async def bench_session(request: Request) -> BenchSession:
+    return BenchSession(request.headers.get("X-Bench-User", "bench-user"))
+
+class FakePlaidError(Exception):
+    """
+    Shaped like the SDK's ApiException, which the gateway inspects for retries
+    """
+    def __init__(self, response: requests.Response):
+        super().__init__(f"Plaid returned {response.status_code}: {response.text}")
+        self.status = response.status_code
+        self.headers = response.headers
+
+def _plain(value):
+    # Plaid request models serialize themselves; enum members fall back to str
+    return value.to_dict() if hasattr(value, "to_dict") else value
+
+class FakePlaidClient:
+    """
+    Blocking client like the Plaid SDK, so calls still go through the gateway's thread pool
+    """
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def __getattr__(self, method_name: str):
+        if method_name.startswith("_"):
+            raise AttributeError(method_name)
+
+        def call(*args):
+            response = self._session().post(
+                f"{self.url}/{method_name}",
+                data=json.dumps({"args": [_plain(arg) for arg in args]}, default=str),
+                headers={"Content-Type": "application/json"},
+                timeout=30
+            )
+            if response.status_code >= 400:
+                raise FakePlaidError(response)
+            return response.json()
+        return call
+
+app.dependency_overrides[verify_session] = bench_session
+plaid_gateway.client = FakePlaidClient(os.environ["BENCH_PLAID_URL"])
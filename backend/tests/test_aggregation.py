@@ -0,0 +1,138 @@
+import logging
+from decimal import Decimal
+
+import pytest
+
+from app.services.aggregation import (
+    AccountColumns,
+    TransactionColumns,
+    from_cents,
+    summarize_accounts,
+    summarize_rollups,
+    summarize_transactions,
+    to_cents
+)
+
+@pytest.mark.parametrize("value, cents", [
+    ("12.34", 1234),
+    (12.34, 1234),
+    (Decimal("-0.10"), -10),
+    (7, 700),
+    (None, 0),
+    ("", 0)
+])
+def test_to_cents_is_exact(value, cents):
+    assert to_cents(value) == cents
+
+@pytest.mark.parametrize("value, cents", [
+    ("0.125", 13),
+    ("0.135", 14),
+    ("-0.125", -13),
+    ("0.124", 12),
+    ("1.0049", 100)
+])
+def test_sub_cent_amounts_round_half_away_from_zero(value, cents, caplog):
+    with caplog.at_level(logging.WARNING, logger="app.services.aggregation"):
+        assert to_cents(value) == cents
+    assert "sub-cent" in caplog.text
+
+def test_whole_cents_are_not_logged(caplog):
+    with caplog.at_level(logging.WARNING, logger="app.services.aggregation"):
+        to_cents("19.99")
+    assert caplog.text == ""
+
+def test_totals_do_not_drift_like_floats():
+    rows = [{"amount": "0.10"} for _ in range(10)] + [{"amount": "0.20"}]
+
+    summary = summarize_transactions(TransactionColumns.from_rows(rows))
+
+    # sum(0.1 for _ in range(10)) + 0.2 is 1.2000000000000002 in floats
+    assert summary["total_amount"] == 1.2
+    assert summary["total_transactions"] == 11
+    assert from_cents(to_cents("1.2")) == 1.2
+
+def test_account_totals_by_currency_type_and_institution():
+    accounts = [
+        {"balance_current": "100.10", "balance_available": "90.05", "iso_currency_code": "USD",
+         "type": "depository", "plaid_item_id": "item-1"},
+        {"balance_current": "250.25", "balance_available": None, "iso_currency_code": "USD",
+         "type": "credit", "plaid_item_id": "item-1"},
+        {"balance_current": "40", "balance_available": "40", "iso_currency_code": "CAD",
+         "type": "depository", "plaid_item_id": "item-2"}
+    ]
+
+    summary = summarize_accounts(
+        AccountColumns.from_rows(accounts),
+        {"item-1": "First Platypus Bank", "item-2": "Tartan Bank"}
+    )
+
+    assert summary["total_current_balance"] == 390.35
+    # Accounts without an available balance do not count towards it
+    assert summary["total_available_balance"] == 130.05
+    assert summary["total_accounts"] == 3
+    assert summary["by_currency"] == {
+        "CAD": {"current_balance": 40.0, "available_balance": 40.0, "count": 1},
+        "USD": {"current_balance": 350.35, "available_balance": 90.05, "count": 2}
+    }
+    assert summary["by_type"] == {
+        "credit": {"current_balance": 250.25, "count": 1},
+        "depository": {"current_balance": 140.1, "count": 2}
+    }
+    assert summary["by_institution"] == {
+        "First Platypus Bank": {"current_balance": 350.35, "count": 2},
+        "Tartan Bank": {"current_balance": 40.0, "count": 1}
+    }
+
+def test_accounts_without_an_institution_are_grouped_as_unknown():
+    accounts = [
+        {"balance_current": "10", "plaid_item_id": "item-1"},
+        {"balance_current": "20", "plaid_item_id": "item-2"},
+        {"balance_current": "30", "plaid_item_id": None},
+        {"balance_current": "40", "plaid_item_id": "item-3"}
+    ]
+
+    summary = summarize_accounts(
+        AccountColumns.from_rows(accounts),
+        {"item-1": "Tartan Bank", "item-2": None}
+    )
+
+    assert summary["by_institution"] == {
+        "Tartan Bank": {"current_balance": 10.0, "count": 1},
+        "Unknown": {"current_balance": 90.0, "count": 3}
+    }
+    assert summarize_accounts(AccountColumns.from_rows(accounts))["by_institution"] == {
+        "Unknown": {"current_balance": 100.0, "count": 4}
+    }
+
+def test_transaction_totals_match_rollups():
+    rows = [
+        {"amount": "12.50", "category": "Food", "date": "2024-05-03", "account_id": "acc-1"},
+        {"amount": "-3.25", "category": "Food", "date": "2024-05-20", "account_id": "acc-2"},
+        {"amount": "100", "category": None, "date": "2024-06-01", "account_id": "acc-1"},
+        {"amount": "0.01", "category": "Travel", "date": None, "account_id": "acc-1"}
+    ]
+    rollups = [
+        {"category": "Food", "month": "2024-05", "account_id": "acc-1", "total_cents": 1250, "count": 1},
+        {"category": "Food", "month": "2024-05", "account_id": "acc-2", "total_cents": -325, "count": 1},
+        {"category": "Uncategorized", "month": "2024-06", "account_id": "acc-1", "total_cents": 10000, "count": 1},
+        {"category": "Travel", "month": "unknown", "account_id": "acc-1", "total_cents": 1, "count": 1}
+    ]
+
+    summary = summarize_transactions(TransactionColumns.from_rows(rows))
+
+    assert summary["total_amount"] == 109.26
+    assert summary["by_category"] == {
+        "Food": {"amount": 9.25, "count": 2},
+        "Travel": {"amount": 0.01, "count": 1},
+        "Uncategorized": {"amount": 100.0, "count": 1}
+    }
+    assert summary["by_month"] == {
+        "2024-05": {"amount": 9.25, "count": 2},
+        "2024-06": {"amount": 100.0, "count": 1},
+        "unknown": {"amount": 0.01, "count": 1}
+    }
+    assert summary["by_account"] == {
+        "acc-1": {"amount": 112.51, "count": 3},
+        "acc-2": {"amount": -3.25, "count": 1}
+    }
+    assert summarize_rollups(rollups) == summary
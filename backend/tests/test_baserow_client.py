@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.baserow_client import BaserowClient
+
+ENDPOINT = "/database/rows/table/1/?user_field_names=true"
+
+def make_client(monkeypatch, single_flight: bool = True, delay: float = 0.02):
+    """
+    A client whose upstream sends are recorded instead of made; GETs of "/fail" raise
+    """
+    monkeypatch.setenv("BASEROW_SINGLE_FLIGHT", "true" if single_flight else "false")
+    client = BaserowClient()
+    sends = []
+
+    async def send(method, endpoint, data=None):
+        sends.append((method, endpoint))
+        await asyncio.sleep(delay)
+        if endpoint == "/fail":
+            raise HTTPException(status_code=500, detail="Baserow API request failed")
+        return {"results": [{"id": len(sends)}], "endpoint": endpoint}
+
+    client._send = send
+    return client, sends
+
+def test_concurrent_identical_gets_share_one_request(monkeypatch):
+    client, sends = make_client(monkeypatch)
+
+    async def fetch():
+        return await asyncio.gather(*(client.request("GET", ENDPOINT) for _ in range(5)))
+
+    responses = asyncio.run(fetch())
+
+    assert sends == [("GET", ENDPOINT)]
+    assert all(response is responses[0] for response in responses)
+    assert client.coalesced_requests == 4
+    assert not client._inflight
+
+def test_different_endpoints_and_later_gets_are_sent_separately(monkeypatch):
+    client, sends = make_client(monkeypatch)
+
+    async def fetch():
+        await asyncio.gather(client.request("GET", ENDPOINT), client.request("GET", "/other/"))
+        return await client.request("GET", ENDPOINT)
+
+    asyncio.run(fetch())
+
+    assert sorted(sends) == [("GET", ENDPOINT), ("GET", ENDPOINT), ("GET", "/other/")]
+    assert client.coalesced_requests == 0
+
+def test_writes_are_never_coalesced(monkeypatch):
+    client, sends = make_client(monkeypatch)
+
+    async def write():
+        await asyncio.gather(*(client.request("POST", ENDPOINT, {"name": "row"}) for _ in range(3)))
+
+    asyncio.run(write())
+
+    assert sends == [("POST", ENDPOINT)] * 3
+
+def test_cancelled_waiter_does_not_cancel_the_shared_request(monkeypatch):
+    client, sends = make_client(monkeypatch)
+
+    async def fetch():
+        first = asyncio.ensure_future(client.request("GET", ENDPOINT))
+        second = asyncio.ensure_future(client.request("GET", ENDPOINT))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return await second, first.cancelled()
+
+    response, cancelled = asyncio.run(fetch())
+
+    assert cancelled
+    assert response["endpoint"] == ENDPOINT
+    assert len(sends) == 1
+
+def test_failure_reaches_every_waiter_and_is_not_cached(monkeypatch):
+    client, sends = make_client(monkeypatch)
+
+    async def fetch():
+        return await asyncio.gather(*(client.request("GET", "/fail") for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(fetch())
+
+    assert all(isinstance(error, HTTPException) for error in errors)
+    assert len(sends) == 1
+    assert not client._inflight
+    with pytest.raises(HTTPException):
+        asyncio.run(client.request("GET", "/fail"))
+    assert len(sends) == 2
+
+def test_single_flight_can_be_disabled(monkeypatch):
+    client, sends = make_client(monkeypatch, single_flight=False)
+
+    async def fetch():
+        await asyncio.gather(*(client.request("GET", ENDPOINT) for _ in range(3)))
+
+    asyncio.run(fetch())
+
+    assert len(sends) == 3
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from fastapi import HTTPException
+from plaid import ApiException
+
+from app.services import institution_cache as cache_module
+from app.services.institution_cache import InstitutionCache
+
+def plaid_error(status: int, error_code: str) -> ApiException:
+    error = ApiException(status=status, reason="error")
+    error.body = json.dumps({"error_type": "INVALID_INPUT", "error_code": error_code})
+    return error
+
+@pytest.fixture
+def plaid(monkeypatch):
+    """
+    Answers institutions_get_by_id from a list of results; exceptions in it are raised
+    """
+    calls, results = [], []
+
+    async def institutions_get_by_id(request):
+        calls.append(request.institution_id)
+        await asyncio.sleep(0.01)
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return {"institution": {"institution_id": request.institution_id, "name": result}}
+
+    monkeypatch.setattr(cache_module.plaid_gateway, "institutions_get_by_id", institutions_get_by_id)
+    return calls, results
+
+def test_caches_hits_and_shares_concurrent_lookups(plaid, tmp_path):
+    calls, results = plaid
+    results.append("First Platypus Bank")
+    cache = InstitutionCache()
+
+    async def scenario():
+        first = await asyncio.gather(*(cache.get("ins_1") for _ in range(5)))
+        return first, await cache.get("ins_1")
+
+    first, again = asyncio.run(scenario())
+    assert [institution["name"] for institution in first] == ["First Platypus Bank"] * 5
+    assert again["name"] == "First Platypus Bank"
+    assert calls == ["ins_1"]
+
+def test_caches_unknown_institutions(plaid):
+    calls, results = plaid
+    results.append(plaid_error(400, "INVALID_INSTITUTION"))
+    cache = InstitutionCache()
+
+    async def scenario():
+        return await cache.get("ins_missing"), await cache.get("ins_missing")
+
+    assert asyncio.run(scenario()) == (None, None)
+    assert calls == ["ins_missing"]
+
+@pytest.mark.parametrize("error", [
+    plaid_error(500, "INTERNAL_SERVER_ERROR"),
+    plaid_error(429, "RATE_LIMIT_EXCEEDED"),
+    plaid_error(400, "INVALID_FIELD"),
+    HTTPException(status_code=503, detail="plaid is unavailable"),
+    TimeoutError(),
+])
+def test_does_not_cache_failures(plaid, error):
+    calls, results = plaid
+    results.extend([error, "Recovered Bank"])
+    cache = InstitutionCache()
+
+    async def scenario():
+        return await cache.get("ins_1"), await cache.get("ins_1")
+
+    failed, recovered = asyncio.run(scenario())
+    assert failed is None
+    assert recovered["name"] == "Recovered Bank"
+    assert calls == ["ins_1", "ins_1"]
+
+def test_concurrent_saves_leave_a_complete_file(plaid, monkeypatch, tmp_path):
+    calls, results = plaid
+    path = tmp_path / "institutions.json"
+    monkeypatch.setenv("INSTITUTION_CACHE_PATH", str(path))
+    caches = []
+    for number in range(8):
+        results.append(f"Bank {number}")
+        cache = InstitutionCache()
+        asyncio.run(cache.get(f"ins_{number}"))
+        caches.append(cache)
+
+    errors = []
+
+    def save(cache):
+        try:
+            cache.save()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(cache,)) for cache in caches for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert [entry.name for entry in tmp_path.iterdir()] == ["institutions.json"]
+    loaded = InstitutionCache()
+    assert loaded.load() == 1
+    assert loaded.peek(json.loads(path.read_text())[0]["institution_id"]) is not None
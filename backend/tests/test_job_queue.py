@@ -0,0 +1,159 @@
+import asyncio
+import time
+
+from app.services.job_queue import (
+    FAILED, QUEUED, RUNNING, SUCCEEDED, InMemoryJobBackend, JobQueue, SQLiteJobBackend
+)
+
+def make_queue(backend, workers: int = 4, **settings) -> JobQueue:
+    queue = JobQueue(backend)
+    queue.worker_count = workers
+    queue.retry_base_delay = settings.get("retry_base_delay", 0.01)
+    queue.retry_max_delay = settings.get("retry_max_delay", 0.05)
+    queue.lease_seconds = settings.get("lease_seconds", 60)
+    return queue
+
+def job_row(job_id: str, user_id: str, **fields) -> dict:
+    now = time.time()
+    job = {
+        "id": job_id, "kind": "work", "user_id": user_id, "payload": {}, "status": QUEUED,
+        "attempts": 0, "max_attempts": 3, "next_run_at": now, "created_at": now, "updated_at": now,
+        "error": None, "result": None, "progress": None, "owner": None, "lease_until": 0
+    }
+    job.update(fields)
+    return job
+
+async def wait_finished(backend, job_ids, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        jobs = [await backend.get(job_id) for job_id in job_ids]
+        if all(job["status"] in (SUCCEEDED, FAILED) for job in jobs):
+            return jobs
+        if time.monotonic() > deadline:
+            raise AssertionError(f"Jobs did not finish: {[job['status'] for job in jobs]}")
+        await asyncio.sleep(0.01)
+
+def test_runs_each_users_jobs_in_order():
+    async def scenario():
+        queue = make_queue(InMemoryJobBackend())
+        runs = []
+
+        async def handler(payload):
+            # Later jobs are quicker, so any reordering would show
+            await asyncio.sleep(0.03 - payload["n"] * 0.01)
+            runs.append((payload["user"], payload["n"]))
+
+        queue.register("work", handler)
+        await queue.start()
+        jobs = [
+            await queue.enqueue("work", user, {"user": user, "n": n})
+            for n in range(3) for user in ("alice", "bob")
+        ]
+        await wait_finished(queue.backend, [job["id"] for job in jobs])
+        await queue.stop()
+        return runs
+
+    runs = asyncio.run(scenario())
+    for user in ("alice", "bob"):
+        assert [n for run_user, n in runs if run_user == user] == [0, 1, 2]
+
+def test_retries_failed_jobs_then_gives_up():
+    async def scenario():
+        queue = make_queue(InMemoryJobBackend())
+        calls = {"flaky": 0, "broken": 0}
+
+        async def flaky(payload):
+            calls["flaky"] += 1
+            if calls["flaky"] < 3:
+                raise RuntimeError("not yet")
+            return "done"
+
+        async def broken(payload):
+            calls["broken"] += 1
+            raise RuntimeError("always")
+
+        queue.register("flaky", flaky)
+        queue.register("broken", broken)
+        await queue.start()
+        jobs = [
+            await queue.enqueue("flaky", "alice", {}),
+            await queue.enqueue("broken", "bob", {}, max_attempts=2)
+        ]
+        finished = await wait_finished(queue.backend, [job["id"] for job in jobs])
+        await queue.stop()
+        return finished, calls
+
+    (flaky, broken), calls = asyncio.run(scenario())
+    assert (flaky["status"], flaky["attempts"], flaky["result"]) == (SUCCEEDED, 3, "done")
+    assert (broken["status"], broken["attempts"], broken["error"]) == (FAILED, 2, "always")
+    assert calls == {"flaky": 3, "broken": 2}
+
+def test_workers_sharing_a_store_run_each_job_once(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+
+    async def scenario():
+        # Unowned jobs, e.g. handed back by a process that shut down
+        seed = SQLiteJobBackend(path)
+        jobs = [job_row(f"job-{n}", f"user-{n % 5}", payload={"n": n}) for n in range(40)]
+        for job in jobs:
+            await seed.save(job)
+
+        runs = []
+
+        async def handler(payload):
+            await asyncio.sleep(0.001)
+            runs.append(payload["n"])
+
+        workers = [make_queue(SQLiteJobBackend(path)) for _ in range(3)]
+        for queue in workers:
+            queue.register("work", handler)
+        await asyncio.gather(*(queue.start() for queue in workers))
+        await wait_finished(workers[0].backend, [job["id"] for job in jobs])
+        for queue in workers:
+            await queue.stop()
+        return runs
+
+    assert sorted(asyncio.run(scenario())) == list(range(40))
+
+def test_adopts_jobs_whose_lease_expired():
+    async def scenario():
+        backend = InMemoryJobBackend()
+        now = time.time()
+        # Its process died mid-run
+        await backend.save(job_row("orphan", "alice", status=RUNNING, attempts=1, owner="dead", lease_until=now - 1))
+        # Held by a live process
+        await backend.save(job_row("held", "bob", owner="alive", lease_until=now + 60))
+
+        ran = []
+
+        async def handler(payload):
+            ran.append(True)
+
+        queue = make_queue(backend)
+        queue.register("work", handler)
+        await queue.start()
+        orphan, = await wait_finished(backend, ["orphan"])
+        held = await backend.get("held")
+        await queue.stop()
+        return orphan, held, ran
+
+    orphan, held, ran = asyncio.run(scenario())
+    assert (orphan["status"], orphan["attempts"]) == (SUCCEEDED, 2)
+    assert held["status"] == QUEUED
+    assert ran == [True]
+
+def test_claim_is_exclusive(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "jobs.sqlite3")
+        first, second = SQLiteJobBackend(path), SQLiteJobBackend(path)
+        now = time.time()
+        await first.save(job_row("job", "alice"))
+        claims = await asyncio.gather(
+            first.claim("job", "a", now + 60, now),
+            second.claim("job", "b", now + 60, now)
+        )
+        return claims, await first.get("job")
+
+    claims, job = asyncio.run(scenario())
+    assert sorted(claims) == [False, True]
+    assert job["status"] == RUNNING
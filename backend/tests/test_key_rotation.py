@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app.core.security import TokenEncryption
+from app.services import key_rotation
+from app.services.baserow_client import BatchResult
+from app.services.key_rotation import KeyRotationService
+
+OLD_KEY, NEW_KEY, UNKNOWN_KEY = Fernet.generate_key(), Fernet.generate_key(), Fernet.generate_key()
+
+@pytest.fixture
+def encryption(monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEYS", f"{NEW_KEY.decode()},{OLD_KEY.decode()}")
+    monkeypatch.delenv("ENCRYPTION_KEY", raising=False)
+    return TokenEncryption()
+
+def test_decrypt_token_and_decrypt_many_agree(encryption):
+    tokens = [
+        encryption.encrypt_token("access-1"),
+        Fernet(OLD_KEY).encrypt(b"access-2").decode(),
+        Fernet(UNKNOWN_KEY).encrypt(b"access-3").decode(),
+        "not a token",
+        "",
+        None
+    ]
+
+    assert encryption.decrypt_many(tokens) == [encryption.decrypt_token(token) for token in tokens]
+    assert encryption.decrypt_many(tokens) == ["access-1", "access-2", None, None, None, None]
+
+def test_rotate_many_only_changes_stale_tokens(encryption):
+    current = encryption.encrypt_token("current")
+    stale = Fernet(OLD_KEY).encrypt_at_time(b"stale", 1_600_000_000).decode()
+    unreadable = Fernet(UNKNOWN_KEY).encrypt(b"lost").decode()
+
+    rotated = encryption.rotate_many([current, stale, unreadable, ""])
+
+    assert rotated[0] == current
+    assert Fernet(NEW_KEY).decrypt(rotated[1].encode()) == b"stale"
+    assert Fernet(NEW_KEY).extract_timestamp(rotated[1].encode()) == 1_600_000_000
+    assert rotated[2:] == [None, None]
+
+def test_reencrypt_tokens_rewrites_stale_rows_off_the_event_loop(monkeypatch, encryption):
+    monkeypatch.setattr(key_rotation, "token_encryption", encryption)
+    old = Fernet(OLD_KEY)
+    pages = [
+        [
+            {"id": 1, "encrypted_access_token": encryption.encrypt_token("a")},
+            {"id": 2, "encrypted_access_token": old.encrypt(b"b").decode()},
+        ],
+        [
+            {"id": 3, "encrypted_access_token": Fernet(UNKNOWN_KEY).encrypt(b"c").decode()},
+            {"id": 4, "encrypted_access_token": old.encrypt(b"d").decode()},
+            {"id": 5, "encrypted_access_token": ""},
+        ],
+    ]
+    updates, rotating_threads = [], []
+
+    async def iter_pages(query, prefetch=True):
+        for page in pages:
+            yield page
+
+    async def batch_update(table_id, rows):
+        updates.extend(rows)
+        result = BatchResult()
+        result.rows = rows
+        return result
+
+    rotate_many = encryption.rotate_many
+
+    def spy_rotate_many(tokens):
+        rotating_threads.append(threading.current_thread())
+        return rotate_many(tokens)
+
+    monkeypatch.setattr(key_rotation.baserow_client, "iter_pages", iter_pages)
+    monkeypatch.setattr(key_rotation.baserow_client, "batch_update", batch_update)
+    monkeypatch.setattr(encryption, "rotate_many", spy_rotate_many)
+
+    counts = asyncio.run(KeyRotationService().reencrypt_tokens())
+
+    assert counts == {"scanned": 5, "reencrypted": 2, "unreadable": 1, "failed": 0}
+    assert {row["id"]: encryption.decrypt_token(row["encrypted_access_token"]) for row in updates} == {2: "b", 4: "d"}
+    assert rotating_threads and all(thread is not threading.main_thread() for thread in rotating_threads)
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.pipeline import Pipeline, pipeline_stats
+
+def test_independent_stages_run_concurrently_and_dependents_get_results():
+    order = []
+
+    async def slow(value):
+        order.append(f"start {value}")
+        await asyncio.sleep(0.1)
+        order.append(f"end {value}")
+        return value
+
+    async def combine(a, b):
+        order.append("combine")
+        return f"{a}+{b}"
+
+    pipeline = (
+        Pipeline("test_concurrent")
+        .stage("a", lambda: slow("a"))
+        .stage("b", lambda: slow("b"))
+        .stage("both", combine, after=["a", "b"])
+    )
+    started = time.perf_counter()
+    results = asyncio.run(pipeline.run())
+
+    assert results == {"a": "a", "b": "b", "both": "a+b"}
+    # Run one after the other they would take at least 0.2s
+    assert time.perf_counter() - started < 0.18
+    assert order[:2] == ["start a", "start b"]
+    assert order[-1] == "combine"
+
+def test_failure_cancels_running_siblings_and_skips_dependents():
+    events = []
+
+    async def fails():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("item_get failed")
+
+    async def sibling():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            events.append("sibling cancelled")
+            raise
+        events.append("sibling finished")
+
+    async def dependent(_):
+        events.append("dependent ran")
+
+    pipeline = (
+        Pipeline("test_failure")
+        .stage("fails", fails)
+        .stage("sibling", sibling)
+        .stage("dependent", dependent, after=["fails"])
+    )
+    started = time.perf_counter()
+    with pytest.raises(RuntimeError, match="item_get failed"):
+        asyncio.run(pipeline.run())
+
+    assert events == ["sibling cancelled"]
+    assert time.perf_counter() - started < 0.5
+    assert pipeline_stats.snapshot()["test_failure"]["fails"]["errors"] == 1
+    assert "total" in pipeline.timings
+
+def test_unknown_dependency_is_rejected():
+    async def stage():
+        return None
+
+    with pytest.raises(ValueError, match="unknown stage missing"):
+        Pipeline("test_unknown").stage("stage", stage, after=["missing"])
+
+def test_critical_path_follows_the_slowest_dependency():
+    async def sleep(seconds, *_):
+        await asyncio.sleep(seconds)
+
+    pipeline = (
+        Pipeline("test_critical_path")
+        .stage("fast", lambda: sleep(0.01))
+        .stage("slow", lambda: sleep(0.04))
+        .stage("store", lambda *_: sleep(0.01), after=["fast", "slow"])
+    )
+    asyncio.run(pipeline.run())
+
+    assert pipeline.critical_path == ["slow", "store"]
+    header = pipeline.server_timing()
+    assert header.startswith("fast;dur=")
+    assert header.endswith('critical_path;desc="slow>store"')
+    assert pipeline_stats.snapshot()["test_critical_path"]["store"]["count"] == 1
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import os
+import time
+
+os.environ.setdefault("BASEROW_TOKENS_TABLE_ID", "1")
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import HTTPException
+from jose import jwk, jwt
+from plaid.model.jwk_public_key import JWKPublicKey
+from plaid.model.webhook_verification_key_get_response import WebhookVerificationKeyGetResponse
+
+from app.services.plaid_gateway import plaid_gateway
+from app.services import plaid_webhooks
+from app.services.plaid_webhooks import PlaidWebhookVerifier, WebhookDispatcher
+
+KEY_ID = "6c5516e1-92dc-479e-a8ff-5a51992e0001"
+
+@pytest.fixture
+def signing_key():
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+
+@pytest.fixture
+def verifier(monkeypatch, signing_key):
+    public_jwk = jwk.construct(signing_key, algorithm="ES256").public_key().to_dict()
+    calls = []
+
+    async def webhook_verification_key_get(request):
+        calls.append(request.key_id)
+        # What the SDK returns: a response model wrapping a JWKPublicKey model
+        return WebhookVerificationKeyGetResponse(
+            key=JWKPublicKey(
+                alg="ES256",
+                crv=public_jwk["crv"],
+                kid=request.key_id,
+                kty=public_jwk["kty"],
+                use="sig",
+                x=public_jwk["x"],
+                y=public_jwk["y"],
+                created_at=1560466150,
+                expired_at=None
+            ),
+            request_id="test"
+        )
+
+    monkeypatch.setenv("PLAID_WEBHOOK_VERIFY", "true")
+    monkeypatch.setattr(plaid_gateway, "webhook_verification_key_get", webhook_verification_key_get)
+    verifier = PlaidWebhookVerifier()
+    verifier.calls = calls
+    return verifier
+
+def sign(signing_key: str, body: bytes, issued_at: float) -> str:
+    return jwt.encode(
+        {"iat": int(issued_at), "request_body_sha256": hashlib.sha256(body).hexdigest()},
+        signing_key,
+        algorithm="ES256",
+        headers={"kid": KEY_ID}
+    )
+
+def test_verifies_jwt_signed_with_sdk_key(verifier, signing_key):
+    body = b'{"webhook_type": "TRANSACTIONS", "webhook_code": "SYNC_UPDATES_AVAILABLE"}'
+    signed_jwt = sign(signing_key, body, time.time())
+
+    asyncio.run(verifier.verify(body, signed_jwt))
+    asyncio.run(verifier.verify(body, signed_jwt))
+
+    # Unexpired keys are cached after the first lookup
+    assert verifier.calls == [KEY_ID]
+
+def test_rejects_tampered_body(verifier, signing_key):
+    signed_jwt = sign(signing_key, b'{"webhook_code": "DEFAULT_UPDATE"}', time.time())
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(verifier.verify(b'{"webhook_code": "ERROR"}', signed_jwt))
+    assert error.value.status_code == 401
+
+def test_rejects_stale_signature(verifier, signing_key):
+    body = b"{}"
+    signed_jwt = sign(signing_key, body, time.time() - 10 * 60)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(verifier.verify(body, signed_jwt))
+    assert error.value.detail == "Webhook signature expired"
+
+@pytest.fixture
+def plaid_work(monkeypatch):
+    calls = []
+
+    async def find_item_token(item_id):
+        return {"user_id": "user-1", "plaid_item_id": item_id}
+
+    async def sync_item(user_id, item_id, token):
+        calls.append("sync")
+
+    async def refresh_item(user_id, item_id, access_token):
+        calls.append("refresh")
+
+    monkeypatch.setattr(plaid_webhooks.token_service, "find_item_token", find_item_token)
+    monkeypatch.setattr(plaid_webhooks.token_service, "decrypt_token_row", lambda token: "access-token")
+    monkeypatch.setattr(plaid_webhooks.transaction_sync_service, "sync_item", sync_item)
+    monkeypatch.setattr(plaid_webhooks.account_refresh_service, "refresh_item", refresh_item)
+    return calls
+
+@pytest.mark.parametrize("events, expected", [
+    ({("TRANSACTIONS", "SYNC_UPDATES_AVAILABLE")}, ["sync", "refresh"]),
+    ({("TRANSACTIONS", "DEFAULT_UPDATE")}, ["sync", "refresh"]),
+    ({("TRANSACTIONS", "RECURRING_TRANSACTIONS_UPDATE")}, []),
+    ({("HOLDINGS", "DEFAULT_UPDATE")}, ["refresh"]),
+])
+def test_process_calls_plaid_only_when_something_changed(plaid_work, events, expected):
+    asyncio.run(WebhookDispatcher().process("item-1", events))
+
+    assert plaid_work == expected
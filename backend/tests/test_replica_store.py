@@ -0,0 +1,99 @@
+import asyncio
+
+from app.services import replica_store as replica_module
+from app.services.baserow_query import BaserowQuery
+from app.services.replica_store import ReplicaStore
+
+ACCOUNTS_TABLE_ID = "11"
+
+def make_store(monkeypatch, path, interval: float = 300) -> ReplicaStore:
+    monkeypatch.setenv("REPLICA_PATH", str(path))
+    monkeypatch.setenv("REPLICA_RECONCILE_INTERVAL", str(interval))
+    monkeypatch.setenv("BASEROW_ACCOUNTS_TABLE_ID", ACCOUNTS_TABLE_ID)
+    monkeypatch.delenv("BASEROW_TRANSACTIONS_TABLE_ID", raising=False)
+    monkeypatch.delenv("BASEROW_TOKENS_TABLE_ID", raising=False)
+    return ReplicaStore()
+
+def account(row_id: int, user_id: str = "alice", name: str = "Checking") -> dict:
+    return {"id": row_id, "user_id": user_id, "plaid_item_id": "item-1", "name": name}
+
+def fake_pages(monkeypatch, pages, between_pages=None):
+    """
+    Serve Baserow pages from a list; between_pages runs after each page is handed out
+    """
+    calls = []
+
+    async def iter_pages(query, prefetch=True):
+        calls.append(str(query.table_id))
+        for number, page in enumerate(pages):
+            yield page
+            if between_pages is not None:
+                await between_pages(number)
+
+    monkeypatch.setattr(replica_module.baserow_client, "iter_pages", iter_pages)
+    return calls
+
+def local_rows(store: ReplicaStore) -> list:
+    return store._select(BaserowQuery(ACCOUNTS_TABLE_ID))
+
+def test_reconcile_streams_pages_into_the_table(monkeypatch, tmp_path):
+    store = make_store(monkeypatch, tmp_path / "replica.sqlite3")
+    fake_pages(monkeypatch, [[account(1), account(2)], [account(3, user_id="bob")]])
+
+    async def scenario():
+        # A stale row from an earlier copy must not survive the swap
+        await asyncio.to_thread(store._apply, "accounts", [account(9)], [])
+        count = await store.reconcile("accounts")
+        await store.stop()
+        return count
+
+    assert asyncio.run(scenario()) == 3
+    assert [row["id"] for row in local_rows(store)] == [1, 2, 3]
+    assert [row["id"] for row in store._select(BaserowQuery(ACCOUNTS_TABLE_ID).equal("user_id", "bob"))] == [3]
+
+def test_writes_during_reconcile_survive_the_swap(monkeypatch, tmp_path):
+    store = make_store(monkeypatch, tmp_path / "replica.sqlite3")
+
+    async def write(number):
+        if number == 0:
+            # Row 1 was already read; row 4 is created after the pages were read
+            await asyncio.to_thread(store._apply, "accounts", [account(1, name="Renamed"), account(4)], [])
+
+    fake_pages(monkeypatch, [[account(1), account(2)], [account(3)]], between_pages=write)
+    asyncio.run(store.reconcile("accounts"))
+
+    rows = {row["id"]: row for row in local_rows(store)}
+    assert sorted(rows) == [1, 2, 3, 4]
+    assert rows[1]["name"] == "Renamed"
+
+def test_one_worker_reconciles_per_interval(monkeypatch, tmp_path):
+    path = tmp_path / "replica.sqlite3"
+    first, second = make_store(monkeypatch, path), make_store(monkeypatch, path)
+    calls = fake_pages(monkeypatch, [[account(1)]])
+
+    async def scenario():
+        results = [
+            await first.reconcile("accounts", force=False),
+            # Synced moments ago by another worker
+            await second.reconcile("accounts", force=False),
+        ]
+        second.synced_at.update(await asyncio.to_thread(second._shared_synced_at))
+        return results
+
+    assert asyncio.run(scenario()) == [1, None]
+    assert calls == [ACCOUNTS_TABLE_ID]
+    # The second worker serves the table the first one synced
+    assert [row["id"] for row in local_rows(second)] == [1]
+
+def test_held_lease_blocks_other_workers(monkeypatch, tmp_path):
+    path = tmp_path / "replica.sqlite3"
+    first, second = make_store(monkeypatch, path), make_store(monkeypatch, path)
+    results = {}
+
+    async def contend(number):
+        results["second"] = await second.reconcile("accounts")
+
+    fake_pages(monkeypatch, [[account(1)]], between_pages=contend)
+    results["first"] = asyncio.run(first.reconcile("accounts"))
+
+    assert results == {"second": None, "first": 1}
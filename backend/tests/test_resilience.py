@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.resilience import OPEN, ResilientTransport, TransientError
+from app.services.baserow_client import BaserowClient
+
+def make_transport(monkeypatch, **settings) -> ResilientTransport:
+    for key, value in settings.items():
+        monkeypatch.setenv(f"TEST_{key}", str(value))
+    return ResilientTransport("test", "TEST", retry_base_delay=0.001, retry_max_delay=0.01)
+
+def failing(errors):
+    """
+    A send that raises each of errors in turn, then returns "ok"
+    """
+    calls = []
+
+    async def send():
+        calls.append(True)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+
+    return send, calls
+
+def test_baserow_rate_limit_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("BASEROW_RATE_LIMIT", raising=False)
+    assert BaserowClient().transport.limiter is None
+
+    monkeypatch.setenv("BASEROW_RATE_LIMIT", "20")
+    assert BaserowClient().transport.limiter.rate == 20
+
+def test_retries_transient_failures(monkeypatch):
+    transport = make_transport(monkeypatch, RETRY_ATTEMPTS=3)
+    send, calls = failing([TransientError(RuntimeError("502"), "502")] * 2)
+
+    assert asyncio.run(transport.call(send, idempotent=True)) == "ok"
+    assert len(calls) == 3
+
+def test_does_not_repeat_processed_non_idempotent_calls(monkeypatch):
+    transport = make_transport(monkeypatch, RETRY_ATTEMPTS=3)
+    error = RuntimeError("502")
+    send, calls = failing([TransientError(error, "502")])
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(transport.call(send, idempotent=False))
+    assert len(calls) == 1
+
+    # A 429 was not acted on, so even a create is safe to send again
+    send, calls = failing([TransientError(RuntimeError("429"), "429", processed=False, throttled=True)])
+    assert asyncio.run(transport.call(send, idempotent=False)) == "ok"
+
+def test_breaker_opens_after_consecutive_failures(monkeypatch):
+    transport = make_transport(monkeypatch, RETRY_ATTEMPTS=1, BREAKER_FAILURES=2, BREAKER_RESET=30)
+
+    async def scenario():
+        for _ in range(2):
+            send, _ = failing([TransientError(RuntimeError("503"), "503")])
+            with pytest.raises(RuntimeError):
+                await transport.call(send, idempotent=True)
+        send, calls = failing([])
+        with pytest.raises(HTTPException) as rejected:
+            await transport.call(send, idempotent=True)
+        return rejected.value, calls
+
+    rejected, calls = asyncio.run(scenario())
+    assert transport.breaker.state == OPEN
+    assert (rejected.status_code, calls) == (503, [])
+    assert int(rejected.headers["Retry-After"]) > 0
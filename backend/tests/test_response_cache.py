@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from app.services import response_cache as cache_module
+from app.services.response_cache import InMemoryCacheBackend, ResponseCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    return clock
+
+def make_cache(monkeypatch, ttl: float = 30, stale_ttl: float = 120) -> ResponseCache:
+    monkeypatch.setenv("RESPONSE_CACHE_TTL", str(ttl))
+    monkeypatch.setenv("RESPONSE_CACHE_STALE_TTL", str(stale_ttl))
+    return ResponseCache(InMemoryCacheBackend())
+
+def counting_loader(delay: float = 0):
+    """
+    A loader returning 1, 2, 3... on successive calls
+    """
+    calls = []
+
+    async def load():
+        calls.append(True)
+        await asyncio.sleep(delay)
+        return len(calls)
+
+    return load, calls
+
+async def settle(cache: ResponseCache) -> None:
+    await asyncio.gather(*list(cache._refreshing.values()))
+
+def test_fresh_entries_are_served_without_loading(monkeypatch, clock):
+    cache = make_cache(monkeypatch)
+    load, calls = counting_loader()
+
+    async def run():
+        first = await cache.get_or_load("accounts", "user-1", load)
+        clock.now += 29
+        return first, await cache.get_or_load("accounts", "user-1", load)
+
+    assert asyncio.run(run()) == (1, 1)
+    assert len(calls) == 1
+
+def test_stale_entries_are_served_while_one_refresh_runs(monkeypatch, clock):
+    cache = make_cache(monkeypatch)
+    load, calls = counting_loader(delay=0.01)
+
+    async def run():
+        await cache.get_or_load("accounts", "user-1", load)
+        clock.now += 31
+        stale = await asyncio.gather(*(cache.get_or_load("accounts", "user-1", load) for _ in range(3)))
+        await settle(cache)
+        return stale, await cache.get_or_load("accounts", "user-1", load)
+
+    stale, refreshed = asyncio.run(run())
+
+    assert stale == [1, 1, 1]
+    assert refreshed == 2
+    assert len(calls) == 2
+
+def test_expired_entries_are_loaded_again(monkeypatch, clock):
+    cache = make_cache(monkeypatch)
+    load, calls = counting_loader()
+
+    async def run():
+        await cache.get_or_load("accounts", "user-1", load)
+        clock.now += 151
+        return await cache.get_or_load("accounts", "user-1", load)
+
+    assert asyncio.run(run()) == 2
+    assert len(calls) == 2
+
+def test_failed_refresh_keeps_serving_the_stale_value(monkeypatch, clock):
+    cache = make_cache(monkeypatch)
+
+    async def failing():
+        raise RuntimeError("Baserow is down")
+
+    async def run():
+        await cache.get_or_load("accounts", "user-1", counting_loader()[0])
+        clock.now += 31
+        stale = await cache.get_or_load("accounts", "user-1", failing)
+        await settle(cache)
+        return stale, await cache.get_or_load("accounts", "user-1", failing)
+
+    assert asyncio.run(run()) == (1, 1)
+
+def test_invalidate_drops_every_view_of_the_user_only(monkeypatch, clock):
+    cache = make_cache(monkeypatch)
+    load, calls = counting_loader()
+
+    async def run():
+        for view in ("accounts", "account_summary", "connected_accounts"):
+            await cache.get_or_load(view, "user-1", load)
+        await cache.get_or_load("accounts", "user-2", load)
+        await cache.invalidate_user("user-1")
+        return (
+            [await cache.get_or_load(view, "user-1", load) for view in ("accounts", "account_summary")],
+            await cache.get_or_load("accounts", "user-2", load)
+        )
+
+    reloaded, untouched = asyncio.run(run())
+
+    assert reloaded == [5, 6]
+    assert untouched == 4
+    assert len(calls) == 6
+
+def test_load_started_before_an_invalidation_is_not_cached(monkeypatch, clock):
+    cache = make_cache(monkeypatch)
+    load, calls = counting_loader(delay=0.02)
+
+    async def run():
+        pending = asyncio.ensure_future(cache.get_or_load("accounts", "user-1", load))
+        await asyncio.sleep(0.005)
+        await cache.invalidate_user("user-1")
+        old = await pending
+        return old, await cache.get_or_load("accounts", "user-1", load)
+
+    # The caller still gets its result, but the next read loads fresh data
+    assert asyncio.run(run()) == (1, 2)
+    assert len(calls) == 2
+
+def test_zero_ttl_disables_the_cache(monkeypatch, clock):
+    cache = make_cache(monkeypatch, ttl=0)
+    load, calls = counting_loader()
+
+    async def run():
+        return [await cache.get_or_load("accounts", "user-1", load) for _ in range(2)]
+
+    assert asyncio.run(run()) == [1, 2]
+
+def test_in_memory_backend_evicts_least_recently_used(clock):
+    backend = InMemoryCacheBackend(max_size=2)
+    entry = {"value": 1, "fresh_until": 2000.0, "expires_at": 2000.0}
+
+    async def run():
+        await backend.set("a", entry)
+        await backend.set("b", entry)
+        await backend.get("a")
+        await backend.set("c", entry)
+        return [await backend.get(key) is not None for key in ("a", "b", "c")]
+
+    assert asyncio.run(run()) == [True, False, True]
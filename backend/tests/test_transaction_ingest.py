@@ -0,0 +1,103 @@
+import asyncio
+import os
+
+os.environ.setdefault("BASEROW_TOKENS_TABLE_ID", "1")
+
+import pytest
+
+from app.services import transaction_ingest as ingest_module
+from app.services.baserow_client import BatchResult
+from app.services.transaction_ingest import TransactionIngestor
+
+@pytest.fixture
+def baserow(monkeypatch):
+    """
+    Stores created rows in a list; lookups only see rows whose create has finished
+    """
+    stored = []
+
+    async def existing_rows(user_id, transaction_ids):
+        await asyncio.sleep(0.01)
+        return {row["transaction_id"]: row for row in stored if row["transaction_id"] in transaction_ids}
+
+    async def batch_create(table_id, rows):
+        await asyncio.sleep(0.02)
+        stored.extend(rows)
+        result = BatchResult()
+        result.rows = list(rows)
+        return result
+
+    async def nothing(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(ingest_module.transaction_sync_service, "existing_rows", existing_rows)
+    monkeypatch.setattr(ingest_module.baserow_client, "batch_create", batch_create)
+    monkeypatch.setattr(ingest_module.rollup_store, "apply", nothing)
+    monkeypatch.setattr(ingest_module.response_cache, "invalidate_user", nothing)
+    return stored
+
+def make_ingestor(chunk_size: int = 2, writers: int = 4) -> TransactionIngestor:
+    ingestor = TransactionIngestor()
+    ingestor.chunk_size = chunk_size
+    ingestor.writers = writers
+    return ingestor
+
+def record(transaction_id: str = None, amount: float = 4.5) -> dict:
+    fields = {"account_id": "acc-1", "amount": amount, "date": "2024-05-01", "description": "Coffee", "category": "Food"}
+    if transaction_id:
+        fields["transaction_id"] = transaction_id
+    return fields
+
+async def stream(records):
+    for item in records:
+        yield item
+
+def test_same_client_id_in_concurrent_chunks_is_stored_once(baserow):
+    # t-1 lands in chunks 0 and 1, which separate writers store at the same time
+    records = [record("t-1"), record("t-2"), record("t-1"), record("t-3")]
+
+    result = asyncio.run(make_ingestor().ingest("user-1", stream(records)))
+
+    assert sorted(row["transaction_id"] for row in baserow) == ["t-1", "t-2", "t-3"]
+    assert result["succeeded"] == 3
+    assert result["duplicates"] == 1
+    assert result["failed"] == 0
+
+def test_concurrent_uploads_of_the_same_data_store_it_once(baserow):
+    records = [record(), record(), record(amount=7.25)]
+    ingestor = make_ingestor()
+
+    async def upload_twice():
+        return await asyncio.gather(
+            ingestor.ingest("user-1", stream(records)),
+            ingestor.ingest("user-1", stream(records))
+        )
+
+    first, second = asyncio.run(upload_twice())
+
+    # Repeated identical rows keep distinct dedupe keys; the second upload adds nothing
+    assert len(baserow) == 3
+    assert len({row["transaction_id"] for row in baserow}) == 3
+    assert first["succeeded"] + second["succeeded"] == 3
+    assert first["duplicates"] + second["duplicates"] == 3
+    assert not ingestor._inflight
+
+def test_retried_upload_is_all_duplicates(baserow):
+    records = [record("t-1"), record("t-2"), record("t-3")]
+    ingestor = make_ingestor()
+
+    asyncio.run(ingestor.ingest("user-1", stream(records)))
+    retry = asyncio.run(ingestor.ingest("user-1", stream(records)))
+
+    assert len(baserow) == 3
+    assert retry["succeeded"] == 0
+    assert retry["duplicates"] == 3
+
+def test_invalid_records_are_reported_by_index(baserow):
+    records = [record("t-1"), {"amount": "not a number"}, ValueError("bad line"), record("t-2")]
+
+    result = asyncio.run(make_ingestor().ingest("user-1", stream(records)))
+
+    assert result["status"] == "partial"
+    assert result["succeeded"] == 2
+    assert [error["index"] for error in result["errors"]] == [1, 2]